@@ -1,20 +1,36 @@
 """
 astarmiko - module for managing network equipment via SSH
 """
+import importlib
 
-from .base import Activka, ActivkaBackup, setup_config, send_commands, templatizator, ac
-from .log_config import setup_logging, get_log_config
-from .optional_loggers import forward_log_entry
+# Public names are resolved on first access (PEP 562), so
+# 'import astarmiko' and the console scripts don't load
+# netmiko, pysnmp and the other heavy dependencies up front
+_EXPORTS = {
+    "Activka": "base",
+    "ActivkaBackup": "base",
+    "setup_config": "base",
+    "send_commands": "base",
+    "templatizator": "base",
+    "ac": "base",
+    "setup_logging": "log_config",
+    "get_log_config": "log_config",
+    "forward_log_entry": "optional_loggers",
+}
 
-__all__ = [
-    "Activka",
-    "ActivkaBackup",
-    "setup_config",
-    "send_commands",
-    "templatizator",
-    "ac",
-    "setup_logging",
-    "get_log_config",
-    "forward_log_entry",
-]
+__all__ = list(_EXPORTS)
 
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    if name != "ac":
+        # ac is replaced by setup_config(), it is always read from base
+        globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
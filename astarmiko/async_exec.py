@@ -3,23 +3,30 @@
 # async_exec.py
 import asyncio
 from typing import Union, List, Dict, Any
-from astarmiko.base import Activka, setup_config, send_commands, templatizator, ac
+from astarmiko.base import Activka, setup_config, send_commands, exec_outputs, templatizator, ac, conf_section
+from astarmiko.async_transport import async_send_commands, is_supported
+from astarmiko.memo import cache as getinfo_cache
+from astarmiko.scheduler import ConcurrencyLimiter
+from astarmiko.reachability import cache as reachability
+from astarmiko.sweep import Sweeper, probe_async
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import json
 import os
-from tqdm.asyncio import tqdm_asyncio
+import threading
 from astarmiko.optional_loggers import forward_log_entry
 
+logger = logging.getLogger(__name__)
+
 async def is_device_available(ip: str) -> bool:
-    if os.name == "nt":
-        args = ["ping", "-n", "3", ip]
-    else:
-        args = ["ping", "-c", "3", ip]
-    proc = await asyncio.create_subprocess_exec(*args,
-                                                stdout=asyncio.subprocess.DEVNULL,
-                                                stderr=asyncio.subprocess.DEVNULL)
-    await proc.communicate()
-    return proc.returncode == 0
+    """Check if device is reachable, ping is run only if the state of ip
+       in the reachability cache is unknown or expired
+    """
+    return await reachability.check_async(ip, _ping)
+
+
+async def _ping(ip: str) -> bool:
+    return await probe_async(ip, conf_section("sweep"))
 
 class DeviceLogCapture:
     def __init__(self, device, use_rsyslog=False, use_loki=False, use_elastic=False):
@@ -39,65 +46,300 @@ class DeviceLogCapture:
         self.buffer.append(entry)
 
     def flush(self):
+        forwarded = {name for name, used in (("rsyslog", self.use_rsyslog),
+                                             ("loki", self.use_loki),
+                                             ("elastic", self.use_elastic))
+                     if used}
         for entry in self.buffer:
-            self.logger.info(json.dumps(entry, ensure_ascii=False))
+            # handlers of log_config skip destinations forwarded here
+            self.logger.info(json.dumps(entry, ensure_ascii=False),
+                             extra={"device": self.device,
+                                    "forwarded": forwarded})
             forward_log_entry(entry, rsyslog=self.use_rsyslog, loki=self.use_loki, elastic=self.use_elastic)
 
+class BlockingExecutor:
+    """Bounded thread pool for blocking calls (netmiko, textfsm)
+       made from coroutines of ActivkaAsync
+
+    Keeps counters of calls in flight so saturation of the pool
+    (in_flight / pool_size, >1 means calls are waiting for a free thread)
+    can be watched and logged.
+    """
+
+    def __init__(self, pool_size=32, call_timeout=None, saturation_warn=1.0):
+        self.pool_size = pool_size
+        self.call_timeout = call_timeout
+        self.saturation_warn = saturation_warn
+        self._executor = ThreadPoolExecutor(max_workers=pool_size,
+                                            thread_name_prefix="astarmiko")
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.submitted = 0
+        self.timed_out = 0
+        self._warned = False
+
+    @property
+    def saturation(self):
+        return self.in_flight / self.pool_size
+
+    def stats(self):
+        return {
+            "pool_size": self.pool_size,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.pool_size),
+            "peak": self.peak,
+            "peak_saturation": round(self.peak / self.pool_size, 2),
+            "submitted": self.submitted,
+            "timed_out": self.timed_out,
+        }
+
+    async def run(self, func, *args, timeout=None, **kwargs):
+        """Run blocking func in the pool and wait for it without blocking
+           the event loop
+
+        Args:
+            func: blocking callable
+            timeout (float, optional): timeout of the call, default is
+                                       call_timeout, 0 - no timeout. The
+                                       thread itself can't be interrupted,
+                                       only the waiting
+        """
+        timeout = self.call_timeout if timeout is None else timeout
+        with self._lock:
+            self.in_flight += 1
+            self.submitted += 1
+            self.peak = max(self.peak, self.in_flight)
+            saturation = self.saturation
+        if saturation > self.saturation_warn and not self._warned:
+            self._warned = True
+            logger.warning(
+                f"Thread pool saturation {saturation:.2f} "
+                f"({self.in_flight}/{self.pool_size}), consider increasing "
+                f"async_exec.pool_size"
+            )
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except BaseException:
+            self._done(None)
+            raise
+        # the call leaves in_flight when the thread is done with it, not
+        # when the waiting is over: a timed out call still holds the thread
+        future.add_done_callback(self._done)
+        try:
+            if timeout:
+                return await asyncio.wait_for(asyncio.wrap_future(future),
+                                              timeout)
+            return await asyncio.wrap_future(future)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise
+
+    def _done(self, future):
+        with self._lock:
+            self.in_flight -= 1
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
 class ActivkaAsync(Activka):
     def __init__(self, byname, ac_config, *args):
         super().__init__(byname, *args)
         self.ac = ac_config
+        exec_conf = conf_section("async_exec", ac_config)
+        self.drivers = exec_conf.get("drivers") or {}
+        known_hosts = exec_conf.get("known_hosts")
+        # without it asyncssh doesn't check host keys, as netmiko
+        self.known_hosts = os.path.expanduser(known_hosts) if known_hosts \
+            else None
+        self.executor = BlockingExecutor(
+            pool_size=exec_conf.get("pool_size", 32),
+            call_timeout=exec_conf.get("call_timeout"),
+            saturation_warn=exec_conf.get("saturation_warn", 1.0),
+        )
+        self.concurrency = conf_section("concurrency", ac_config)
 
-    async def execute_on_devices(self, devices: Union[str, List[str]], commands: Union[str, List[str], Dict[str, List[str]]],
-                                 rsyslog=False, loki=False, elastic=False, use_template=False) -> Dict[str, Any]:
+    def _limiter(self, limits=None):
+        """Limiter for one run: section concurrency of astarmiko.yaml
+           overridden by not None values of limits (acm flags)
+        """
+        conf = dict(self.concurrency)
+        conf.update({k: v for k, v in (limits or {}).items() if v is not None})
+        return ConcurrencyLimiter.from_config(conf)
+
+    async def sweep_devices(self, devices):
+        """Probe reachability of all devices at once before the run,
+           workers then take the result from the reachability cache
+        """
+        ips = []
+        for device_name in devices:
+            real = self.find_real_device_name(device_name)
+            if real:
+                ips.append(self.wholedict[real]["ip"])
+        sweeper = Sweeper.from_config(conf_section("sweep", self.ac))
+        return await sweeper.sweep(ips)
+
+    async def _limited(self, limiter, worker, device_name):
+        """Run worker for device within global, SEGMENT and device_type
+           limits
+        """
+        key = device_name.lower()
+        async with limiter.slot(self.segment.get(key), self.dev_type.get(key)):
+            return await worker(device_name)
+
+    def driver(self, device_type):
+        """Which driver serves device_type: 'asyncssh' (native, if
+           async_exec.drivers selects it) or 'thread' (blocking netmiko in
+           the thread pool)
+        """
+        driver = self.drivers.get(device_type)
+        if driver == "asyncssh" and is_supported(device_type):
+            return "asyncssh"
+        return "thread"
+
+    async def _send(self, device, commands, mode='exec'):
+        """Send commands by native asyncssh driver if device_type has one,
+           otherwise by blocking send_commands (netmiko) in the thread pool
+        """
+        if self.driver(device["device_type"]) == "asyncssh":
+            result = await async_send_commands(
+                device, commands, mode=mode,
+                accounts=getattr(self.ac, "add_account", None),
+                known_hosts=self.known_hosts, executor=self.executor,
+            )
+            if result is not False:
+                reachability.mark(device["ip"], True)
+            return result
+        # a config set is never abandoned by call_timeout: the thread
+        # goes on applying it, so the device must not be reported as failed
+        return await self.executor.run(
+            send_commands, device, commands, mode=mode,
+            timeout=None if mode == 'exec' else 0,
+        )
+
+    async def _show(self, device_name, commands, use_template, log):
+        """Show commands on one device
+
+        Returns:
+            (tuple): ('success', output) or ('unreachable', None)
+        """
+        device = self.choose(device_name, withoutname=True)
+        if not await is_device_available(device['ip']):
+            log.log("Unreachable (ICMP fail)")
+            return "unreachable", None
+
+        device_type = device.get("device_type")
+        output = []
+
+        if use_template:
+            if isinstance(commands, list):
+                cmd_abbr = commands[0]
+            else:
+                cmd_abbr = commands
+            cmd_list = self.ac.commands.get(cmd_abbr, {}).get(device_type)
+            if cmd_list:
+                res = await self._send(device, cmd_list)
+                parsed = await self.executor.run(
+                    templatizator, res, cmd_abbr, device_type
+                )
+                output.append(parsed)
+        else:
+            cmd_list = commands.get(device_type, []) if isinstance(commands, dict) else commands
+            # one session for all commands
+            res = await self._send(device, cmd_list)
+            # one item per command, parsed rows of a templated one stay
+            # nested
+            output.extend(exec_outputs(cmd_list, res))
+
+        log.log("Commands are successfully executed")
+        return "success", output if len(output) > 1 else output[0]
+
+    async def iter_execute(self, devices: Union[str, List[str]], commands: Union[str, List[str], Dict[str, List[str]]],
+                           rsyslog=False, loki=False, elastic=False, use_template=False,
+                           limits=None, progress=True, buffer=100):
+        """The same as execute_on_devices, but results are yielded as
+           devices finish, the slowest device doesn't hold the others back
+
+        Usage:
+            async for device, status, output in a.iter_execute(devices, cmds):
+                ...
+
+        Args:
+            progress (bool, optional): show progress bar (stderr)
+            buffer (int, optional): finished results waiting for the
+                                    consumer, workers wait when it is full
+
+        Yields:
+            (tuple): (device_name, status, output), status is 'success'
+                     (output of commands), 'failed' (error message) or
+                     'unreachable' (None)
+        """
         if isinstance(devices, str):
             devices = [devices]
-
-        results = {'success': {}, 'failed': {}, 'unreachable': []}
+        limiter = self._limiter(limits)
+        await self.sweep_devices(devices)
+        done = asyncio.Queue(maxsize=buffer)
 
         async def worker(device_name):
             log = DeviceLogCapture(device_name, rsyslog, loki, elastic)
             try:
-                device = self.choose(device_name, withoutname=True)
-                if not await is_device_available(device['ip']):
-                    log.log("Unreachable (ICMP fail)")
-                    results['unreachable'].append(device_name)
-                    return
-
-                device_type = device.get("device_type")
-                output = []
-
-                if use_template:
-                    if isinstance(commands, list):
-                        cmd_abbr = commands[0]
-                    else:
-                        cmd_abbr = commands
-                    cmd_list = self.ac.commands.get(cmd_abbr, {}).get(device_type)
-                    if cmd_list:
-                        res = send_commands(device, cmd_list, mode='exec')
-                        parsed = templatizator(res, cmd_abbr, device_type)
-                        output.append(parsed)
-                else:
-                    cmd_list = commands.get(device_type, []) if isinstance(commands, dict) else commands
-                    for cmd in cmd_list:
-                        res = send_commands(device, cmd, mode='exec')
-                        output.append(res)
-
-                results['success'][device_name] = output if len(output) > 1 else output[0]
-                log.log("Commands are successfully executed")
+                return await self._show(device_name, commands,
+                                        use_template, log)
             except Exception as e:
-                results['failed'][device_name] = str(e)
                 log.log(f"Ошибка: {e}", level=logging.ERROR)
+                return "failed", str(e)
             finally:
                 log.flush()
 
-        await tqdm_asyncio.gather(*(worker(dev) for dev in devices), desc="Executing show commands")
+        async def run(device_name):
+            # the consumer waits for one item per device: whatever fails
+            # around worker (limiter, log flush) still gives a 'failed' one
+            try:
+                result = await self._limited(limiter, worker, device_name)
+            except Exception as e:
+                result = ("failed", str(e))
+            await done.put((device_name, *result))
+
+        from tqdm import tqdm
+
+        tasks = [asyncio.ensure_future(run(dev)) for dev in devices]
+        bar = tqdm(total=len(tasks), desc="Executing show commands",
+                   disable=not progress)
+        try:
+            for _ in tasks:
+                item = await done.get()
+                bar.update()
+                yield item
+        finally:
+            bar.close()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info(f"Thread pool stats: {self.executor.stats()}")
+
+    async def execute_on_devices(self, devices: Union[str, List[str]], commands: Union[str, List[str], Dict[str, List[str]]],
+                                 rsyslog=False, loki=False, elastic=False, use_template=False,
+                                 limits=None) -> Dict[str, Any]:
+        results = {'success': {}, 'failed': {}, 'unreachable': []}
+        async for device_name, status, output in self.iter_execute(
+            devices, commands, rsyslog=rsyslog, loki=loki, elastic=elastic,
+            use_template=use_template, limits=limits,
+        ):
+            if status == 'unreachable':
+                results['unreachable'].append(device_name)
+            else:
+                results[status][device_name] = output
         return results
 
     async def setconfig_on_devices(self, devices: Union[str, List[str]], commands: Union[str, List[str], Dict[str, List[str]]],
-                                   rsyslog=False, loki=False, elastic=False) -> Dict[str, Any]:
+                                   rsyslog=False, loki=False, elastic=False,
+                                   limits=None) -> Dict[str, Any]:
         if isinstance(devices, str):
             devices = [devices]
+        limiter = self._limiter(limits)
+        await self.sweep_devices(devices)
 
         results = {'success': {}, 'failed': {}, 'unreachable': []}
 
@@ -114,7 +356,11 @@ class ActivkaAsync(Activka):
                 cmd_list = commands.get(device_type, []) if isinstance(commands, dict) else commands
 
                 log.log(f"Connecting to {device['ip']}")
-                result = send_commands(device, cmd_list, mode='config')
+                try:
+                    result = await self._send(device, cmd_list, mode='config')
+                finally:
+                    # even a failed push may have changed something
+                    getinfo_cache.invalidate(device_name.lower())
                 results['success'][device_name] = result
                 log.log("Commands are successfully executed")
             except Exception as e:
@@ -123,6 +369,10 @@ class ActivkaAsync(Activka):
             finally:
                 log.flush()
 
-        await tqdm_asyncio.gather(*(worker(dev) for dev in devices), desc="Executing config commands")
+        from tqdm.asyncio import tqdm_asyncio
+
+        await tqdm_asyncio.gather(*(self._limited(limiter, worker, dev) for dev in devices),
+                                  desc="Executing config commands")
+        logger.info(f"Thread pool stats: {self.executor.stats()}")
         return results
 
@@ -0,0 +1,367 @@
+# async_transport.py
+"""
+Native asyncio transport for interactive CLI sessions built on asyncssh.
+
+Unlike netmiko it does not block the event loop, so ActivkaAsync can
+work with hundreds of devices in parallel on one loop.
+Supported device types are listed in PROFILES.
+"""
+import asyncio
+import functools
+import logging
+import re
+
+from astarmiko.credentials import affinity as credential_affinity
+
+logger = logging.getLogger(__name__)
+
+_ANSI = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+_ANY_PROMPT = re.compile(r"[\w\-\.:/~()\[\]<>@]+[>#\]]\s*$")
+
+# What every vendor CLI needs: how to disable paging, get privileged
+# and configuration mode, and how to save configuration
+PROFILES = {
+    "cisco_ios": {
+        "paging": "terminal length 0",
+        "width": "terminal width 511",
+        "enable": "enable",
+        "config_enter": "configure terminal",
+        "config_exit": "end",
+        "commit": None,
+        "save": "write memory",
+        "more": r"--More--",
+    },
+    "huawei": {
+        "paging": "screen-length 0 temporary",
+        "width": None,
+        "enable": None,
+        "config_enter": "system-view",
+        "config_exit": "return",
+        "commit": None,
+        "save": "save",
+        "more": r"-+ ?More ?-+",
+    },
+    "huawei_vrpv8": {
+        "paging": "screen-length 0 temporary",
+        "width": None,
+        "enable": None,
+        "config_enter": "system-view",
+        "config_exit": "return",
+        "commit": "commit",
+        "save": "save",
+        "more": r"-+ ?More ?-+",
+    },
+    "eltex": {
+        "paging": "terminal datadump",
+        "width": None,
+        "enable": "enable",
+        "config_enter": "configure terminal",
+        "config_exit": "end",
+        "commit": None,
+        "save": "write memory",
+        "more": r"More: <space>|--More--",
+    },
+}
+
+_CONFIRM = re.compile(r"\[Y/N\]|\[y/n\]|\(y/n\)|\[confirm\]", re.I)
+
+
+def is_supported(device_type):
+    """True if device_type has native async driver"""
+    return device_type in PROFILES
+
+
+async def _blocking(executor, func, *args, **kwargs):
+    """Run blocking func (file writes, TextFSM) off the event loop: in
+       executor (async_exec.BlockingExecutor) or the default one of loop
+    """
+    if executor is not None:
+        return await executor.run(func, *args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(func, *args, **kwargs)
+    )
+
+
+class AsyncCLISession:
+    """Interactive CLI session to one device over asyncssh
+
+    Usage:
+        async with AsyncCLISession(device) as cli:
+            output = await cli.send_command("show version")
+    """
+
+    def __init__(self, device, timeout=30, read_timeout=60,
+                 known_hosts=None, executor=None):
+        """
+        Args:
+            device (dict): dictionary in netmiko format
+                           (device_type, ip, username, password, ...)
+            timeout (int): timeout of connection in seconds
+            read_timeout (int): default timeout of waiting for prompt
+            known_hosts (str, optional): known_hosts file to check host
+                                         keys against, None - keys are
+                                         not checked (as netmiko does)
+            executor (optional): BlockingExecutor for TextFSM parsing
+        """
+        self.device = device
+        self.device_type = device["device_type"]
+        self.profile = PROFILES[self.device_type]
+        self.timeout = timeout
+        self.read_timeout = read_timeout
+        self.known_hosts = known_hosts
+        self.executor = executor
+        self.base_prompt = None
+        self._prompt = None
+        self._last_prompt = ""
+        self._more = re.compile(self.profile["more"])
+        self._conn = None
+        self._process = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def connect(self):
+        import asyncssh
+
+        self._conn = await asyncio.wait_for(
+            asyncssh.connect(
+                self.device.get("ip") or self.device.get("host"),
+                port=self.device.get("port", 22),
+                username=self.device["username"],
+                password=self.device["password"],
+                known_hosts=self.known_hosts,
+                client_keys=None,
+            ),
+            timeout=self.timeout,
+        )
+        self._process = await self._conn.create_process(
+            term_type="vt100", term_size=(511, 24)
+        )
+        await self._detect_prompt()
+        if self.profile["enable"] and self._last_prompt.endswith(">"):
+            await self._enable()
+        for cmd in (self.profile["paging"], self.profile["width"]):
+            if cmd:
+                await self.send_command(cmd)
+
+    async def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            try:
+                await self._conn.wait_closed()
+            except Exception:
+                pass
+            self._conn = None
+
+    async def _write(self, line):
+        self._process.stdin.write(line + "\n")
+
+    async def _read_until(self, pattern, timeout=None):
+        """Read from channel until pattern appears at the end of buffer
+
+        Returns:
+            (str): everything what was read
+        """
+        timeout = timeout or self.read_timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        buffer = ""
+        while True:
+            left = deadline - loop.time()
+            if left <= 0:
+                raise asyncio.TimeoutError(
+                    f"Pattern {pattern.pattern!r} not found on "
+                    f"{self.device.get('ip')}"
+                )
+            chunk = await asyncio.wait_for(
+                self._process.stdout.read(65535), timeout=left
+            )
+            if not chunk:
+                raise EOFError(f"Channel to {self.device.get('ip')} closed")
+            buffer += _ANSI.sub("", chunk).replace("\r", "")
+            tail = buffer[-512:]
+            if self._more.search(tail.splitlines()[-1] if tail else ""):
+                buffer = self._more.sub("", buffer)
+                self._process.stdin.write(" ")
+                continue
+            if pattern.search(tail):
+                return buffer
+
+    async def _detect_prompt(self):
+        await self._write("")
+        output = await self._read_until(_ANY_PROMPT)
+        prompt = output.strip().splitlines()[-1].strip()
+        self._last_prompt = prompt
+        # <HUAWEI>, [~HUAWEI], R1#, R1> - base prompt is the hostname
+        self.base_prompt = prompt.lstrip("<[~*").rstrip(">#]")
+        self._prompt = re.compile(
+            r"[<\[]?[~*]?" + re.escape(self.base_prompt) + r"[^\n]*[>#\]]\s*$"
+        )
+        logger.debug(f"Prompt of {self.device.get('ip')}: {prompt}")
+
+    async def _enable(self):
+        await self._write(self.profile["enable"])
+        output = await self._read_until(
+            re.compile(r"[Pp]assword:\s*$|[>#]\s*$")
+        )
+        if re.search(r"[Pp]assword:\s*$", output):
+            await self._write(self.device.get("secret")
+                              or self.device["password"])
+            output = await self._read_until(self._prompt)
+        self._last_prompt = output.strip().splitlines()[-1].strip()
+
+    def _clean(self, command, output):
+        lines = output.split("\n")
+        if lines and command and command.strip() in lines[0]:
+            lines = lines[1:]
+        if lines and self._prompt.search(lines[-1]):
+            lines = lines[:-1]
+        return "\n".join(lines).strip("\n")
+
+    async def send_command(self, command, read_timeout=None):
+        """Send one command and return its output without echo and prompt
+
+        Args:
+            command (str): command to send
+            read_timeout (int, optional): timeout of waiting for prompt
+
+        Returns:
+            (str): output of command
+        """
+        await self._write(command)
+        output = await self._read_until(self._prompt, read_timeout)
+        return self._clean(command, output)
+
+    async def send_commands(self, commands, read_timeout=None):
+        """Send list of commands one by one
+
+        Args:
+            commands (list): commands or dicts {'command', 'timeout',
+                             'template', 'template_file'}
+                             (see base.send_commands)
+
+        Returns:
+            (list): outputs in the same order as commands
+        """
+        outputs = []
+        for entry in commands:
+            if not isinstance(entry, dict):
+                outputs.append(await self.send_command(entry, read_timeout))
+                continue
+            output = await self.send_command(
+                entry["command"], entry.get("timeout") or read_timeout
+            )
+            if entry.get("template") or entry.get("template_file"):
+                from astarmiko.base import templatizator
+
+                if entry.get("template"):
+                    output = await _blocking(
+                        self.executor, templatizator, output,
+                        entry["template"], self.device_type,
+                    )
+                else:
+                    output = await _blocking(
+                        self.executor, templatizator, output,
+                        entry["template_file"], special=True,
+                    )
+            outputs.append(output)
+        return outputs
+
+    async def send_config_set(self, commands, save=True, read_timeout=None):
+        """Enter configuration mode, send commands, leave it and save config
+
+        Returns:
+            (str): whole output of configuration dialog
+        """
+        if isinstance(commands, str):
+            commands = commands.strip().split("\n")
+        output = [await self.send_command(self.profile["config_enter"])]
+        for cmd in commands:
+            output.append(await self.send_command(cmd, read_timeout))
+        if self.profile["commit"]:
+            output.append(await self.send_command(self.profile["commit"]))
+        output.append(await self.send_command(self.profile["config_exit"]))
+        if save:
+            output.append(await self.save_config())
+        return "\n".join(output)
+
+    async def save_config(self):
+        """Save configuration answering 'yes' to confirmation if asked"""
+        command = self.profile["save"]
+        await self._write(command)
+        either = re.compile(
+            self._prompt.pattern + "|" + _CONFIRM.pattern, re.I
+        )
+        output = await self._read_until(either, 120)
+        if _CONFIRM.search(output.splitlines()[-1] if output else ""):
+            await self._write("y")
+            output += await self._read_until(self._prompt, 120)
+        return self._clean(command, output)
+
+
+async def async_send_commands(device, commands, mode="exec",
+                              read_timeout=None, accounts=None,
+                              known_hosts=None, executor=None):
+    """Async analog of base.send_commands for devices with native driver
+
+    Tries credentials of device first and then every account from
+    accounts (usually ac.add_account) if authentication fails.
+
+    Args:
+        device (dict): dictionary in netmiko format
+        commands (list or str): one command or list of ones
+        mode (str): 'exec' by default, for other use 'config'
+        read_timeout (int, optional): timeout of waiting for every command
+        accounts (list, optional): additional accounts [{user, password}]
+        known_hosts (str, optional): see AsyncCLISession
+        executor (optional): BlockingExecutor for blocking parts (TextFSM,
+                             credential file), default executor of loop
+                             if None
+
+    Returns:
+        exec mode: (str) output of one command or (list) outputs of list
+        config mode: (str) output of configuration dialog
+        False: device can't be reached or no account worked (as
+               base.send_commands)
+    """
+    import asyncssh
+
+    if isinstance(commands, str):
+        commands = commands.strip().split("\n")
+
+    # the account which worked last time is tried first
+    for username, password in credential_affinity.order(device, accounts):
+        candidate = dict(device)
+        candidate["username"] = username
+        candidate["password"] = password
+        try:
+            async with AsyncCLISession(candidate, known_hosts=known_hosts,
+                                       executor=executor) as cli:
+                await _blocking(executor, credential_affinity.remember,
+                                device["ip"], username)
+                if mode == "exec":
+                    outputs = await cli.send_commands(commands, read_timeout)
+                    return outputs[0] if len(outputs) == 1 else outputs
+                return await cli.send_config_set(
+                    commands, read_timeout=read_timeout
+                )
+        except asyncssh.PermissionDenied:
+            logger.warning(
+                f"Authentication failed for "
+                f"{candidate['username']}@{candidate['ip']}"
+            )
+            await _blocking(executor, credential_affinity.forget,
+                            device["ip"], username)
+            continue
+        except (asyncssh.Error, OSError, EOFError,
+                asyncio.TimeoutError) as error:
+            logger.warning(f"Session to {device['ip']} failed: "
+                           f"{type(error).__name__}: {error}")
+            return False
+    logger.error(f"All authentication attempts failed for {device['ip']}")
+    return False
@@ -1,27 +1,22 @@
 import os
 import yaml
-import textfsm
 import logging
 import re
 import time
 import sys
 from typing import Optional, Any, List, Dict, Union
-from pysnmp.hlapi.v3arch.asyncio import (
-        CommunityData,
-        SnmpEngine,
-        UdpTransportTarget,
-        ObjectType,
-        ObjectIdentity,
-        ContextData,
-        get_cmd,
-        )
-
-# from future.backports.test.pystone import TRUE
-from netmiko import (
-    ConnectHandler,
-    NetmikoTimeoutException,
-    NetmikoAuthenticationException,
+from astarmiko.session_pool import pool as session_pool
+from astarmiko.template_cache import registry as template_registry
+from astarmiko.reachability import cache as reachability
+from astarmiko.credentials import affinity as credential_affinity
+from astarmiko.inventory import InventoryIndex, InventoryView
+from astarmiko.snapshot import store as snapshots
+from astarmiko.topology import topology
+from astarmiko.memo import ResultCache, cache as getinfo_cache
+from astarmiko.snmp import (
+    SnmpError, client as snmp_client, read_table as snmp_read_table,
 )
+from astarmiko.sweep import probe as sweep_probe, sweep as sweep_ips
 
 ac = ""  # Global object represent configuration attributes
 
@@ -107,12 +102,14 @@ def setup_config(path_to_conf):
     ac = Astarconf(path_to_conf)
     ac.localpath = os.path.expanduser(ac.localpath) if ac.localpath.startswith("~") else ac.localpath
     ac._data = {k: os.path.expanduser(v.replace("~", ac.localpath)) if isinstance(v, str) and v.startswith("~/") else v for k, v in ac._data.items()}
+    snapshot_conf = conf_section('snapshot')
+    if snapshot_conf:
+        snapshots.configure(**snapshot_conf)
     try:
         dict_of_cmd = getattr(ac, 'dict_of_cmd', None)
         if isinstance(dict_of_cmd, str)  and dict_of_cmd.startswith("~/"):
             dict_of_cmd = os.path.expanduser(dict_of_cmd)
-            with open(dict_of_cmd) as f:
-                commands = yaml.safe_load(f)
+            commands = snapshots.load_yaml(dict_of_cmd)
             ac.commands = commands['commands']
     except AttributeError:
         pass
@@ -132,6 +129,59 @@ def setup_config(path_to_conf):
     setup_logging(level=level, log_file=log_file, format_str=format_str,
                   enable_console=enable_console)
 
+    pool_conf = conf_section('session_pool')
+    if pool_conf:
+        session_pool.configure(**pool_conf)
+
+    memo_conf = conf_section('getinfo_cache')
+    if memo_conf:
+        getinfo_cache.configure(**memo_conf)
+
+    topology_conf = conf_section('topology')
+    if topology_conf:
+        topology.configure(**topology_conf)
+
+    reach_conf = conf_section('reachability')
+    if reach_conf:
+        reachability.configure(**reach_conf)
+
+    snmp_conf = conf_section('snmp')
+    if snmp_conf:
+        snmp_client.configure(**snmp_conf)
+
+    credential_cache = getattr(ac, 'credential_cache', None)
+    if credential_cache:
+        credential_affinity.configure(path=credential_cache)
+
+    if getattr(ac, 'preload_templates', False):
+        preload_templates()
+
+
+# commands answered from the whole ARP or MAC table
+_TABLE_OF = {
+    "arp_by": "arp_table",
+    "arp_table": "arp_table",
+    "mac_addr_tbl": "mac_addr_tbl",
+    "mac_addr_tbl_by": "mac_addr_tbl",
+    "mac_addr_tbl_byport": "mac_addr_tbl",
+}
+
+
+def conf_section(name, conf=None):
+    ''' Return nested section of configuration as plain dict
+
+    Args:
+        name (str): name of section in astarmiko.yaml
+        conf (Astarconf, optional): configuration object, default is ac
+
+    Returns:
+        section (dict): section or empty dict if it is absent
+    '''
+    conf = ac if conf is None else conf
+    getter = getattr(conf, 'get', None)
+    section = getter(name, None) if callable(getter) else None
+    return section if isinstance(section, dict) else {}
+
 
 def normalize_name(name: str) -> str:
     return ''.join(c for c in name.lower() if c.isalnum())
@@ -160,21 +210,12 @@ async def snmp_get_oid(
         result (str): value of oid
     """
 
-    if version == 1:
-        snmp_engine = CommunityData(community, mpModel=0)
-    else:
-        snmp_engine = CommunityData(community, mpModel=1)
-    snmpEngine = SnmpEngine()
-
-    iterator = get_cmd(
-        snmpEngine,
-        snmp_engine,
-        await UdpTransportTarget.create((host, port)),
-        ContextData(),
-        ObjectType(ObjectIdentity(oid)),
+    # one engine of the shared client, pysnmp is loaded on the first use
+    answer = await snmp_client.request(
+        host, [oid], community=community, version=version, port=port
     )
+    errorIndication, errorStatus, errorIndex, varBinds = answer
     result = []
-    errorIndication, errorStatus, errorIndex, varBinds = await iterator
 
     if prnerr:
         if errorIndication:
@@ -225,20 +266,35 @@ def ping_one_ip(ip_address):
     return reply.returncode
 
 
-def is_device_available(ip):
-    """Check if device is reachable"""
+def _ping_probe(ip):
     try:
-        return ping_one_ip(ip) == 0
+        return sweep_probe(ip, conf_section('sweep'))
     except Exception as e:
         logger.warning(f"Ping check failed for {ip}: {str(e)}")
         return False
 
 
-def _try_connect(device, func, *args, **kwargs):
-    """Internal function to handle connection attempts with availability check
+def is_device_available(ip):
+    """Check if device is reachable
+
+    The result is taken from the reachability cache while it is fresh,
+    ping is run only for unknown or expired addresses
     """
+    return reachability.check(ip, _ping_probe)
 
 
+def _try_connect(device, func, *args, retry=False, **kwargs):
+    """Internal function to handle connection attempts with availability check
+
+    retry allows to repeat func on a new session if the pooled one
+    broke down (see SessionPool.run), only for idempotent func
+    """
+    # netmiko (with paramiko) is loaded on the first connection only
+    from netmiko import (
+        NetmikoTimeoutException,
+        NetmikoAuthenticationException,
+    )
+
     def connect_with_credentials(device_params):
         if not is_device_available(device_params["ip"]):
             logger.warning(
@@ -250,15 +306,19 @@ def _try_connect(device, func, *args, **kwargs):
             start_msg = "Connecting to {}..."
             logger.info(start_msg.format(device_params["ip"]))
 
-            with ConnectHandler(**device_params) as ssh:
-                ssh.enable()
-                return func(ssh, *args, **kwargs)
+            # borrow persistent session from the pool instead of
+            # ConnectHandler + enable() on every command
+            result = session_pool.run(device_params, func, *args,
+                                      retry=retry, **kwargs)
+            reachability.mark(device_params["ip"], True)
+            return result
 
         except NetmikoTimeoutException as error:
             logger.warning(
                     f"Connection timeout to {device_params['ip']}: "
                     f"{error}"
                     )
+            reachability.mark(device_params["ip"], False)
             return False
         except NetmikoAuthenticationException as error:
             logger.warning(
@@ -267,28 +327,74 @@ def _try_connect(device, func, *args, **kwargs):
             )
             raise  # Re-raise to handle in outer function
 
-    # First try with original credentials
-    result = connect_with_credentials(device)
-    if result is not False:
-        return result  # УСПЕШНО – выходим!
-
-    # Try additional accounts if available
-    if hasattr(ac, "add_account"):
-        for account in ac.add_account:
-            try:
-                new_device = device.copy()
-                new_device["username"] = account["user"]
-                new_device["password"] = account["password"]
-                result = connect_with_credentials(new_device)
-                if result is not False:
-                    return result  # УСПЕШНО – выходим!
-            except NetmikoAuthenticationException:
-                continue
+    # the account which worked last time is tried first
+    candidates = credential_affinity.order(
+        device, getattr(ac, "add_account", None) or []
+    )
+    for username, password in candidates:
+        new_device = device.copy()
+        new_device["username"] = username
+        new_device["password"] = password
+        try:
+            result = connect_with_credentials(new_device)
+        except NetmikoAuthenticationException:
+            credential_affinity.forget(device["ip"], username)
+            continue
+        if result is not False:
+            credential_affinity.remember(device["ip"], username)
+            return result  # УСПЕШНО – выходим!
 
     logger.error(f"All authentication attempts failed for {device['ip']}")
     return False
 
 
+def exec_entry(ssh, device_type, entry):
+    '''Send one entry of exec mode list over opened session
+
+    Args:
+        ssh: netmiko connection
+        device_type (str): device_type like in netmiko
+        entry (str or dict): command or {'command', 'timeout', 'template',
+                             'template_file'} (see send_commands)
+
+    Returns:
+        output of command, parsed by template if it is defined
+    '''
+    if not isinstance(entry, dict):
+        return ssh.send_command(entry)
+    if entry.get('timeout'):
+        output = ssh.send_command(entry['command'],
+                                  read_timeout=entry['timeout'])
+    else:
+        output = ssh.send_command(entry['command'])
+    if entry.get('template'):
+        return templatizator(output, entry['template'], device_type)
+    if entry.get('template_file'):
+        return templatizator(output, entry['template_file'], special=True)
+    return output
+
+
+def exec_outputs(commands, output):
+    '''Output of send_commands exec mode as a list, one item per entry
+
+    send_commands returns the output of a single command as is, and for
+    an entry with template it is a list (of rows) as well, so the result
+    of one entry can't be told apart from the outputs of a list
+
+    Args:
+        commands (list or str): commands given to send_commands
+        output: what send_commands (or async_send_commands) returned
+
+    Returns:
+        list: outputs in order of commands
+    '''
+    if isinstance(commands, str):
+        commands = commands.strip().split('\n')
+    if len(commands) > 1 and isinstance(output, list):
+        return output
+    return [output]
+
+
 def send_commands(device, commands, mode='exec', validate_each=False):
     '''
     Main function to send command to device
@@ -297,8 +403,18 @@ def send_commands(device, commands, mode='exec', validate_each=False):
         device (str): name of device from activka_byname.yaml
         commands (list or str): one command or list of ones
                     if string - convert to list
+                    in exec mode every entry of list may be a dict
+                    {'command': str, 'timeout': seconds to wait for output,
+                     'template': abbreviated command (TextFSM template
+                                 for device_type of device) or
+                     'template_file': name of file in ac.templpath}
         mode (str): 'exec' by default, for other use 'config'
                 if the value is different it is interpreted as config mode
+
+    Returns:
+        exec mode: output (str or parsed list) of one command or list of
+                   outputs in order of commands, all sent over one session
+        config mode: output of config dialog
     '''
     if isinstance(commands, str):
         commands = commands.strip().split('\n')
@@ -309,7 +425,9 @@ def send_commands(device, commands, mode='exec', validate_each=False):
                             r'Unrecognized')
 
     def exec_mode(ssh):
-        return ssh.send_command(commands[0])
+        outputs = [exec_entry(ssh, device['device_type'], entry)
+                   for entry in commands]
+        return outputs[0] if len(outputs) == 1 else outputs
 
     def config_mode(ssh):
         if validate_each:
@@ -326,8 +444,9 @@ def send_commands(device, commands, mode='exec', validate_each=False):
             result += ssh.send_command_timing('write')
             return result
 
-    func = exec_mode if mode == 'exec' else config_mode
-    return _try_connect(device, func)
+    if mode == 'exec':
+        return _try_connect(device, exec_mode, retry=True)
+    return _try_connect(device, config_mode)
 
 
 def templatizator(*args, special=False):
@@ -355,17 +474,35 @@ def templatizator(*args, special=False):
     """
     if not special:
         if args[2] == "nt":
-            tf = ac.templpath + "nt_" + args[1] + ".template"
+            name = "nt_" + args[1] + ".template"
         elif args[2] == "posix":
-            tf = ac.templpath + "posix_" + args[1] + ".template"
+            name = "posix_" + args[1] + ".template"
         else:
-            tf = ac.templpath + args[2] + "_" + args[1] + ".template"
+            name = args[2] + "_" + args[1] + ".template"
     else:
-        tf = ac.templpath + args[1]
-    with open(tf) as tmpl:
-        fsm = textfsm.TextFSM(tmpl)
-        result = fsm.ParseText(args[0])
-    return result
+        name = args[1]
+    # compiled template is taken from the registry, not parsed every call
+    return template_registry.parse(os.path.join(ac.templpath, name), args[0])
+
+
+def preload_templates():
+    """Compile and validate all TextFSM templates from ac.templpath
+
+    Returns:
+        errors (dict): {file name: error message} of broken templates
+    """
+    return template_registry.preload(ac.templpath)
+
+
+_PORT_LONG_NAMES = {
+    "100GE": "100GE",
+    "10GE": "10GE",
+    "XGE": "XGigabitEthernet",
+    "GE": "GigabitEthernet",
+    "Gi": "GigabitEthernet",
+    "Fa": "FastEthernet",
+    "Ser": "Serial",
+}
 
 
 def port_name_normalize(port):
@@ -378,30 +515,13 @@ def port_name_normalize(port):
         port (str): name of port from device's console
 
     Returns:
-        (str) correct long format of port name
+        (str) correct long format of port name, any other name (long
+              already, Eth-Trunk, Po, ifName read by SNMP) as is
     """
-    portnorm = []
-    m = re.search(r"(Eth-Trunk|Po|10GE|100GE|GE|Gi|XGE|Fa|Ser)(\S+)", port)
-    if m:
-        if m.group(1) == "Eth-Trunk" or m.group(1) == "Po":
-            portnorm = f"{m.group(0)}"
-            return portnorm
-        else:
-            if m.group(1)[0] == "1":
-                if m.group(1)[2] == "0":
-                    longname = "100GE"
-                else:
-                    longname = "10GE"
-            if m.group(1)[0] == "G":
-                longname = "GigabitEthernet"
-            if m.group(1)[0] == "X":
-                longname = "XGigabitEthernet"
-            if m.group(1)[0] == "F":
-                longname = "FastEthernet"
-            if m.group(1)[0] == "S":
-                longname = "Serial"
-            portnorm = f"{longname}{m.group(2)}"
-            return portnorm
+    m = re.fullmatch(r"(100GE|10GE|XGE|GE|Gi|Fa|Ser)(\d\S*)", port)
+    if not m:
+        return port
+    return f"{_PORT_LONG_NAMES[m.group(1)]}{m.group(2)}"
 
 
 def get_port_by_mac(device, mac):
@@ -578,9 +698,60 @@ class TimeMeasure:
         print(f'Время выполнения программы заняло: {time.time() - self.start}')
 
 
+def compile_inventory(path):
+    """Parse activka_byname.yaml and build everything Activka derives from it
+
+    Args:
+        path (str): path to activka_byname.yaml
+
+    Returns:
+        inventory (dict): wholedict, realdevices, devices, levels, segment,
+                          normalized_lookup, dev_type, by_ip, index
+    """
+    with open(path) as fyaml:
+        wholedict = yaml.safe_load(fyaml)
+    dev_type = {}
+    by_ip = {}
+    realdevices = list(wholedict.keys())
+    realdevices.remove("LEVEL")
+    realdevices.remove("SEGMENT")
+    # Приводим все ключи wholedict к нижнему регистру 
+    wholedict = {k.lower(): v for k, v in wholedict.items()}
+    devices = list(wholedict.keys())
+    devices.remove("level")
+    devices.remove("segment")
+
+    # LEVEL и SEGMENT тоже
+    levels = {k.lower(): v for k, v in wholedict["level"].items()}
+    segment = {k.lower(): v for k, v in wholedict["segment"].items()}
+
+    del wholedict["level"]
+    del wholedict["segment"]
+
+    for d in devices:
+        dev_type[d] = wholedict[d]["device_type"]
+        by_ip[wholedict[d]["ip"]] = d
+
+    return {
+        "wholedict": wholedict,
+        "realdevices": realdevices,
+        "devices": devices,
+        "levels": levels,
+        "segment": segment,
+        # Создаём словарь нормализованных имён для удобного поиска
+        "normalized_lookup": {normalize_name(k): k for k in devices},
+        "dev_type": dev_type,
+        "by_ip": by_ip,
+        "index": InventoryIndex(segment, levels, dev_type),
+    }
+
+
 class Activka:
     """The class represents all our network devices - routers and switches"""
 
+    # shared whole ARP/MAC tables, see share_tables()
+    table_cache = None
+
     def __init__(self, byname, *args):
         """Class initialisation
 
@@ -593,44 +764,28 @@ class Activka:
         username = ac.user
         password = ac.password
         ac.localpath = os.path.expanduser(ac.localpath) if ac.localpath.startswith("~") else ac.localpath
-        with open(ac.localpath + 'YAML/' +  byname) as fyaml:
-            wholedict = yaml.safe_load(fyaml)
+        # parsed YAML and derived dictionaries are taken from the
+        # compiled snapshot while activka_byname.yaml is unchanged
+        inventory = snapshots.load(ac.localpath + 'YAML/' + byname,
+                                   compile_inventory, kind="inventory")
         if args:
-            with open(ac.localpath + args[0]) as fyaml:
-                allip = yaml.safe_load(fyaml)
-            self.routerbyip = allip
-        dev_type = {}
-        by_ip = {}
-        realdevices = list(wholedict.keys())
-        realdevices.remove("LEVEL")
-        realdevices.remove("SEGMENT")
-        self.realdevices = realdevices
-        # Приводим все ключи wholedict к нижнему регистру 
-        wholedict = {k.lower(): v for k, v in wholedict.items()}
-        devices = list(wholedict.keys())
-        devices.remove("level")
-        devices.remove("segment")
-        self.devices = devices
-
-        # LEVEL и SEGMENT тоже
-        self.levels = {k.lower(): v for k, v in wholedict["level"].items()}
-        self.segment = {k.lower(): v for k, v in wholedict["segment"].items()}
-
-        del wholedict["level"]
-        del wholedict["segment"]
-
-        # Создаём словарь нормализованных имён для удобного поиска
-        self.normalized_lookup = {normalize_name(k): k for k in self.devices}
-
-        for d in devices:
+            self.routerbyip = snapshots.load_yaml(ac.localpath + args[0])
+        self.realdevices = inventory["realdevices"]
+        self.devices = inventory["devices"]
+        self.levels = inventory["levels"]
+        self.segment = inventory["segment"]
+        self.normalized_lookup = inventory["normalized_lookup"]
+        wholedict = inventory["wholedict"]
+        # credentials are never stored in the snapshot
+        for d in self.devices:
             wholedict[d]["username"] = username
             wholedict[d]["password"] = password
-            dev_type[d] = wholedict[d]["device_type"]
-            by_ip[wholedict[d]["ip"]] = d
-        
+
         self.wholedict = wholedict
-        self.dev_type = dev_type
-        self.by_ip = by_ip
+        self.dev_type = inventory["dev_type"]
+        self.by_ip = inventory["by_ip"]
+        # inverted indexes segment/level/device_type -> devices
+        self.index = inventory["index"]
 
 
     def find_real_device_name(self, user_input: str) -> Optional[str]:
@@ -671,17 +826,20 @@ class Activka:
             out[real_device] = self.wholedict[real_device]
         return out
 
-    def filter(self, device_type=None, levels=None, segment=None):
+    def filter(self, device_type=None, levels=None, segment=None,
+               lazy=False):
         """Function select devices from our device filtered by 3 parameters
 
         Args:
-            device_type (str):  device_type like in netmiko
-            levels (list): type of device -
+            device_type (str or list):  device_type like in netmiko
+            levels (str or list): type of device -
                             'R' - router
                             'L3' - L3 swith
                             'L2' - L2 switch
-            segment (list): segments of networks
+            segment (str or list): segments of networks
             (see documentation for activka_byname.yaml)
+            lazy (bool, optional): return read-only InventoryView instead
+                                   of new dictionary
 
         Returns:
             cycle2 (dict): dictionary of the form
@@ -689,34 +847,20 @@ class Activka:
                            filtered from wholedict by parameters device_type,
                            levels or segment
         """
-        cycle1 = {}
-        cycle2 = {}
-        if segment:
-            device_by_seg = [
-                key for key in self.segment.keys() if
-                self.segment[key] == segment
-            ]
-        if device_type:
-            if not segment:
-                list_to_lookup = list(self.wholedict.keys())
-            else:
-                list_to_lookup = device_by_seg
-            cycle1 = {
-                d: self.wholedict[d]
-                for d in list_to_lookup
-                if self.wholedict[d]["device_type"] in device_type
-            }
-        else:
-            if not segment:
-                cycle1 = self.wholedict
-            else:
-                cycle1 = {d: self.wholedict[d] for d in device_by_seg}
-        if levels:
-            cycle2 = {d: cycle1[d] for d in cycle1.keys() if
-                      self.levels[d] in levels}
-        else:
-            cycle2 = cycle1
-        return cycle2
+        names = self.index.select(device_type, levels, segment)
+        view = InventoryView(self.wholedict, names, self.index.order)
+        if lazy:
+            return view
+        return dict(view.items())
+
+    def select(self, device_type=None, levels=None, segment=None):
+        """Names of devices filtered by device_type, levels and segment
+           (every parameter is a value or a list of values)
+
+        Returns:
+            (set): device names, use set operations to combine selections
+        """
+        return self.index.select(device_type, levels, segment)
 
     def setconfig(self, device, commands):
         """Functions change configuration by commands
@@ -731,6 +875,8 @@ class Activka:
         device = device.lower()
         dev = self.choose(device, withoutname=True)
         result = send_commands(dev, commands, mode='config')
+        # configuration changed - cached show outputs are outdated
+        getinfo_cache.invalidate(device)
         return result
 
     def _get_neighbor_by_port(self, device, func, *args):
@@ -749,25 +895,74 @@ class Activka:
         port = args[0]
         m = re.search(r"(Eth-Trunk|Po)(\S+)", port)
         if m:
-            port = self.getinfo(device, "ethchannel_member",
-                                m.group(2))[0][0][0]
-            port = port_name_normalize(port)
-        nblist = self.getinfo(device, "neighbor", "pusto")
-        subintf = re.compile(r"\.\d+")
-        p = subintf.search(port)
-        if p:
-            intf = port[0: p.start(0)]
-        else:
-            intf = port
-        for neighbor in nblist:
-            lp = subintf.search(neighbor[1])
-            if lp:
-                intl = neighbor[1][0: lp.start(0)]
-            else:
-                intl = neighbor[1]
-            if intf == intl:
-                return neighbor[0]
-        return False
+            port = self.channel_members(device, m.group(2))[0]
+        # adjacencies are taken from the topology cache, the neighbor
+        # table is read from the device only when it is stale
+        if not topology.fresh(device):
+            self.refresh_topology(device)
+        return topology.neighbor(device, port) or False
+
+    def channel_members(self, device, channel):
+        """Member ports of Eth-Trunk / Port-channel (cached in topology)
+
+        Args:
+            device (str): device's name
+            channel (str): number of port-channel
+
+        Returns:
+            members (list): names of member ports in normalize form
+        """
+        device = device.lower()
+        members = topology.members(device, channel)
+        if members is None:
+            outlist = self.getinfo(device, "ethchannel_member", channel)
+            members = [port_name_normalize(p) for p in outlist[0][0]]
+            topology.set_members(device, channel, members)
+        return members
+
+    def refresh_topology(self, device):
+        """Read cdp/lldp neighbor table of device into the topology cache
+
+        Returns:
+            (bool): False if neighbor table was not read
+        """
+        device = device.lower()
+        neighbors = self.getinfo(device, "neighbor", "pusto")
+        if neighbors is False:
+            # device didn't answer - nothing to cache
+            return False
+        topology.update(device, neighbors)
+        return True
+
+    def crawl_topology(self, devices=None, workers=None, background=False):
+        """Refresh the topology cache for many devices in parallel
+
+        Args:
+            devices (iterable, optional): device names, default - all
+            workers (int, optional): devices polled at the same time
+            background (bool): run crawl in daemon thread and return it
+
+        Returns:
+            errors (dict): {device: message} or threading.Thread
+                           if background is True
+        """
+        devices = list(devices) if devices is not None else list(self.devices)
+
+        def fetch(device):
+            neighbors = self.getinfo(device, "neighbor", "pusto")
+            if neighbors is False:
+                raise ConnectionError(f"no neighbors read from {device}")
+            return neighbors
+
+        if background:
+            import threading
+
+            thread = threading.Thread(target=topology.crawl,
+                                      args=(devices, fetch, workers),
+                                      daemon=True)
+            thread.start()
+            return thread
+        return topology.crawl(devices, fetch, workers)
 
     def _mac_addr_tbl_byport(self, dev, outlist, isEdgedPort):
         """Sub-Function for self.getinfo()  Get mac address table
@@ -789,6 +984,20 @@ class Activka:
         todo = send_commands(dev, command, mode='exec')
         outwhole = templatizator(todo, "mac_addr_tbl_byport",
                                  dev["device_type"])
+        return self._edge_port_status(outlist[0][2], outwhole, isEdgedPort)
+
+    @staticmethod
+    def _edge_port_status(port, outwhole, isEdgedPort=True):
+        """Decide whether port is edge port by its mac address table
+
+        Args:
+            port (str): port name in normalize form
+            outwhole (list): mac address table of this port [[MAC, VLAN, INTF]]
+            isEdgedPort (bool): initial status
+
+        Returns:
+            list [port, isEdgedPort]
+        """
         if len(outwhole) > 2:
             if (
                 len(outwhole) == 3
@@ -801,10 +1010,102 @@ class Activka:
                 ):  # All our phones have a MAC starting with 805e,
                     # but there could be others.
                     if mac in outwhole[2][0]:
-                        return [outlist[0][2], isEdgedPort]
+                        return [port, isEdgedPort]
             else:
                 isEdgedPort = False
-        return [outlist[0][2], isEdgedPort]
+        return [port, isEdgedPort]
+
+    def share_tables(self, ttl=300):
+        """Answer arp_by and mac_addr_tbl_by from whole ARP and MAC tables
+           read once per device and shared by all lookups (batch mode of fh)
+
+        Args:
+            ttl (int): seconds the tables are reused, 0 - switch sharing off
+        """
+        self.table_cache = (ResultCache(enabled=True, volatile_ttl=ttl,
+                                        stable_ttl=ttl) if ttl else None)
+
+    def _by_snmp(self, device, func):
+        """True if the table behind func is read from device by SNMP
+           (commands.yaml 'snmp_tables')
+        """
+        table = _TABLE_OF.get(func)
+        if not table:
+            return False
+        device_type = self.choose(device, withoutname=True)["device_type"]
+        tables = ac.commands.get("snmp_tables", {}).get(device_type)
+        return table in (tables or ())
+
+    def read_table(self, device, func):
+        """Whole ARP (func='arp_table') or MAC ('mac_addr_tbl') table of
+           device in the form of arp_by / mac_addr_tbl_byport templates
+
+        Device types selected in 'snmp_tables' of commands.yaml are read by
+        SNMP (IP-MIB, Q-BRIDGE-MIB), by CLI if SNMP is not answering
+
+        Returns:
+            rows (list): [[ADDR, MAC, INTF]] or [[MAC, VLAN, INTF]],
+                         MAC in the notation of device_type
+            False (bool): the table is not read
+        """
+        dev = self.choose(device, withoutname=True)
+        device_type = dev["device_type"]
+        if self._by_snmp(device, func):
+            try:
+                rows = snmp_read_table(dev["ip"], func)
+            except SnmpError as error:
+                logger.warning(f"{device}: {func} by SNMP failed, "
+                               f"CLI is used: {error}")
+            else:
+                col = 1 if func == "arp_table" else 0
+                if device_type in ac.commands.get("mac_delimeters", {}):
+                    for row in rows:
+                        row[col] = convert_mac(row[col], device_type)
+                return rows
+        command = ac.commands.get(func, {}).get(device_type)
+        if not command:
+            return False
+        todo = send_commands(dev, command, mode='exec')
+        if not todo:
+            return False
+        template = "arp_by" if func == "arp_table" else "mac_addr_tbl_byport"
+        return templatizator(todo, template, device_type)
+
+    def _full_table(self, device, func):
+        """Whole arp_table or mac_addr_tbl of device, shared by lookups
+           when share_tables() is on
+        """
+        if self.table_cache is None:
+            return self.read_table(device, func)
+        return self.table_cache.call(
+            device, func, (), lambda: self.read_table(device, func)
+        )
+
+    def _from_shared_tables(self, device, func, value):
+        """arp_by / mac_addr_tbl_by answered from shared tables,
+           None if the device has no whole table
+        """
+        def digits(mac):
+            # the same mac in any notation
+            return re.sub(r"[^0-9a-f]", "", mac.lower())
+
+        mac = digits(value)
+        if func == "arp_by":
+            rows = self._full_table(device, "arp_table")
+            if rows is False:
+                return None
+            found = [row for row in rows
+                     if row[0] == value or digits(row[1]) == mac]
+            return found or False
+        rows = self._full_table(device, "mac_addr_tbl")
+        if rows is False:
+            return None
+        found = [row for row in rows if digits(row[0]) == mac]
+        if not found:
+            return False
+        port = port_name_normalize(found[0][2])
+        on_port = [row for row in rows if port_name_normalize(row[2]) == port]
+        return self._edge_port_status(port, on_port)
 
     def getinfo(self, device, func, *args, othercmd=False, txtFSMtmpl=False):
         """The function receives the output of a command (func)
@@ -834,6 +1135,31 @@ class Activka:
 
         """
         device = device.lower()
+        # repeated queries are answered by the memoization layer
+        # (getinfo_cache of astarmiko.yaml) when it is enabled
+        return getinfo_cache.call(
+            device, func, (args, othercmd, txtFSMtmpl),
+            lambda: self._getinfo(device, func, *args, othercmd=othercmd,
+                                  txtFSMtmpl=txtFSMtmpl),
+        )
+
+    def _getinfo(self, device, func, *args, othercmd=False, txtFSMtmpl=False):
+        """getinfo() without memoization"""
+        standard = not othercmd and not txtFSMtmpl
+        if standard and func in ("arp_by", "mac_addr_tbl_by") and (
+                self.table_cache is not None or self._by_snmp(device, func)):
+            shared = self._from_shared_tables(device, func, args[0])
+            if shared is not None:
+                return shared
+        if (standard and func in ("arp_table", "mac_addr_tbl",
+                                  "mac_addr_tbl_byport")
+                and self._by_snmp(device, func)):
+            rows = self._full_table(device, _TABLE_OF[func])
+            if func == "mac_addr_tbl_byport" and rows:
+                port = port_name_normalize(args[0])
+                rows = [row for row in rows
+                        if port_name_normalize(row[2]) == port]
+            return rows or False
         if func == "neighbor_by_port":
             return self._get_neighbor_by_port(device, func, args[0])
 
@@ -914,43 +1240,83 @@ class Activka:
     def list_of_all_ip_intf(self, device):
         """Function get all ip interface on device
 
+        All data is read over one session: where 'ip_int_br' has no
+        prefix length (cisco_ios) it is taken from the output of
+        'ip_int_prefix' command sent together with it
+
         Args:
             device (str): name of device
 
         Returns:
             todo (list): list of [interface, ip_address, mask, status(up|down),
-                         protocol(up|down)]
+                         protocol(up|down)], mask is prefix length (None
+                         for NVI0)
         """
-        mask = {
-            "255.255.255.255": "32",
-            "255.255.255.252": "30",
-            "255.255.255.248": "29",
-            "255.255.255.240": "28",
-            "255.255.255.224": "27",
-            "255.255.255.192": "26",
-            "255.255.255.128": "25",
-            "255.255.255.0": "24",
-            "255.255.254.0": "23",
-        }
         device = device.lower()
         exclude_intf = ["NVI0"]
         dev = self.choose(device, withoutname=True)
-        regexp = r"ip address \S+\s+(\S+)"
         command = ac.commands["ip_int_br"][dev["device_type"]]
         template = f"{dev['device_type']}_ip_int_br.template"
-        todo = self.getinfo(device, command, othercmd=True,
-                            txtFSMtmpl=template)
-        if todo:
-            if dev["device_type"] == "cisco_ios":
-                for line in todo:
-                    if line[0] in exclude_intf:
-                        continue
-                    int_conf = self.getinfo(
-                        device, f"sh runn int {line[0]}", othercmd=True
-                    )
-                    mask_long = re.search(regexp, int_conf).group(1)
-                    line.insert(2, mask[mask_long])
-        return todo
+        prefix_cmd = ac.commands.get("ip_int_prefix", {}).get(
+            dev["device_type"]
+        )
+        if not prefix_cmd:
+            return self.getinfo(device, command, othercmd=True,
+                                txtFSMtmpl=template)
+        outputs = send_commands(dev, [command, prefix_cmd], mode='exec')
+        if not outputs:
+            return False
+        todo = templatizator(outputs[0], template, special=True)
+        # {ip address: prefix length}
+        prefixes = {
+            addr: mask for intf, addr, mask in
+            templatizator(outputs[1], "ip_int_prefix", dev["device_type"])
+        }
+        for line in todo:
+            # NVI0 shares the address of another interface, it has no
+            # prefix of its own
+            mask = None if line[0] in exclude_intf else prefixes.get(line[1])
+            line.insert(2, mask)
+        return todo or False
+
+    def ip_interfaces(self, devices=None, workers=16):
+        """list_of_all_ip_intf for many devices in parallel
+
+        Args:
+            devices (iterable, optional): device names, default - all R
+                                          and L3 devices
+            workers (int): devices polled at the same time
+
+        Returns:
+            Dictionary with results:
+            {
+                'success': {device: list_of_all_ip_intf(device)},
+                'failed': {device: error_message}
+            }
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if devices is None:
+            devices = sorted(self.select(levels=["R", "L3"]),
+                             key=self.index.order.get)
+        results = {'success': {}, 'failed': {}}
+
+        def work(device):
+            try:
+                todo = self.list_of_all_ip_intf(device)
+            except Exception as e:
+                return device, None, str(e)
+            if todo is False:
+                return device, None, "No output from device"
+            return device, todo, None
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for device, todo, error in pool.map(work, devices):
+                if error:
+                    results['failed'][device] = error
+                else:
+                    results['success'][device] = todo
+        return results
 
     def execute_on_devices(
         self,
@@ -975,6 +1341,8 @@ class Activka:
                 'failed': {device: error},
                 'unreachable': [devices]
             }
+            output of several commands is joined by newline, or is a list
+            (one item per command) if some of them are parsed by template
         """
         if isinstance(devices, str):
             devices = [devices]
@@ -993,14 +1361,15 @@ class Activka:
                 continue
 
             try:
-                output = []
-                for cmd in commands:
-                    result = self.getinfo(device_name, cmd, othercmd=True)
-                    output.append(result)
-
-                results["success"][device_name] = (
-                    "\n".join(output) if len(output) > 1 else output[0]
+                # all commands over one session
+                output = exec_outputs(
+                    commands, send_commands(device, commands, mode='exec')
                 )
+                if len(output) == 1:
+                    output = output[0]
+                elif all(isinstance(item, str) for item in output):
+                    output = "\n".join(output)
+                results["success"][device_name] = output
             except Exception as e:
                 results["failed"][device_name] = str(e)
 
@@ -1048,7 +1417,11 @@ class Activka:
 
             try:
                 output = []
-                result = send_commands(device, commands, mode='config')
+                try:
+                    result = send_commands(device, commands, mode='config')
+                finally:
+                    # even a failed push may have changed something
+                    getinfo_cache.invalidate(device_name)
                 output.append(result)
                 results["success"][device_name] = (
                     "\n".join(output) if len(output) > 1 else output[0]
@@ -1059,10 +1432,34 @@ class Activka:
         return results
 
     def _is_device_available(self, device: dict) -> bool:
-        """Check if device is reachable and responsive"""
+        """Check if device is reachable and responsive
+           (the result is cached, see reachability.py)
+        """
+        return reachability.check(device["ip"],
+                                  lambda ip: self._probe_device(device))
+
+    def sweep_reachability(self, devices=None):
+        """Probe reachability of many devices at once (see sweep.py)
+           and store results in the reachability cache
+
+        Args:
+            devices (list, optional): device names, default all devices
+
+        Returns:
+            (dict): {device_name: True if device answered}
+        """
+        devices = self.devices if devices is None else [
+            d.lower() for d in devices
+        ]
+        ips = {self.wholedict[d]["ip"]: d for d in devices}
+        result = sweep_ips(list(ips), conf_section('sweep'))
+        return {ips[ip]: up for ip, up in result.items()}
+
+    def _probe_device(self, device: dict) -> bool:
+        """Ping device and check TCP connection to SSH port"""
         try:
             # First check basic ping
-            if ping_one_ip(device["ip"]) != 0:
+            if not _ping_probe(device["ip"]):
                 return False
 
             # Then check if we can establish TCP connection to SSH port
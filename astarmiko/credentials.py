@@ -0,0 +1,114 @@
+# credentials.py
+"""
+Credential affinity: which account last worked for a device.
+
+When the primary account (ac.user) doesn't work on a device, the
+accounts of ac.add_account are tried in turn. The account that succeeded
+is remembered and tried first next time, so devices accepting only
+a local fallback account don't cost several failed AAA round trips
+per command. Optionally the records are persisted to a JSON file
+(only user names are stored, never passwords).
+"""
+import json
+import logging
+import os
+import threading
+from astarmiko.snapshot import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+class CredentialAffinity:
+    """Map ip of device -> user name of account that worked last time"""
+
+    def __init__(self, path=None):
+        self.path = None
+        self._preferred = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if path:
+            self.configure(path=path)
+
+    def configure(self, path=None):
+        """Set file for persistent records (key credential_cache of
+           astarmiko.yaml) and load it
+        """
+        self.path = os.path.expanduser(path) if path else None
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as error:
+            logger.warning(f"Can't read {self.path}: {error}")
+            return
+        with self._lock:
+            self._preferred.update(data)
+
+    def save(self):
+        if not self.path:
+            return
+        # one writer at a time, so the last records are written last
+        with self._save_lock:
+            with self._lock:
+                data = json.dumps(self._preferred, indent=1, sort_keys=True)
+            try:
+                atomic_write(self.path, data)
+            except OSError as error:
+                logger.warning(f"Can't write {self.path}: {error}")
+
+    def preferred(self, ip):
+        with self._lock:
+            return self._preferred.get(ip)
+
+    def order(self, device, accounts=None):
+        """Credentials to try for device, the remembered one first
+
+        Args:
+            device (dict): dictionary in netmiko format (primary account
+                           in username/password)
+            accounts (list, optional): [{'user': , 'password': }] usually
+                                       ac.add_account
+
+        Returns:
+            (list): [(username, password), ...] without duplicates
+        """
+        candidates = [(device["username"], device["password"])]
+        for account in accounts or []:
+            if not account.get("user"):
+                continue
+            candidate = (account["user"], account["password"])
+            if candidate not in candidates:
+                candidates.append(candidate)
+        preferred = self.preferred(device["ip"])
+        for i, candidate in enumerate(candidates):
+            if candidate[0] == preferred and i:
+                candidates.insert(0, candidates.pop(i))
+                break
+        return candidates
+
+    def remember(self, ip, username):
+        """Account username worked on device ip"""
+        with self._lock:
+            changed = self._preferred.get(ip) != username
+            self._preferred[ip] = username
+        if changed:
+            self.save()
+
+    def forget(self, ip, username=None):
+        """Authentication failed: drop the record (only if it is about
+           username, when username is given)
+        """
+        with self._lock:
+            if ip not in self._preferred:
+                return
+            if username is not None and self._preferred[ip] != username:
+                return
+            del self._preferred[ip]
+        self.save()
+
+
+affinity = CredentialAffinity()
@@ -0,0 +1,103 @@
+# inventory.py
+"""
+Inverted indexes over the inventory of Activka.
+
+Built once in Activka.__init__: SEGMENT -> devices, LEVEL -> devices,
+device_type -> devices. Selections are set algebra over these indexes,
+so their cost depends on the size of the result, not of the inventory.
+"""
+from collections.abc import Mapping
+
+
+def _as_list(value):
+    if value is None:
+        return None
+    if isinstance(value, (str, bytes)):
+        return [value]
+    return list(value)
+
+
+class InventoryView(Mapping):
+    """Read-only lazy view {device_name: dictionary for connect} over
+       the part of inventory, nothing is copied
+    """
+
+    def __init__(self, source, names, order=None):
+        self._source = source
+        self._names = names
+        self._order = order
+
+    def __getitem__(self, name):
+        if name not in self._names:
+            raise KeyError(name)
+        return self._source[name]
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        if self._order is None:
+            return iter(self._names)
+        return iter(sorted(self._names, key=self._order.__getitem__))
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({sorted(self._names)})"
+
+
+class InventoryIndex:
+    """Indexes segment / level / device_type -> set of device names"""
+
+    def __init__(self, segment, levels, dev_type):
+        """
+        Args:
+            segment (dict): {device_name: segment} (Activka.segment)
+            levels (dict): {device_name: level} (Activka.levels)
+            dev_type (dict): {device_name: device_type} (Activka.dev_type)
+        """
+        self.all = frozenset(dev_type)
+        self.order = {name: i for i, name in enumerate(dev_type)}
+        self.by_segment = self._invert(segment)
+        self.by_level = self._invert(levels)
+        self.by_type = self._invert(dev_type)
+
+    @staticmethod
+    def _invert(mapping):
+        index = {}
+        for name, value in mapping.items():
+            index.setdefault(value, set()).add(name)
+        return index
+
+    def segments(self):
+        """All segments sorted by name"""
+        return sorted(self.by_segment)
+
+    @staticmethod
+    def _union(index, keys):
+        result = set()
+        for key in keys:
+            result |= index.get(key, set())
+        return result
+
+    def select(self, device_type=None, levels=None, segment=None):
+        """Names of devices matching all given criteria
+
+        Every criterion is a value or a list of values (any of them),
+        None means no restriction.
+
+        Returns:
+            (set): device names
+        """
+        result = None
+        for index, keys in ((self.by_segment, _as_list(segment)),
+                            (self.by_type, _as_list(device_type)),
+                            (self.by_level, _as_list(levels))):
+            if keys is None:
+                continue
+            found = self._union(index, keys)
+            result = found if result is None else result & found
+            if not result:
+                return set()
+        return set(self.all) if result is None else result
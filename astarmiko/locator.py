@@ -0,0 +1,348 @@
+# locator.py
+"""
+Fleet-wide location index of hosts.
+
+The collector harvests full ARP tables from R/L3 devices and MAC address
+tables from L2/L3 devices in parallel (one SSH session per device) and
+writes a compact index file:
+
+    IP  -> MAC, router where ARP entry was found
+    MAC -> edge switch, port, VLAN
+
+Records have fixed width and are sorted, so the file is used through
+mmap and binary search without loading it: FindHost answers from it in
+milliseconds instead of walking the switches live.
+
+File layout (all integers big-endian):
+    header   magic, built time, number of IP and MAC records,
+             offset and length of the names table
+    IP       records: ip(4) mac(6) router(2)
+    MAC      records: mac(6) vlan(2) switch(2) port(2) macs_on_port(2)
+    names    JSON list of device and port names referenced by number
+"""
+import ipaddress
+import json
+import logging
+import mmap
+import re
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from astarmiko.snapshot import atomic_write
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ASTLOC01"
+_HEADER = struct.Struct(">8sdIIQI")
+_IP_REC = struct.Struct(">4s6sH")
+_MAC_REC = struct.Struct(">6sHHHH")
+_HEX = re.compile(r"[^0-9a-f]")
+
+
+def mac_key(mac):
+    """MAC address in any notation -> 6 bytes, None if it is not a MAC"""
+    digits = _HEX.sub("", mac.lower())
+    if len(digits) != 12:
+        return None
+    return bytes.fromhex(digits)
+
+
+def mac_str(key):
+    """6 bytes -> 'aa:bb:cc:dd:ee:ff'"""
+    return ":".join(f"{b:02x}" for b in key)
+
+
+def _ip_key(ip):
+    try:
+        return ipaddress.IPv4Address(ip).packed
+    except ValueError:
+        return None
+
+
+class _Names:
+    """Numbering of device and port names for fixed-width records"""
+
+    def __init__(self):
+        self.names = []
+        self._ids = {}
+
+    def id(self, name):
+        if name not in self._ids:
+            self._ids[name] = len(self.names)
+            self.names.append(name)
+        return self._ids[name]
+
+
+def choose_edges(mac_rows, levels=None, phone_mac=()):
+    """Pick the edge port for every MAC address
+
+    A MAC is learned on every switch on the way to the host, the edge is
+    the port with the fewest other hosts behind it (IP phone MACs are not
+    counted, the computer may be switched on via phone). On equal counts
+    an L2 switch wins over L3.
+
+    Args:
+        mac_rows (list): [(switch, MAC, VLAN, port)]
+        levels (dict, optional): {device_name: level} (Activka.levels)
+        phone_mac (list, optional): prefixes of phone MACs (ac.phone_mac)
+
+    Returns:
+        (dict): {mac key: (vlan, switch, port, macs_on_port)}
+    """
+    levels = levels or {}
+    phones = [_HEX.sub("", p.lower()) for p in phone_mac or ()]
+    on_port = {}
+    sightings = {}
+    for switch, mac, vlan, port in mac_rows:
+        key = mac_key(mac)
+        if key is None:
+            continue
+        if not any(key.hex().startswith(p) for p in phones if p):
+            on_port.setdefault((switch, port), set()).add(key)
+        sightings.setdefault(key, []).append((switch, port, int(vlan or 0)))
+    edges = {}
+    for key, seen in sightings.items():
+        best = min(
+            seen,
+            key=lambda s: (len(on_port.get((s[0], s[1]), ())),
+                           levels.get(s[0]) != "L2", s[0], s[1]),
+        )
+        switch, port, vlan = best
+        edges[key] = (vlan, switch, port,
+                      len(on_port.get((switch, port), ())))
+    return edges
+
+
+def write_index(path, arp_rows, mac_rows, levels=None, phone_mac=()):
+    """Build index file from harvested tables
+
+    Args:
+        path (str): index file, replaced atomically
+        arp_rows (list): [(router, IP, MAC, interface)]
+        mac_rows (list): [(switch, MAC, VLAN, port)]
+        levels (dict, optional): {device_name: level}
+        phone_mac (list, optional): prefixes of phone MACs
+
+    Returns:
+        (tuple): number of IP and MAC records
+    """
+    names = _Names()
+    ips = {}
+    for router, ip, mac, _ in arp_rows:
+        ip_key, key = _ip_key(ip), mac_key(mac)
+        if ip_key is None or key is None:
+            continue
+        # the first router wins, the order of harvest keeps R before L3
+        ips.setdefault(ip_key, (key, router))
+    edges = choose_edges(mac_rows, levels, phone_mac)
+
+    ip_records = [_IP_REC.pack(ip_key, key, names.id(router))
+                  for ip_key, (key, router) in sorted(ips.items())]
+    mac_records = [
+        _MAC_REC.pack(key, vlan, names.id(switch), names.id(port),
+                      min(count, 0xFFFF))
+        for key, (vlan, switch, port, count) in sorted(edges.items())
+    ]
+    if len(names.names) > 0xFFFF:
+        raise ValueError("Too many device and port names for index")
+    table = json.dumps(names.names).encode()
+    offset = (_HEADER.size + _IP_REC.size * len(ip_records)
+              + _MAC_REC.size * len(mac_records))
+    atomic_write(path, b"".join([
+        _HEADER.pack(MAGIC, time.time(), len(ip_records), len(mac_records),
+                     offset, len(table)),
+        *ip_records, *mac_records, table,
+    ]))
+    logger.info(f"Location index {path}: {len(ip_records)} IP, "
+                f"{len(mac_records)} MAC records")
+    return len(ip_records), len(mac_records)
+
+
+class LocationIndex:
+    """Read-only access to index file through mmap
+
+    Usage:
+        with LocationIndex(path) as index:
+            index.locate('10.1.1.1')
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.built, self._n_ip, self._n_mac, offset,
+         length) = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path} is not a location index")
+        self._ip_base = _HEADER.size
+        self._mac_base = self._ip_base + _IP_REC.size * self._n_ip
+        self._names = json.loads(self._mm[offset:offset + length])
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def age(self):
+        """Seconds since the index was built"""
+        return time.time() - self.built
+
+    def _search(self, base, count, size, key):
+        lo, hi = 0, count
+        width = len(key)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = base + mid * size
+            probe = self._mm[start:start + width]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return start
+        return None
+
+    def lookup_ip(self, ip):
+        """Return {'ip', 'mac', 'router'} or None"""
+        key = _ip_key(ip)
+        if key is None:
+            return None
+        start = self._search(self._ip_base, self._n_ip, _IP_REC.size, key)
+        if start is None:
+            return None
+        _, mac, router = _IP_REC.unpack_from(self._mm, start)
+        return {"ip": ip, "mac": mac_str(mac), "router": self._names[router]}
+
+    def lookup_mac(self, mac):
+        """Return {'mac', 'vlan', 'switch', 'port', 'macs_on_port'} or None"""
+        key = mac_key(mac)
+        if key is None:
+            return None
+        start = self._search(self._mac_base, self._n_mac, _MAC_REC.size, key)
+        if start is None:
+            return None
+        _, vlan, switch, port, count = _MAC_REC.unpack_from(self._mm, start)
+        return {"mac": mac_str(key), "vlan": vlan,
+                "switch": self._names[switch], "port": self._names[port],
+                "macs_on_port": count}
+
+    def locate(self, address):
+        """Find host by IP or MAC address
+
+        Returns:
+            (dict): ip (if known), mac, router, vlan, switch, port,
+                    macs_on_port; None if address is not in the index
+        """
+        if _ip_key(address) is not None:
+            found = self.lookup_ip(address)
+            if found is None:
+                return None
+            edge = self.lookup_mac(found["mac"])
+            if edge:
+                found.update(edge)
+            return found
+        return self.lookup_mac(address)
+
+
+def harvest(myactivka, device):
+    """Get ARP and/or MAC table of one device over one session (or by SNMP)
+
+    Returns:
+        (tuple): ([(router, IP, MAC, interface)], [(switch, MAC, VLAN, port)])
+    """
+    from astarmiko.base import ac, send_commands, templatizator
+
+    level = myactivka.levels.get(device)
+    dev = myactivka.choose(device, withoutname=True)
+    device_type = dev["device_type"]
+    wanted = []
+    if level in ("R", "L3"):
+        wanted.append(("arp_table", "arp_by"))
+    if level in ("L2", "L3"):
+        wanted.append(("mac_addr_tbl", "mac_addr_tbl_byport"))
+    arp_rows, mac_rows = [], []
+    # tables selected for SNMP (commands.yaml 'snmp_tables') go without
+    # CLI session
+    by_snmp = ac.commands.get("snmp_tables", {}).get(device_type) or ()
+    for cmd in [cmd for cmd, _ in wanted if cmd in by_snmp]:
+        rows = myactivka.read_table(device, cmd) or []
+        if cmd == "arp_table":
+            arp_rows.extend((device, *row[:3]) for row in rows)
+        else:
+            mac_rows.extend((device, row[0], row[1], row[2]) for row in rows)
+    wanted = [(cmd, tmpl) for cmd, tmpl in wanted
+              if cmd not in by_snmp
+              and ac.commands.get(cmd, {}).get(device_type)]
+    if not wanted:
+        return arp_rows, mac_rows
+    outputs = send_commands(
+        dev, [ac.commands[cmd][device_type] for cmd, _ in wanted], mode="exec"
+    )
+    if not outputs:
+        return arp_rows, mac_rows
+    if isinstance(outputs, str):
+        outputs = [outputs]
+    for (cmd, tmpl), output in zip(wanted, outputs):
+        rows = templatizator(output, tmpl, device_type)
+        if cmd == "arp_table":
+            arp_rows.extend((device, *row[:3]) for row in rows)
+        else:
+            mac_rows.extend((device, row[0], row[1], row[2]) for row in rows)
+    return arp_rows, mac_rows
+
+
+def collect(myactivka, devices=None, workers=16):
+    """Harvest ARP and MAC tables from many devices in parallel
+
+    Args:
+        myactivka (Activka): inventory
+        devices (iterable, optional): device names, default - all R, L3
+                                      and L2 devices
+        workers (int): devices polled at the same time
+
+    Returns:
+        (tuple): arp_rows, mac_rows, errors {device: message}
+    """
+    if devices is None:
+        devices = myactivka.select(levels=["R", "L3", "L2"])
+    # routers first: their ARP entries win over L3 switches
+    order = {"R": 0, "L3": 1, "L2": 2}
+    devices = sorted(devices,
+                     key=lambda d: (order.get(myactivka.levels.get(d), 3), d))
+    arp_rows, mac_rows, errors = [], [], {}
+
+    def work(device):
+        try:
+            return device, harvest(myactivka, device), None
+        except Exception as error:
+            return device, ([], []), str(error)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for device, (arp, mac), error in pool.map(work, devices):
+            if error:
+                errors[device] = error
+                logger.warning(f"Location index: {device} skipped: {error}")
+            arp_rows.extend(arp)
+            mac_rows.extend(mac)
+    return arp_rows, mac_rows, errors
+
+
+def build_index(myactivka, path, devices=None, workers=16):
+    """Collect tables from the fleet and write index file
+
+    Returns:
+        (dict): {'ip': number of IP records, 'mac': number of MAC records,
+                 'errors': {device: message} of devices that were not polled}
+    """
+    from astarmiko.base import ac
+
+    arp_rows, mac_rows, errors = collect(myactivka, devices, workers)
+    n_ip, n_mac = write_index(path, arp_rows, mac_rows, myactivka.levels,
+                              getattr(ac, "phone_mac", None) or ())
+    return {"ip": n_ip, "mac": n_mac, "errors": errors}
@@ -2,7 +2,9 @@
 from astarconf import Astarconf
 import logging
 import logging.handlers
+import atexit
 import json
+import queue
 import sys
 import os
 
@@ -34,32 +36,174 @@ def get_log_config(path=None):
             "url", "http://localhost:9200"
         ),
         "elastic_index": logconf.get("elasticsearch", {}).get("index", "logs"),
+        "file": logconf.get("file"),
+        "shipper": logconf.get("shipper", {}) or {},
     }
 
 
-def setup_logging(logcfg):
+_listener = None
+_queue_handler = None
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Puts records into the queue as they are: only the message is
+       merged with its arguments here, formatting (time, JSON) and I/O are
+       done by the listener thread
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _NotForwarded(logging.Filter):
+    """Drops records of DeviceLogCapture that were already forwarded to
+       destination by forward_log_entry (attribute 'forwarded', the set
+       of 'rsyslog', 'loki', 'elastic')
+    """
+
+    def __init__(self, destination):
+        super().__init__()
+        self.destination = destination
+
+    def filter(self, record):
+        return self.destination not in getattr(record, "forwarded", ())
+
+
+class ShipperHandler(logging.Handler):
+    """Sends records to Loki and/or Elasticsearch by the background
+       shipper of optional_loggers
+
+    Records of DeviceLogCapture are not sent again where they were
+    already forwarded (attribute 'forwarded').
+    """
+
+    def __init__(self, loki=False, elastic=False, level=logging.NOTSET):
+        super().__init__(level)
+        self.loki = loki
+        self.elastic = elastic
+
+    def emit(self, record):
+        forwarded = getattr(record, "forwarded", ())
+        loki = self.loki and "loki" not in forwarded
+        elastic = self.elastic and "elastic" not in forwarded
+        if not (loki or elastic):
+            return
+        from astarmiko.optional_loggers import shipper
+
+        shipper.submit(
+            {"device": getattr(record, "device", record.name),
+             "level": record.levelname, "message": self.format(record)},
+            loki=loki, elastic=elastic,
+        )
+
+
+def _formatter(logcfg):
+    if logcfg.get("format", "json") == "json":
+        return JsonLogFormatter()
+    return logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
+
+
+def _handlers(logcfg):
+    """Persistent handlers run by the listener thread"""
+    from astarmiko.optional_loggers import open_syslog
+
+    formatter = _formatter(logcfg)
     handlers = []
+    if logcfg.get("stdout", True):
+        # stderr, stdout of the scripts is their result
+        handlers.append(logging.StreamHandler())
+    if logcfg.get("file"):
+        handlers.append(
+            logging.FileHandler(os.path.expanduser(logcfg["file"]),
+                                encoding="utf-8")
+        )
+    if logcfg.get("rsyslog"):
+        # own handler: the one of forward_log_entry keeps its line format
+        syslog = open_syslog(logcfg.get("rsyslog_addr", "/dev/log"))
+        if syslog is not None:
+            syslog.addFilter(_NotForwarded("rsyslog"))
+            handlers.append(syslog)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    if logcfg.get("loki") or logcfg.get("elastic"):
+        handlers.append(ShipperHandler(loki=bool(logcfg.get("loki")),
+                                       elastic=bool(logcfg.get("elastic"))))
+    return handlers
 
-    if logcfg["stdout"]:
-        stream_handler = logging.StreamHandler()
-        if logcfg["format"] == "json":
-            stream_handler.setFormatter(JsonLogFormatter())
-        else:
-            stream_handler.setFormatter(
-                logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
-            )
-        handlers.append(stream_handler)
 
-    logging.basicConfig(level=logging.INFO, handlers=handlers)
+def setup_logging(logcfg, level=logging.INFO):
+    """Install queue based logging pipeline on the root logger
+
+    Loggers put records into a queue through QueueHandler, a
+    QueueListener thread formats them and writes to persistent console
+    (stderr), file, rsyslog and Loki/Elasticsearch handlers, so the
+    callers don't do formatting or I/O. Records below level are not created at all.
+    Calling it again replaces the pipeline, shutdown_logging() (run at
+    exit too) writes out what is queued.
+
+    Args:
+        logcfg (dict): result of get_log_config()
+        level (int, optional): level of root logger
+    """
+    global _listener, _queue_handler
+
+    from astarmiko.optional_loggers import configure_rsyslog, shipper
+
+    shutdown_logging()
+    # Loki and Elasticsearch entries are sent by the background shipper
+    shipper.configure(
+        loki_url=logcfg.get("loki_url"),
+        elastic_url=logcfg.get("elastic_url"),
+        elastic_index=logcfg.get("elastic_index"),
+        **logcfg.get("shipper", {}),
+    )
+    configure_rsyslog(logcfg.get("rsyslog_addr"))
+
+    log_queue = queue.SimpleQueue()
+    _queue_handler = _QueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(
+        log_queue, *_handlers(logcfg), respect_handler_level=True
+    )
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_queue_handler)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Stop the pipeline of setup_logging: write out queued records and
+       close its handlers
+    """
+    global _listener, _queue_handler
+
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
 
 
 class JsonLogFormatter(logging.Formatter):
+    """Formats record as one JSON line (run by the listener thread)"""
+
     def format(self, record):
         log_entry = {
             "time": self.formatTime(record, self.datefmt),
             "level": record.levelname,
             "message": record.getMessage(),
         }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            log_entry["exception"] = record.exc_text
         return json.dumps(log_entry, ensure_ascii=False)
 
 
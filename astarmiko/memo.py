@@ -0,0 +1,131 @@
+# memo.py
+"""
+Memoization of Activka.getinfo results.
+
+Within one run (fh, a script) getinfo is often called again with the same
+device, command and arguments, every call costs an SSH session. When
+enabled (section getinfo_cache of astarmiko.yaml, off by default) results
+are kept for a time depending on the class of the command:
+
+    volatile - ARP and MAC tables, change all the time
+    stable   - neighbors, routes, configuration, port-channels
+
+Concurrent calls with the same key wait for the first one instead of
+querying the device again. Failed calls (False) are never cached.
+"""
+import copy
+import threading
+import time
+
+VOLATILE = "volatile"
+STABLE = "stable"
+
+# class of every standard command of commands.yaml, other commands
+# (othercmd=True) are volatile
+CLASSES = {
+    "arp_by": VOLATILE,
+    "arp_table": VOLATILE,
+    "mac_addr_tbl": VOLATILE,
+    "mac_addr_tbl_by": VOLATILE,
+    "mac_addr_tbl_byport": VOLATILE,
+    "neighbor": STABLE,
+    "neighbor_by_port": STABLE,
+    "ethchannel_member": STABLE,
+    "ip_route_tbl_by": STABLE,
+    "ip_int_br": STABLE,
+    "current_config": STABLE,
+}
+
+
+class ResultCache:
+    """Results of calls keyed by (device, command, arguments)"""
+
+    def __init__(self, enabled=False, volatile_ttl=15, stable_ttl=600):
+        self.enabled = enabled
+        self.ttl = {VOLATILE: volatile_ttl, STABLE: stable_ttl}
+        self.classes = dict(CLASSES)
+        self._results = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def configure(self, enabled=None, volatile_ttl=None, stable_ttl=None,
+                  classes=None):
+        """Change settings (section getinfo_cache of astarmiko.yaml)
+
+        Args:
+            classes (dict, optional): {command: 'volatile' or 'stable'}
+                                      overrides of command classes
+        """
+        if enabled is not None:
+            self.enabled = enabled
+        if volatile_ttl is not None:
+            self.ttl[VOLATILE] = volatile_ttl
+        if stable_ttl is not None:
+            self.ttl[STABLE] = stable_ttl
+        if classes:
+            self.classes.update(classes)
+
+    def _fresh(self, key, func):
+        found = self._results.get(key)
+        if found is None:
+            return None
+        ttl = self.ttl[self.classes.get(func, VOLATILE)]
+        if time.monotonic() - found[0] > ttl:
+            del self._results[key]
+            return None
+        return found
+
+    def call(self, device, func, args, fetch):
+        """Return cached result of fetch() for (device, func, args) or
+           call it
+
+        Callers get their own copy, they may change the result.
+        """
+        if not self.enabled:
+            return fetch()
+        key = (device, func, args)
+        while True:
+            with self._lock:
+                found = self._fresh(key, func)
+                if found is not None:
+                    self.stats["hits"] += 1
+                    return copy.deepcopy(found[1])
+                event = self._pending.get(key)
+                if event is None:
+                    event = self._pending[key] = threading.Event()
+                    self.stats["misses"] += 1
+                    break
+            # the same query is running in another thread
+            event.wait()
+            with self._lock:
+                if self._fresh(key, func) is None:
+                    # it failed there - query by ourselves
+                    if self._pending.get(key) is None:
+                        event = self._pending[key] = threading.Event()
+                        self.stats["misses"] += 1
+                        break
+        try:
+            result = fetch()
+            if result is not False:
+                with self._lock:
+                    self._results[key] = (time.monotonic(),
+                                          copy.deepcopy(result))
+            return result
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            event.set()
+
+    def invalidate(self, device=None, func=None):
+        """Forget results of device and/or command (all if both are None)"""
+        with self._lock:
+            for key in list(self._results):
+                if device is not None and key[0] != device:
+                    continue
+                if func is not None and key[1] != func:
+                    continue
+                del self._results[key]
+
+
+cache = ResultCache()
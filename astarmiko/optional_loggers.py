@@ -1,50 +1,294 @@
 # optional_loggers.py
+"""
+Forwarding of device log entries to rsyslog, Grafana Loki and
+Elasticsearch.
 
+Loki and Elasticsearch entries are not sent by the caller: they are put
+into a bounded queue and shipped by a background thread over one HTTP
+session, in batches - one Loki push with a stream per device and level,
+one Elasticsearch _bulk request. A full queue drops entries instead of
+blocking device workers, LogShipper.stats counts what was queued, sent,
+dropped and failed. rsyslog handlers are opened once per address and
+shared with the logging pipeline of log_config.setup_logging.
+"""
+import atexit
+import datetime
+import json
+import logging
+import queue
+import threading
+import time
 
-def forward_log_entry(entry: dict, rsyslog=False, loki=False, elastic=False):
-    if rsyslog:
-        _send_to_rsyslog(entry)
-    if loki:
-        _send_to_loki(entry)
-    if elastic:
-        _send_to_elasticsearch(entry)
+logger = logging.getLogger(__name__)
 
 
-def _send_to_rsyslog(entry):
+class LogShipper:
+    """Background batched sender of log entries to Loki and Elasticsearch"""
+
+    def __init__(self, loki_url="http://localhost:3100/loki/api/v1/push",
+                 elastic_url="http://localhost:9200", elastic_index="logs",
+                 queue_size=10000, batch_size=500, flush_interval=1.0,
+                 timeout=5):
+        """
+        Args:
+            loki_url (str): push API of Loki
+            elastic_url (str): Elasticsearch base url
+            elastic_index (str): index of log documents
+            queue_size (int): entries waiting to be sent, more are dropped
+            batch_size (int): entries in one request
+            flush_interval (float): seconds a batch waits to fill up
+            timeout (float): timeout of one HTTP request
+        """
+        self.loki_url = loki_url
+        self.elastic_url = elastic_url
+        self.elastic_index = elastic_index
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._session = None
+        self._thread = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self.stats = {"queued": 0, "sent": 0, "dropped": 0, "failed": 0,
+                      "requests": 0}
+
+    def configure(self, loki_url=None, elastic_url=None, elastic_index=None,
+                  queue_size=None, batch_size=None, flush_interval=None,
+                  timeout=None):
+        """Change settings (log_config.yaml, see log_config.get_log_config)"""
+        if loki_url:
+            self.loki_url = loki_url
+        if elastic_url:
+            self.elastic_url = elastic_url
+        if elastic_index:
+            self.elastic_index = elastic_index
+        if batch_size:
+            self.batch_size = batch_size
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        if timeout:
+            self.timeout = timeout
+        if queue_size and self._thread is None:
+            self._queue = queue.Queue(maxsize=queue_size)
+
+    def submit(self, entry, loki=False, elastic=False):
+        """Queue entry for sending, never waits
+
+        Returns:
+            (bool): False if the queue is full or the shipper is closed
+                    and entry is dropped
+        """
+        if not (loki or elastic):
+            return True
+        item = (time.time_ns(), entry, loki, elastic)
+        # under the lock, so nothing lands behind the stop mark of close()
+        with self._lock:
+            if self._start():
+                try:
+                    self._queue.put_nowait(item)
+                except queue.Full:
+                    pass
+                else:
+                    self.stats["queued"] += 1
+                    return True
+            self.stats["dropped"] += 1
+        return False
+
+    def _start(self):
+        """Start the thread on first use, False after close(). Called
+           with self._lock held
+        """
+        if self._closed:
+            return False
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name="astarmiko-logshipper")
+            self._thread.start()
+            atexit.register(self.close)
+        return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=wait)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self._ship(batch)
+            finally:
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _http(self):
+        if self._session is None:
+            import requests
+
+            self._session = requests.Session()
+        return self._session
+
+    def _ship(self, batch):
+        loki = [(ts, entry) for ts, entry, to_loki, _ in batch if to_loki]
+        elastic = [(ts, entry) for ts, entry, _, to_elastic in batch
+                   if to_elastic]
+        if loki:
+            self._post(len(loki), self.loki_url, json=self._loki_payload(loki))
+        if elastic:
+            self._post(
+                len(elastic), f"{self.elastic_url.rstrip('/')}/_bulk",
+                data=self._bulk_body(elastic),
+                headers={"Content-Type": "application/x-ndjson"},
+            )
+
+    def _post(self, count, url, **kwargs):
+        try:
+            response = self._http().post(url, timeout=self.timeout, **kwargs)
+            response.raise_for_status()
+        except Exception as error:
+            with self._lock:
+                self.stats["failed"] += count
+            logger.debug(f"Log shipping to {url} failed: {error}")
+            return
+        with self._lock:
+            self.stats["sent"] += count
+            self.stats["requests"] += 1
+
+    @staticmethod
+    def _loki_payload(entries):
+        """One push request, a stream per (device, level)"""
+        streams = {}
+        for ts, entry in entries:
+            labels = (entry.get("device", ""), entry.get("level", ""))
+            streams.setdefault(labels, []).append(
+                [str(ts), str(entry.get("message", ""))]
+            )
+        return {"streams": [
+            {"stream": {"device": device, "level": level}, "values": values}
+            for (device, level), values in streams.items()
+        ]}
+
+    def _bulk_body(self, entries):
+        action = json.dumps({"index": {"_index": self.elastic_index}})
+        lines = []
+        for ts, entry in entries:
+            doc = dict(entry)
+            # ISO 8601 is mapped as date by dynamic mapping, epoch
+            # millis would become long
+            doc.setdefault("@timestamp", datetime.datetime.fromtimestamp(
+                ts / 1e9, datetime.timezone.utc
+            ).isoformat(timespec="milliseconds"))
+            lines.append(action)
+            lines.append(json.dumps(doc, ensure_ascii=False))
+        return ("\n".join(lines) + "\n").encode()
+
+    def flush(self):
+        """Wait until all queued entries are sent (or failed)"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self, timeout=5):
+        """Send what is queued and stop the thread, entries submitted
+           later are dropped
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logger.warning("Log shipper queue is full, entries are lost")
+            return
+        thread.join(timeout)
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+shipper = LogShipper()
+
+
+_syslog_handlers = {}
+_syslog_lock = threading.Lock()
+_rsyslog_address = "/dev/log"
+
+
+def open_syslog(address="/dev/log"):
+    """New SysLogHandler of address
+
+    Args:
+        address (str): unix socket path or 'host[:port]' of remote rsyslog
+                       (UDP, default port 514)
+
+    Returns:
+        SysLogHandler or None if the socket can't be opened
+    """
     import logging.handlers
 
-    syslog = logging.handlers.SysLogHandler(address="/dev/log")
-    msg = f"{entry['device']} {entry['level']}: {entry['message']}"
-    syslog.emit(logging.LogRecord("rsyslog", logging.INFO, "", 0, msg, None, None))
-    syslog.close()
-
-
-def _send_to_loki(entry):
-    # Пример реализации отправки в Grafana Loki через HTTP
-    import requests
-    import time
-
-    payload = {
-        "streams": [
-            {
-                "labels": f"{{device=\"{entry['device']}\",level=\"{entry['level']}\"}}",
-                "entries": [
-                    {"ts": f"{int(time.time())}000000000", "line": entry["message"]}
-                ],
-            }
-        ]
-    }
+    if address.startswith("/"):
+        target = address
+    else:
+        host, _, port = address.partition(":")
+        target = (host, int(port or 514))
     try:
-        requests.post("http://localhost:3100/loki/api/v1/push", json=payload, timeout=2)
-    except Exception:
-        pass
+        return logging.handlers.SysLogHandler(address=target)
+    except OSError as error:
+        logger.warning(f"rsyslog {address} is not available: {error}")
+        return None
 
 
-def _send_to_elasticsearch(entry):
-    # Пример отправки в Elasticsearch (если у тебя установлен и настроен)
-    import requests
+def syslog_handler(address="/dev/log"):
+    """Persistent SysLogHandler of address used by forward_log_entry,
+       one per address (see open_syslog)
+    """
+    with _syslog_lock:
+        handler = _syslog_handlers.get(address)
+        if handler is None:
+            handler = open_syslog(address)
+            if handler is None:
+                return None
+            _syslog_handlers[address] = handler
+        return handler
 
-    try:
-        requests.post("http://localhost:9200/logs/_doc", json=entry, timeout=2)
-    except Exception:
-        pass
+
+def configure_rsyslog(address=None):
+    """Set address used by forward_log_entry(rsyslog=True)"""
+    global _rsyslog_address
+    if address:
+        _rsyslog_address = address
+
+
+def forward_log_entry(entry: dict, rsyslog=False, loki=False, elastic=False):
+    if rsyslog:
+        _send_to_rsyslog(entry)
+    # Loki and Elasticsearch are served by the background shipper
+    shipper.submit(entry, loki=loki, elastic=elastic)
+
+
+def _send_to_rsyslog(entry):
+    syslog = syslog_handler(_rsyslog_address)
+    if syslog is None:
+        return
+    msg = f"{entry['device']} {entry['level']}: {entry['message']}"
+    syslog.handle(logging.LogRecord("rsyslog", logging.INFO, "", 0, msg,
+                                    None, None))
@@ -0,0 +1,102 @@
+# reachability.py
+"""
+Shared cache of device reachability.
+
+Instead of ping before every SSH attempt, all paths (base._try_connect,
+Activka._is_device_available, async_exec.is_device_available) look up
+the last known state of the address first and probe only if it is
+unknown or too old.
+"""
+import threading
+import time
+
+UP = "up"
+DOWN = "down"
+UNKNOWN = "unknown"
+
+
+class ReachabilityCache:
+    """State of ip addresses: up / down / unknown with time of check
+
+    A successful state is trusted for up_ttl seconds, a failed one for
+    down_ttl seconds (usually shorter, device may be rebooting).
+    """
+
+    def __init__(self, up_ttl=300, down_ttl=30):
+        self.up_ttl = up_ttl
+        self.down_ttl = down_ttl
+        self._states = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "probes": 0}
+
+    def configure(self, up_ttl=None, down_ttl=None):
+        """Change TTLs (section reachability of astarmiko.yaml)"""
+        if up_ttl is not None:
+            self.up_ttl = up_ttl
+        if down_ttl is not None:
+            self.down_ttl = down_ttl
+
+    def get(self, ip):
+        """Return UP, DOWN or UNKNOWN (never checked or expired)"""
+        with self._lock:
+            state = self._states.get(ip)
+        if state is None:
+            return UNKNOWN
+        status, checked = state
+        ttl = self.up_ttl if status == UP else self.down_ttl
+        if time.monotonic() - checked > ttl:
+            return UNKNOWN
+        return status
+
+    def checked_at(self, ip):
+        """Wall-clock time of last check of ip or None"""
+        with self._lock:
+            state = self._states.get(ip)
+        if state is None:
+            return None
+        return time.time() - (time.monotonic() - state[1])
+
+    def mark(self, ip, up):
+        """Remember result of any check (ping, TCP, successful SSH login)"""
+        with self._lock:
+            self._states[ip] = (UP if up else DOWN, time.monotonic())
+
+    def forget(self, ip=None):
+        with self._lock:
+            if ip is None:
+                self._states.clear()
+            else:
+                self._states.pop(ip, None)
+
+    def _cached(self, ip):
+        status = self.get(ip)
+        if status != UNKNOWN:
+            with self._lock:
+                self.stats["hits"] += 1
+            return status == UP
+        with self._lock:
+            self.stats["probes"] += 1
+        return None
+
+    def check(self, ip, probe):
+        """Return reachability of ip, probe(ip) -> bool is called
+           only if state is unknown
+        """
+        cached = self._cached(ip)
+        if cached is not None:
+            return cached
+        result = bool(probe(ip))
+        self.mark(ip, result)
+        return result
+
+    async def check_async(self, ip, probe):
+        """The same as check() for coroutine probe"""
+        cached = self._cached(ip)
+        if cached is not None:
+            return cached
+        result = bool(await probe(ip))
+        self.mark(ip, result)
+        return result
+
+
+cache = ReachabilityCache()
@@ -0,0 +1,90 @@
+# scheduler.py
+"""
+Scoped concurrency limits for bulk execution in ActivkaAsync.
+
+Three levels of limits are applied together:
+    global          - devices in work at the same time in the whole run
+    per SEGMENT     - protects WAN links to remote sites
+    per device_type - old boxes have few VTY lines
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class ConcurrencyLimiter:
+    """Set of semaphores for one run of execute_on_devices
+
+    A limit of 0 or None means unlimited. Overrides for certain segments
+    or device types are taken from dictionaries segment / device_type,
+    others get per_segment / per_device_type.
+    Must be created inside running event loop (one object per run).
+    """
+
+    def __init__(self, global_limit=None, per_segment=None,
+                 per_device_type=None, segment=None, device_type=None):
+        self.global_limit = global_limit or None
+        self.per_segment = per_segment or None
+        self.per_device_type = per_device_type or None
+        self.segment_limits = {str(k).lower(): v
+                               for k, v in (segment or {}).items()}
+        self.device_type_limits = dict(device_type or {})
+        self._global = (asyncio.Semaphore(self.global_limit)
+                        if self.global_limit else None)
+        self._segments = {}
+        self._device_types = {}
+
+    @classmethod
+    def from_config(cls, conf):
+        """Create limiter from section 'concurrency' of astarmiko.yaml
+           (or dictionary with the same keys made from acm flags)
+        """
+        return cls(
+            global_limit=conf.get("global"),
+            per_segment=conf.get("per_segment"),
+            per_device_type=conf.get("per_device_type"),
+            segment=conf.get("segment"),
+            device_type=conf.get("device_type"),
+        )
+
+    @staticmethod
+    def _semaphore(cache, key, limit):
+        if not limit:
+            return None
+        if key not in cache:
+            cache[key] = asyncio.Semaphore(limit)
+        return cache[key]
+
+    def _scoped(self, segment, device_type):
+        segment = str(segment).lower()
+        seg_limit = self.segment_limits.get(segment, self.per_segment)
+        type_limit = self.device_type_limits.get(
+            device_type, self.per_device_type
+        )
+        # the order of acquiring is always the same: device_type, segment,
+        # global - so waiting tasks can't deadlock each other and a task
+        # waiting for its segment doesn't hold a global slot
+        return [
+            s for s in (
+                self._semaphore(self._device_types, device_type, type_limit),
+                self._semaphore(self._segments, segment, seg_limit),
+                self._global,
+            ) if s is not None
+        ]
+
+    @asynccontextmanager
+    async def slot(self, segment=None, device_type=None):
+        """Wait until device of segment/device_type can be served
+
+        Usage:
+            async with limiter.slot(segment, device_type):
+                ...
+        """
+        acquired = []
+        try:
+            for semaphore in self._scoped(segment, device_type):
+                await semaphore.acquire()
+                acquired.append(semaphore)
+            yield
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
@@ -18,8 +18,15 @@ async def async_main():
     parser.add_argument("--rsyslog", action="store_true")
     parser.add_argument("--loki", action="store_true")
     parser.add_argument("--elastic", action="store_true")
+    parser.add_argument("--max-concurrency", type=int, help="Devices in work at the same time")
+    parser.add_argument("--per-segment", type=int, help="Devices of one SEGMENT in work at the same time")
+    parser.add_argument("--per-device-type", type=int, help="Devices of one device_type in work at the same time")
+    parser.add_argument("--stream", action="store_true",
+                        help="show: print results as NDJSON lines as devices finish")
 
     args = parser.parse_args()
+    if args.stream and args.operation != "show":
+        parser.error("--stream is supported for show only")
     args.conf = os.path.expanduser(args.conf) if args.conf.startswith("~") else args.conf
     setup_config(args.conf)
     
@@ -70,21 +77,44 @@ async def async_main():
         print("No valid devices to process. Exiting.")
         return
 
+    # Ограничения параллельности из флагов перекрывают секцию concurrency
+    limits = {
+        "global": args.max_concurrency,
+        "per_segment": args.per_segment,
+        "per_device_type": args.per_device_type,
+    }
+
     # Выполняем команду
+    if args.stream:
+        # одна строка JSON на устройство, как только оно готово
+        async for device, status, output in a.iter_execute(
+            real_devices, commands,
+            rsyslog=args.rsyslog,
+            loki=args.loki,
+            elastic=args.elastic,
+            use_template=use_template,
+            limits=limits
+        ):
+            print(json.dumps({"device": device, "status": status,
+                              "output": output}, ensure_ascii=False),
+                  flush=True)
+        return
     if args.operation == "show":
         result = await a.execute_on_devices(
             real_devices, commands,
             rsyslog=args.rsyslog,
             loki=args.loki,
             elastic=args.elastic,
-            use_template=use_template
+            use_template=use_template,
+            limits=limits
         )
     elif args.operation == "set":
         result = await a.setconfig_on_devices(
             real_devices, commands,
             rsyslog=args.rsyslog,
             loki=args.loki,
-            elastic=args.elastic
+            elastic=args.elastic,
+            limits=limits
         )
 
     print(json.dumps(result, indent=2, ensure_ascii=False))
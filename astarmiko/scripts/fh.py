@@ -1,12 +1,13 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
 import re
-import yaml
 import argparse
 import asyncio
 import os
 import sys
 import subprocess
+import threading
+import logging
 from astarmiko.base import (
     Activka,
     port_name_normalize,
@@ -14,8 +15,13 @@ from astarmiko.base import (
     is_ip_correct,
     nslookup,
     setup_config,
-    snmp_get_oid,
+    conf_section,
 )
+from astarmiko.locator import LocationIndex, build_index
+from astarmiko.snapshot import store as snapshots
+from astarmiko.snmp import SnmpError, client as snmp
+from astarmiko.subnets import SubnetIndex, build as build_subnets
+from astarmiko.sweep import icmp_available, probe as sweep_probe, sweep as sweep_ips
 
 
 def debug_logger(func):
@@ -39,7 +45,33 @@ def debug_logger(func):
     return wrapper
 
 
+logger = logging.getLogger(__name__)
+
+
+class FindHostError(Exception):
+    """Host is not found, the message tells why"""
+
+
+_quiet = threading.local()
+
+
+def say(*args):
+    """print() which is silent in threads of batch mode"""
+    if not getattr(_quiet, "active", False):
+        print(*args)
+
+
 def wake_up_device(ip, count=5):
+    """Wake up host (and fill ARP tables on the way) by echo requests
+
+    Unprivileged ICMP socket of sweep.py is used if it is available,
+    otherwise the system ping
+    """
+    if icmp_available():
+        # all count echoes like ping -c, not only until the first reply
+        answers = [sweep_probe(ip, retries=1, method="icmp",
+                               feed_cache=False) for _ in range(count)]
+        return any(answers)
     if os.name == "nt":
         args = ["ping", "-n", str(count), ip]
     else:
@@ -78,13 +110,15 @@ def check_firewall(myactivka, ip, routerstart):
             fw_ip, net_ip = route[0]
         else:
             net_ip, fw_ip = route[0]
-        oid = OID_INTF_INDX_STR.format(net_ip)
-        koid = asyncio.run(snmp_get_oid(fw_ip, community, oid))
-        if len(koid) == 1 and isinstance(koid[0], str):
-            intf_indx = koid[0].split(" = ")[1]
-            oid = OID_INFF_MAC_STR.format(intf_indx, ip)
-            mac = asyncio.run(snmp_get_oid(fw_ip, community, oid))
-            mac = mac[0].split(" = ")[1]
+        try:
+            mac = asyncio.run(
+                _firewall_mac(fw_ip, community, net_ip, ip,
+                              OID_INTF_INDX_STR, OID_INFF_MAC_STR)
+            )
+        except SnmpError as error:
+            logger.warning(f"Firewall {fw_ip} is not answering: {error}")
+            return None
+        if mac:
             mac_str = ":".join(
                 f"{(int(mac, 16) >> 8*i) & 0xff:02x}"
                 for i in reversed(range(6))
@@ -95,6 +129,17 @@ def check_firewall(myactivka, ip, routerstart):
         return False
 
 
+async def _firewall_mac(fw_ip, community, net_ip, ip, oid_index, oid_mac):
+    """Both SNMP queries of check_firewall over one engine and event loop"""
+    oid = oid_index.format(net_ip)
+    found = await snmp.get(fw_ip, [oid], community=community)
+    if found[oid] is None:
+        return None
+    oid = oid_mac.format(found[oid], ip)
+    found = await snmp.get(fw_ip, [oid], community=community)
+    return found[oid]
+
+
 def get_host_description_ad(hostname):
     """
     Function get name of hostname and return it description from ADDS
@@ -165,7 +210,7 @@ def findchain(myactivka, m, hostname=False):
         ]
     else:
         return_text = [message[21].format(correct_ip, mac_to_find, m[3], m[2])]
-    print(return_text[0])
+    say(return_text[0])
     # теперь нам необходимо узнать  тип активки ‘R’ - маршрутизатор
     # ‘L3’ - L3 коммутатор или ‘CH’ checkpoint это необходимо чтобы понять
     # где начинать поиск по таблице MAC адресов (на роутере бессмысленно,
@@ -176,11 +221,7 @@ def findchain(myactivka, m, hostname=False):
     # интерфейсами
     match = re.search(r"(Eth-Trunk|Po)(\d+)", m[2])
     if match:
-        m[2] = str(
-            myactivka.getinfo(m[3], "ethchannel_member",
-                                match.group(2))[0][0][0]
-            )
-        m[2] = port_name_normalize(m[2])
+        m[2] = myactivka.channel_members(m[3], match.group(2))[0]
         # если стартовая точка - роутер, ищем первый на пути коммутатор,
         # если L3 коммутатор - начнем поиск с него
     if myactivka.levels[m[3]] == "R":
@@ -205,10 +246,9 @@ def findchain(myactivka, m, hostname=False):
         # Status = False если дальше светится много MACов
         if not port or not isinstance(port, list):
             # Если не получили корректный порт — выходим с сообщением
-            print(message[19].format(mac_to_find))
-            return_text.append(message[19].format(mac_to_find))
-            sys.exit()
-        print(message[22].format(sw, port[0]))
+            say(message[19].format(mac_to_find))
+            raise FindHostError(message[19].format(mac_to_find))
+        say(message[22].format(sw, port[0]))
         return_text.append(message[22].format(sw, port[0]))
         if not port[1]:
             next_neighbor = myactivka.getinfo(sw, "neighbor_by_port", port[0])
@@ -223,50 +263,192 @@ def findchain(myactivka, m, hostname=False):
         else:
             return_text.append(message[24].format(sw, port[0]))
             break
-    print(return_text[-1])
+    say(return_text[-1])
     out = return_text + end
     return out
 
 
+def iter_hits(candidates, probe, fanout=8):
+    """Run probe(candidate) for many candidates concurrently and yield
+       truthy answers as they come
+
+    Not started probes are cancelled when the generator is closed, the
+    running ones are left to finish in background.
+
+    Args:
+        candidates (list): device names
+        probe (callable): probe(candidate) -> answer, False/None/[] if miss
+        fanout (int): probes at the same time
+
+    Yields:
+        (tuple): (candidate, answer)
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    if not candidates:
+        return
+
+    # batch mode silence is inherited by the probing threads
+    quiet = getattr(_quiet, "active", False)
+
+    def quiet_probe(candidate):
+        _quiet.active = quiet
+        return probe(candidate)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, fanout))
+    futures = {}
+    try:
+        futures = {pool.submit(quiet_probe, c): c for c in candidates}
+        for future in as_completed(futures):
+            try:
+                answer = future.result()
+            except Exception as error:
+                logger.warning(f"Search on {futures[future]} failed: {error}")
+                continue
+            if answer:
+                yield futures[future], answer
+    finally:
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=False)
+
+
+def first_hit(candidates, probe, fanout=8):
+    """The first answer of iter_hits, the rest of probes is cancelled
+
+    Returns:
+        (tuple): (candidate, answer) or None if all of them missed
+    """
+    from contextlib import closing
+
+    with closing(iter_hits(candidates, probe, fanout)) as hits:
+        return next(hits, None)
+
+
 def findbymac(myactivka, mac_to_find, devices, ac):
     """
     Function get object Activka, mac address to find, segment of network
     and return name of switch, port, IP and hostname if possible where
     host with that mac
+
+    ARP tables of routers and then MAC tables of switches are queried
+    concurrently (key findbymac.fanout of configuration, 8 by default),
+    the first device that knows the MAC ends the search
+
+    Returns:
+        lines of answer or False if no device knows the MAC
     """
+    fanout = conf_section("findbymac", ac).get("fanout", 8)
     return_text = []
-    routers = [
-        rt
-        for rt in devices
-        if myactivka.levels[rt] == "R" or myactivka.levels[rt] == "L3"
-    ]
-    for rt in routers:
-        m = find_router_to_start(myactivka, mac_to_find, is_mac=True,
-                                 router=rt, ac=ac)
-        if m:
-            hostname = nslookup(m[0], reverse=False)
+    routers_set = myactivka.select(levels=["R", "L3"])
+    routers = [rt for rt in devices if rt in routers_set]
+
+    def on_router(rt):
+        # ARP lookup only, the firewall is checked once all routers missed
+        out = myactivka.getinfo(rt, "arp_by", mac_to_find)
+        if not out:
+            return False
+        return out[0] + [rt]
+
+    def behind_firewall():
+        say(message[27].format(mac_to_find))
+        for rt in routers:
+            fw_data = check_firewall(myactivka, mac_to_find, rt)
+            if fw_data:
+                return rt, [mac_to_find, fw_data[0], "FIREWALL", rt,
+                            fw_data[1]]
+        say(message[28])
+        return None
+
+    def chain(rt, m):
+        say(message[14].format(mac_to_find, rt))
+        hostname = nslookup(m[0], reverse=False)
+        try:
             out = findchain(myactivka, m, hostname)
-            if out[-1]:
-                return out[0]
-    switches = [
-        sw
-        for sw in devices
-        if myactivka.levels[sw] == "L2" or myactivka.levels[sw] == "L3"
-    ]
-    print(message[16].format(mac_to_find))
-    for sw in switches:
-        print(message[17].format(sw))
-        mac_to_find = convert_mac(
+        except FindHostError:
+            return None
+        return out[0] if out[-1] else None
+
+    from contextlib import closing
+
+    found = False
+    with closing(iter_hits(routers, on_router, fanout)) as hits:
+        # the next router which knows the MAC is tried if the chain
+        # from the previous one leads nowhere
+        for rt, m in hits:
+            found = True
+            out = chain(rt, m)
+            if out:
+                return out
+    if not found and routers:
+        hit = behind_firewall()
+        out = chain(*hit) if hit else None
+        if out:
+            return out
+    switches_set = myactivka.select(levels=["L2", "L3"])
+    switches = [sw for sw in devices if sw in switches_set]
+    say(message[16].format(mac_to_find))
+
+    def on_switch(sw):
+        say(message[17].format(sw))
+        mac = convert_mac(
             mac_to_find, myactivka.choose(sw, withoutname=True)["device_type"]
         )
-        port = myactivka.getinfo(sw, "mac_address_table", mac_to_find)
-        if port:
-            return_text.append(message[18].format(mac_to_find, sw, port[0]))
-            print(return_text[0])
-            return return_text
-    return_text.append(message[19].format(mac_to_find))
-    print(return_text[0])
-    return return_text
+        port = myactivka.getinfo(sw, "mac_addr_tbl_by", mac)
+        return (mac, port[0]) if port else False
+
+    hit = first_hit(switches, on_switch, fanout)
+    if hit:
+        sw, (mac, port) = hit
+        return_text.append(message[18].format(mac, sw, port))
+        say(return_text[0])
+        return return_text
+    say(message[19].format(mac_to_find))
+    return False
+
+
+_subnets = None
+_subnets_lock = threading.Lock()
+
+
+def subnets_path(ac):
+    """Path to subnet index file (key subnets.path of fh.yaml)"""
+    conf = conf_section("subnets", ac)
+    return os.path.expanduser(conf.get("path")
+                              or ac.localpath + "subnets.json")
+
+
+def subnets_seed(ac):
+    """SubnetIndex from networks_byip.yaml"""
+    path = ac.localpath + "networks_byip.yaml"
+    if not os.path.exists(path):
+        return SubnetIndex()
+    return SubnetIndex.from_mapping(snapshots.load_yaml(path) or {},
+                                    base=conf_section("subnets", ac).get("base"))
+
+
+def subnet_index(ac):
+    """Subnet -> gateway index, loaded once per run: the file built by
+       fh --build-index or networks_byip.yaml, whichever is newer
+    """
+    global _subnets
+    with _subnets_lock:
+        if _subnets is None:
+            path = subnets_path(ac)
+            seed = ac.localpath + "networks_byip.yaml"
+            if os.path.exists(path) and not _newer(seed, path):
+                _subnets = SubnetIndex.load(path)
+            else:
+                if os.path.exists(path):
+                    logger.warning(f"{seed} is newer than {path}, it is "
+                                   f"used instead, run fh --build-index")
+                _subnets = subnets_seed(ac)
+        return _subnets
+
+
+def _newer(path, than):
+    return (os.path.exists(path)
+            and os.path.getmtime(path) > os.path.getmtime(than))
 
 
 def find_router_to_start(myactivka, ip, is_mac=False, router=None, ac=None):
@@ -275,19 +457,11 @@ def find_router_to_start(myactivka, ip, is_mac=False, router=None, ac=None):
     as start point
     and return list(IP,MAC, port_where_was _found, name_of_router)
     """
-    # ищу 3-й октет адреса и по нему из файла networks_byip.yaml
-    # получаю имя роутера (стартовой точки поиска)
+    # по самой специфичной сети, в которую входит адрес, получаю имя
+    # роутера (стартовой точки поиска)
     if not is_mac:
-        ia = re.compile(
-            r"(?P<OCT1>\d+)\.(?P<OCT2>\d+)\.(?P<OCT3>\d+)\.(?P<OCT4>\d+)",
-            re.ASCII)
-        m = ia.search(ip)
-        oct3 = m.group("OCT3")
-        with open(ac.localpath + "networks_byip.yaml") as f:
-            nbi = yaml.safe_load(f)
-        if oct3 in nbi.keys():
-            routerstart = nbi[oct3]
-        else:
+        routerstart = subnet_index(ac).gateway(ip)
+        if not routerstart:
             return False
     # и через ARP таблицу ищу MAC для этого IP
     else:
@@ -300,12 +474,12 @@ def find_router_to_start(myactivka, ip, is_mac=False, router=None, ac=None):
 
     if not out:
         print_string = message[27].format(ip)
-        print(print_string)
+        say(print_string)
         fw_data = check_firewall(myactivka, ip, routerstart)
         if not fw_data:
             print_string = message[28]
-            print(print_string)
-            sys.exit()
+            say(print_string)
+            raise FindHostError(print_string)
         else:
             output = [ip, fw_data[0], "FIREWALL", routerstart, fw_data[1]]
             return output
@@ -317,12 +491,24 @@ def find_router_to_start(myactivka, ip, is_mac=False, router=None, ac=None):
     return output
 
 
-def ip_routine(myactivka, ip, ac):
+def ip_routine(myactivka, ip, ac, awake=None):
+    """Find host by ip address or host name
+
+    Args:
+        awake (set, optional): addresses known to answer (batch mode
+                               sweeps all of them at once)
+
+    Returns:
+        list of lines of answer
+
+    Raises:
+        FindHostError: host is not found
+    """
     if not re.match(r"[,|\.]", ip):
         ipreal = nslookup(ip)
         if not ipreal:
-            print(message[10].format(ip))
-            quit()
+            say(message[10].format(ip))
+            raise FindHostError(message[10].format(ip))
         else:
             correct_ip = ipreal
         hostname = ip
@@ -332,22 +518,25 @@ def ip_routine(myactivka, ip, ac):
         # проверяем и возвращаем правильный IP
         correct_ip = is_ip_correct(ip)
         if not correct_ip:
-            print(message[11])
-            quit()
+            say(message[11])
+            raise FindHostError(message[11])
         # а если ввели IP не плохо бы узнать DNS имя
         hostname = nslookup(correct_ip, reverse=False)
         if not hostname:
             hostname = message[12]
     # по IP получаем список  m = [IP, MAC, порт на котором светится,
     # имя активки]
-    if not wake_up_device(correct_ip, count=5):
-        print(message[10].format(correct_ip))
-        sys.exit()
+    if awake is not None and correct_ip in awake:
+        pass  # already answered to the sweep of batch mode
+    elif not wake_up_device(correct_ip, count=5):
+        say(message[10].format(correct_ip))
+        raise FindHostError(message[10].format(correct_ip))
     m = find_router_to_start(myactivka, correct_ip, ac=ac)
     # m = [ip, mac_of_this_ip, port_where_mac_is_lit, routerstart]
     if not m:
-        if correct_ip in myactivka.routerbyip.keys():
-            device2 = myactivka.routerbyip[correct_ip]
+        routerbyip = getattr(myactivka, "routerbyip", None) or {}
+        if correct_ip in routerbyip:
+            device2 = routerbyip[correct_ip]
             int_conf = myactivka.list_of_all_ip_intf(device2.lower())
             name_mask = [
                 [line[0], line[2]] for line in int_conf
@@ -356,10 +545,11 @@ def ip_routine(myactivka, ip, ac):
             print_string = message[25].format(
                 correct_ip, name_mask[0][1], name_mask[0][0], device2.lower()
             )
-            print(print_string)
-            quit()
-        print(message[13])
-        quit()
+            say(print_string)
+            # the address belongs to a device itself - that is the answer
+            return [print_string]
+        say(message[13])
+        raise FindHostError(message[13])
     m[3] = m[3].lower()
     if m[2] == "FIREWALL":
         # if firewall m = [ip, mac_of_this_ip, 'FIREWALL', routerstart,
@@ -374,25 +564,222 @@ def ip_routine(myactivka, ip, ac):
     return out
 
 
-def mac_routine(myactivka, ip):
-    segment_list = list(myactivka.segment.values())
-    sl = sorted(set(segment_list))
-    sl_len = [x for x in range(0, len(sl))]
-    print(message[7])
-    for a, b in zip(sl_len, sl):
-        print(a, b)
-    seg = input(message[8])
-    seg_name = sl[int(seg)]
-    seg_devices = [dev.lower() for dev, value in myactivka.segment.items()
-                   if value == seg_name]
-    out = findbymac(myactivka, ip, seg_devices)
+def locator_path(ac):
+    """Path to location index file (key locator.index of fh.yaml)"""
+    conf = conf_section("locator", ac)
+    return os.path.expanduser(conf.get("index")
+                              or ac.localpath + "locator.idx")
+
+
+def build_routine(myactivka, ac):
+    """Poll all devices, write location index and subnet index"""
+    global _subnets
+    conf = conf_section("locator", ac)
+    workers = conf.get("workers", 16)
+    result = build_index(myactivka, locator_path(ac), workers=workers)
+    out = [message[34].format(result["ip"], result["mac"],
+                              len(result["errors"]))]
+    index, errors = build_subnets(myactivka, workers=workers,
+                                  seed=subnets_seed(ac))
+    index.save(subnets_path(ac))
+    with _subnets_lock:
+        _subnets = index
+    out.append(message[42].format(len(index), len(errors)))
+    for line in out:
+        say(line)
+    return out
+
+
+def index_routine(myactivka, ip, ac, verify=False):
+    """Answer from location index, optionally check the last hop live
+
+    Returns:
+        list of lines of answer or False if address is not in the index
+    """
+    path = locator_path(ac)
+    if not os.path.exists(path):
+        return False
+    address = ip
+    if not convert_mac(ip, "cisco_ios"):
+        address = is_ip_correct(ip) or nslookup(ip)
+        if not address:
+            return False
+    with LocationIndex(path) as index:
+        found = index.locate(address)
+        age = int(index.age // 60)
+    if not found or "switch" not in found:
+        say(message[33].format(ip))
+        return False
+    return_text = [
+        message[29].format(age),
+        message[30].format(found.get("ip", ""), found["mac"],
+                           found["switch"], found["port"], found["vlan"]),
+    ]
+    if verify:
+        sw = found["switch"]
+        mac = convert_mac(
+            found["mac"], myactivka.choose(sw, withoutname=True)["device_type"]
+        )
+        port = myactivka.getinfo(sw, "mac_addr_tbl_by", mac)
+        if (port and isinstance(port, list)
+                and port_name_normalize(port[0])
+                == port_name_normalize(found["port"])):
+            return_text.append(message[31].format(sw, port[0]))
+        else:
+            return_text.append(message[32].format(
+                sw, port[0] if port else message[26]))
+    for line in return_text:
+        say(line)
+    return return_text
+
+
+def mac_routine(myactivka, ip, ac, seg_name=None):
+    """Find host by mac address in network segment
+
+    Args:
+        seg_name (str, optional): segment, asked interactively if None
+    """
+    if seg_name is None:
+        sl = myactivka.index.segments()
+        sl_len = [x for x in range(0, len(sl))]
+        say(message[7])
+        for a, b in zip(sl_len, sl):
+            say(a, b)
+        seg = input(message[8])
+        seg_name = sl[int(seg)]
+    seg_devices = sorted(myactivka.select(segment=seg_name),
+                         key=myactivka.index.order.get)
+    out = findbymac(myactivka, ip, seg_devices, ac)
     if not out:
-        print(message[9].format(seg_name))
+        say(message[9].format(seg_name))
         return False
     else:
         return out[0]
 
 
+def locate(myactivka, address, ac, seg_name=None, use_index=False,
+           verify=False, awake=None):
+    """Find one host by ip, mac or name without asking anything
+
+    Returns:
+        list of lines of answer
+
+    Raises:
+        FindHostError: host is not found
+    """
+    if use_index or verify:
+        out = index_routine(myactivka, address, ac, verify=verify)
+        if out:
+            return out
+    mac = convert_mac(address, "cisco_ios")
+    if not mac:
+        return ip_routine(myactivka, address, ac, awake=awake)
+    out = mac_routine(myactivka, mac, ac, seg_name=seg_name)
+    if not out:
+        raise FindHostError(message[9].format(seg_name))
+    return out if isinstance(out, list) else [out]
+
+
+def read_addresses(source):
+    """Addresses for batch mode: one per line, optionally followed by
+       network segment (for mac addresses); empty lines and # comments
+       are skipped
+
+    Returns:
+        list [(address, segment or None)]
+    """
+    items = []
+    for line in source:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split(maxsplit=1)
+        items.append((parts[0], parts[1] if len(parts) > 1 else None))
+    return items
+
+
+def batch_routine(myactivka, ac, items, out, workers=16, fmt="csv",
+                  seg_name=None, use_index=False, verify=False):
+    """Locate many addresses concurrently and write one record per address
+
+    Whole ARP and MAC tables of every device are read once and shared by
+    all lookups, neighbors come from the topology cache. Addresses are
+    woken up by one sweep instead of ping per host.
+
+    Args:
+        items (list): [(address, segment or None)], see read_addresses
+        out (file): where to write records
+        workers (int): lookups at the same time
+        fmt (str): 'csv' or 'ndjson'
+        seg_name (str, optional): segment for mac addresses without one
+
+    Returns:
+        (dict): number of records by status ('ok', 'not_found', 'error')
+    """
+    import csv
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+
+    myactivka.share_tables()
+    ips = [ip for ip in (is_ip_correct(a) for a, _ in items) if ip]
+    awake = set()
+    if ips:
+        swept = sweep_ips(ips, conf_section("sweep", ac))
+        awake = {ip for ip, up in swept.items() if up}
+
+    def work(item):
+        _quiet.active = True
+        address, segment = item
+        record = {"address": address, "status": "ok", "result": [],
+                  "error": ""}
+        try:
+            record["result"] = locate(
+                myactivka, address, ac, seg_name=segment or seg_name,
+                use_index=use_index, verify=verify, awake=awake,
+            )
+        except FindHostError as error:
+            record.update(status="not_found", error=str(error))
+        except Exception as error:
+            record.update(status="error", error=f"{type(error).__name__}: {error}")
+        return record
+
+    writer = None
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(["address", "status", "result", "error"])
+    counts = {"ok": 0, "not_found": 0, "error": 0}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for record in pool.map(work, items):
+            counts[record["status"]] += 1
+            result = [str(line) for line in record["result"]]
+            if writer is not None:
+                writer.writerow([record["address"], record["status"],
+                                 " | ".join(result), record["error"]])
+            else:
+                record["result"] = result
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+    return counts
+
+
+def load_messages(file):
+    """Messages of fh from file (copy under ac.localpath)
+
+    An older copy has fewer entries than this version of fh reads, they
+    are taken from messages of the package with the same name.
+    """
+    message = snapshots.load_yaml(file, encoding="utf8")
+    packaged = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "YAML", os.path.basename(file),
+    )
+    if os.path.exists(packaged) and not os.path.samefile(packaged, file):
+        default = snapshots.load_yaml(packaged, encoding="utf8")
+        if len(message) < len(default):
+            message = message + default[len(message):]
+    return message
+
+
 def findhost(argv=None):
     """
     If file with this python script named fh.py it look up fh.yaml
@@ -410,42 +797,76 @@ def findhost(argv=None):
         if os.path.exists(config_path):
             setup_config(config_path)
         else:
-            print("The fh (findhost)requires a configuration file fh.yaml either in the same folder as fh.py or in ~/astarmiko/YAML/")
+            say("The fh (findhost)requires a configuration file fh.yaml either in the same folder as fh.py or in ~/astarmiko/YAML/")
             sys.exit()
     
     from astarmiko.base import ac
 
     file = ac.localpath + "messages_" + ac.language + ".yaml"
-    with open(file, encoding="utf8") as f:
-        message = yaml.safe_load(f)
+    message = load_messages(file)
     parser = argparse.ArgumentParser(description=message[2])
-    parser.add_argument(dest="ip", help=message[3])
+    parser.add_argument(dest="ip", nargs="?", default="", help=message[3])
     parser.add_argument("-s", dest="seg", default="RPB", help=message[4])
     parser.add_argument("-r", dest="repeat", default=False, type=bool,
                         help=message[5])
     parser.add_argument("-f", dest="file_to_save", help=message[6])
+    parser.add_argument("--index", action="store_true", help=message[35])
+    parser.add_argument("--verify", action="store_true", help=message[36])
+    parser.add_argument("--build-index", dest="build_index",
+                        action="store_true", help=message[37])
+    parser.add_argument("-b", "--batch", dest="batch", help=message[38])
+    parser.add_argument("--workers", type=int, default=16, help=message[39])
+    parser.add_argument("--format", dest="fmt", choices=["csv", "ndjson"],
+                        default="csv", help=message[40])
     args = parser.parse_args()
 
     # если ввели fh без аргументов попросит ввести адрес или имя хоста
 
-    try:
-        ip = args.ip
-    except IndexError:
-        ip = ""
-        while not ip:
-            ip = input(message[0])
+    ip = args.ip
+    while not ip and not args.build_index and not args.batch:
+        ip = input(message[0])
 
-    print(message[1])
+    # in batch mode stdout may carry the records
+    print(message[1], file=sys.stderr if args.batch else sys.stdout)
     myactivka = Activka("activka_byname.yaml")
+    if args.build_index:
+        build_routine(myactivka, ac)
+        return
+    if args.batch:
+        if args.batch == "-":
+            items = read_addresses(sys.stdin)
+        else:
+            with open(args.batch, encoding="utf8") as f:
+                items = read_addresses(f)
+        out = (open(args.file_to_save, "w", encoding="utf8", newline="")
+               if args.file_to_save else sys.stdout)
+        try:
+            counts = batch_routine(
+                myactivka, ac, items, out, workers=args.workers,
+                fmt=args.fmt, seg_name=args.seg, use_index=args.index,
+                verify=args.verify,
+            )
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        print(message[41].format(counts["ok"], counts["not_found"],
+                                 counts["error"]), file=sys.stderr)
+        return
     is_mac = convert_mac(ip, "cisco_ios")
     repeat_out = []
     while True:
-        if not is_mac:
-            out = ip_routine(myactivka, ip, ac)
-            repeat_out.append(out)
-        else:
-            out = mac_routine(myactivka, is_mac)
-            repeat_out.append(out)
+        out = False
+        if args.index or args.verify:
+            out = index_routine(myactivka, ip, ac, verify=args.verify)
+        try:
+            if not out and not is_mac:
+                out = ip_routine(myactivka, ip, ac)
+            elif not out:
+                out = mac_routine(myactivka, is_mac, ac)
+        except FindHostError:
+            # the reason is already printed
+            sys.exit()
+        repeat_out.append(out)
         if not args.repeat:
             if args.file_to_save:
                 repeat_out = "\n".join(repeat_out[0])
@@ -0,0 +1,230 @@
+# session_pool.py
+"""
+Process-wide pool of persistent SSH (netmiko) sessions.
+
+send_commands() borrows a session from the pool instead of opening
+a new ConnectHandler for every command, so the second command to the
+same device does not pay TCP + SSH + AAA + enable again.
+"""
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_IDLE_TIMEOUT = 120
+_DEFAULT_MAX_AGE = 1800
+
+
+class PooledSession:
+    """One netmiko connection owned by the pool"""
+
+    def __init__(self, key, connection):
+        self.key = key
+        self.connection = connection
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.uses = 0
+
+    def expired(self, idle_timeout, max_age, now=None):
+        now = time.monotonic() if now is None else now
+        if idle_timeout and now - self.last_used > idle_timeout:
+            return True
+        if max_age and now - self.created > max_age:
+            return True
+        return False
+
+
+class SessionPool:
+    """Pool of idle netmiko sessions keyed by device and credential
+
+    A session is handed out exclusively: while one thread works with it,
+    nobody else can check it out. After use it returns to the pool and
+    can be reused until it is idle longer than idle_timeout or older
+    than max_age. Every checkout of an idle session is preceded by
+    a health check (is_alive()), a dead session is silently replaced
+    by a new one.
+    """
+
+    def __init__(self, enabled=True, idle_timeout=_DEFAULT_IDLE_TIMEOUT,
+                 max_age=_DEFAULT_MAX_AGE, max_idle_per_device=2):
+        self.enabled = enabled
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self.max_idle_per_device = max_idle_per_device
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "reused": 0, "closed": 0, "failed": 0}
+
+    def configure(self, enabled=None, idle_timeout=None, max_age=None,
+                  max_idle_per_device=None):
+        """Change pool parameters (section session_pool of astarmiko.yaml)
+        """
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if idle_timeout is not None:
+            self.idle_timeout = idle_timeout
+        if max_age is not None:
+            self.max_age = max_age
+        if max_idle_per_device is not None:
+            self.max_idle_per_device = max_idle_per_device
+        if not self.enabled:
+            self.close_all()
+
+    @staticmethod
+    def make_key(device):
+        """Key of session: the same device with other credential
+           is a different session
+        """
+        return (
+            device.get("device_type"),
+            device.get("ip") or device.get("host"),
+            device.get("port", 22),
+            device.get("username"),
+            device.get("password"),
+        )
+
+    def _open(self, device):
+        from netmiko import ConnectHandler
+
+        connection = ConnectHandler(**device)
+        connection.enable()
+        return connection
+
+    def _close(self, session):
+        try:
+            session.connection.disconnect()
+        except Exception as error:
+            logger.debug(f"Error while closing session: {error}")
+        with self._lock:
+            self.stats["closed"] += 1
+
+    def _healthy(self, session):
+        try:
+            return session.connection.is_alive()
+        except Exception:
+            return False
+
+    def checkout(self, device):
+        """Get session for device: idle and healthy one or a new one
+
+        Args:
+            device (dict): dictionary in netmiko format
+
+        Returns:
+            (PooledSession, bool): session and flag it was reused
+        """
+        key = self.make_key(device)
+        while self.enabled:
+            with self._lock:
+                idle = self._idle.get(key)
+                session = idle.pop() if idle else None
+            if session is None:
+                break
+            if session.expired(self.idle_timeout, self.max_age):
+                self._close(session)
+                continue
+            if not self._healthy(session):
+                logger.info(f"Stale session to {key[1]}, reconnecting")
+                self._close(session)
+                continue
+            with self._lock:
+                self.stats["reused"] += 1
+            session.uses += 1
+            return session, True
+        session = PooledSession(key, self._open(device))
+        session.uses += 1
+        with self._lock:
+            self.stats["opened"] += 1
+        return session, False
+
+    def checkin(self, session):
+        """Return session to the pool after successful use"""
+        session.last_used = time.monotonic()
+        if (not self.enabled
+                or session.expired(self.idle_timeout, self.max_age)):
+            self._close(session)
+            return
+        with self._lock:
+            idle = self._idle.setdefault(session.key, [])
+            if len(idle) < self.max_idle_per_device:
+                idle.append(session)
+                session = None
+        if session is not None:
+            self._close(session)
+        self.purge()
+
+    def discard(self, session):
+        """Close session that can't be trusted anymore (error in the middle
+           of dialog, timeout of reading etc.)
+        """
+        with self._lock:
+            self.stats["failed"] += 1
+        self._close(session)
+
+    def run(self, device, func, *args, retry=False, **kwargs):
+        """Execute func(connection, *args, **kwargs) on pooled session
+
+        If reused session breaks down (device closed it by exec-timeout
+        between health check and command), it is replaced by a new one
+        and func is repeated once - only if retry is True. Set it for
+        idempotent calls (exec mode) only: a config set which broke the
+        session half way must not be sent (and written) a second time.
+        """
+        session, reused = self.checkout(device)
+        try:
+            result = func(session.connection, *args, **kwargs)
+        except (OSError, EOFError) as error:
+            self.discard(session)
+            if not (reused and retry):
+                raise
+            logger.info(
+                f"Session to {session.key[1]} broken ({error}), reconnecting"
+            )
+            session, _ = self.checkout(device)
+            try:
+                result = func(session.connection, *args, **kwargs)
+            except Exception:
+                self.discard(session)
+                raise
+        except Exception:
+            self.discard(session)
+            raise
+        self.checkin(session)
+        return result
+
+    def purge(self):
+        """Close all idle sessions which were expired"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for key, idle in list(self._idle.items()):
+                alive = []
+                for session in idle:
+                    if session.expired(self.idle_timeout, self.max_age, now):
+                        expired.append(session)
+                    else:
+                        alive.append(session)
+                if alive:
+                    self._idle[key] = alive
+                else:
+                    del self._idle[key]
+        for session in expired:
+            self._close(session)
+
+    def close_all(self):
+        """Close all idle sessions (called at exit of interpreter)"""
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for session in sessions:
+            self._close(session)
+
+    def idle_count(self):
+        with self._lock:
+            return sum(len(idle) for idle in self._idle.values())
+
+
+pool = SessionPool()
+atexit.register(pool.close_all)
@@ -0,0 +1,162 @@
+# snapshot.py
+"""
+Compiled snapshots of YAML files.
+
+Parsing a big activka_byname.yaml with yaml.safe_load takes most of the
+start time of short runs (fh, acm). The parsed data, together with
+everything derived from it, is stored as a pickle in a cache directory
+and reused while the source file is unchanged: the snapshot is valid if
+mtime and size of the file are the same, or (after touch, checkout, copy)
+if the content hash is the same. Otherwise the file is parsed again and
+the snapshot is rewritten.
+
+Only structures built from the YAML files are stored, never credentials.
+The cache directory is created with mode 0700, because pickles must be
+trusted.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Increase when the layout of stored data changes
+FORMAT = 1
+
+
+def _digest(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def atomic_write(path, data):
+    """Replace file path by data (str or bytes) at once
+
+    data goes to a temporary file of its own in the same directory which
+    then replaces path, so neither readers nor concurrent writers (other
+    threads, fh --build-index run by cron twice) see a half-written file
+
+    Raises:
+        OSError: the file can't be written, path is left as it was
+    """
+    directory = os.path.dirname(path) or "."
+    tmp = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            "wb" if isinstance(data, bytes) else "w", dir=directory,
+            prefix=os.path.basename(path) + ".", suffix=".tmp", delete=False,
+        ) as f:
+            tmp = f.name
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if tmp and os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class SnapshotStore:
+    """Cache of data compiled from source files"""
+
+    def __init__(self, enabled=True, directory="~/.cache/astarmiko"):
+        self.enabled = enabled
+        self.directory = os.path.expanduser(directory)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "rebuilt": 0}
+
+    def configure(self, enabled=None, directory=None):
+        """Change settings (section snapshot of astarmiko.yaml)"""
+        if enabled is not None:
+            self.enabled = enabled
+        if directory:
+            self.directory = os.path.expanduser(directory)
+
+    def _snapshot_path(self, path, kind):
+        key = hashlib.sha1(f"{kind}:{path}".encode()).hexdigest()[:20]
+        return os.path.join(self.directory, f"{kind}-{key}.pickle")
+
+    def _read(self, snapshot_path):
+        try:
+            with open(snapshot_path, "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as error:
+            logger.warning(f"Broken snapshot {snapshot_path}: {error}")
+            return None
+
+    def _write(self, snapshot_path, record):
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            atomic_write(snapshot_path, pickle.dumps(
+                record, protocol=pickle.HIGHEST_PROTOCOL))
+        except OSError as error:
+            logger.warning(f"Can't write snapshot {snapshot_path}: {error}")
+
+    def load(self, path, build, kind="yaml"):
+        """Return data compiled from file path
+
+        Args:
+            path (str): source file
+            build (callable): build(path) -> data, called when there is no
+                              valid snapshot
+            kind (str): name of the compiled form, one source file may
+                        have several
+
+        Returns:
+            data returned by build(path) now or at some earlier run
+        """
+        path = os.path.abspath(os.path.expanduser(path))
+        if not self.enabled:
+            return build(path)
+        stat = os.stat(path)
+        snapshot_path = self._snapshot_path(path, kind)
+        record = self._read(snapshot_path)
+        if record is not None and record.get("format") == FORMAT:
+            if (record["mtime"], record["size"]) == (stat.st_mtime_ns,
+                                                    stat.st_size):
+                with self._lock:
+                    self.stats["hits"] += 1
+                return record["data"]
+            digest = _digest(path)
+            if record["sha256"] == digest:
+                # the same content with new mtime - refresh the key only
+                record.update(mtime=stat.st_mtime_ns, size=stat.st_size)
+                self._write(snapshot_path, record)
+                with self._lock:
+                    self.stats["hits"] += 1
+                return record["data"]
+        else:
+            digest = _digest(path)
+        data = build(path)
+        self._write(snapshot_path, {
+            "format": FORMAT,
+            "source": path,
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": digest,
+            "data": data,
+        })
+        with self._lock:
+            self.stats["rebuilt"] += 1
+        logger.debug(f"Snapshot of {path} ({kind}) rebuilt")
+        return data
+
+    def load_yaml(self, path, encoding=None):
+        """yaml.safe_load of file path through the snapshot"""
+        def build(source):
+            import yaml
+
+            with open(source, encoding=encoding) as f:
+                return yaml.safe_load(f)
+
+        return self.load(path, build, kind="yaml")
+
+
+store = SnapshotStore()
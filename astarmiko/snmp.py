@@ -0,0 +1,499 @@
+# snmp.py
+"""
+Reusable asynchronous SNMP client built on pysnmp.
+
+One SnmpEngine is kept per event loop instead of one per request (and
+closed with its transports when asyncio.run() finishes the loop), auth
+data, transport targets and resolved OIDs are cached, many OIDs go in one
+PDU (up to max_varbinds) and many hosts are polled concurrently under
+a limit. Tables are walked with GETBULK and streamed as async generators
+(walk, walk_many), so a large table costs a handful of PDUs and memory of
+one PDU. base.snmp_get_oid is a thin wrapper over the module-level client.
+
+mac_table and arp_table read whole MAC (Q-BRIDGE-MIB) and ARP (IP-MIB)
+tables into rows of the TextFSM templates, Activka.read_table uses them
+for device types listed in 'snmp_tables' of commands.yaml.
+
+Usage:
+    values = await client.get('10.1.1.1', ['1.3.6.1.2.1.1.5.0'],
+                              community='public')
+    # {'1.3.6.1.2.1.1.5.0': 'router1'}
+"""
+import asyncio
+import logging
+import threading
+import weakref
+
+logger = logging.getLogger(__name__)
+
+
+class SnmpError(Exception):
+    """SNMP request failed: timeout, error status of agent etc."""
+
+
+class SnmpClient:
+    """SNMP v1/v2c GET for many OIDs and many hosts"""
+
+    def __init__(self, community="public", version=2, port=161, timeout=1,
+                 retries=5, concurrency=64, max_varbinds=32,
+                 max_repetitions=25):
+        """
+        Args:
+            community (str): default community
+            version (int): default version of SNMP (1 or 2)
+            port (int): default port of agents
+            timeout (float): seconds to wait for one answer
+            retries (int): retries of one request
+            concurrency (int): requests in flight at the same time
+            max_varbinds (int): OIDs in one PDU
+            max_repetitions (int): rows asked by one GETBULK of walk
+        """
+        self.community = community
+        self.version = version
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.concurrency = concurrency
+        self.max_varbinds = max_varbinds
+        self.max_repetitions = max_repetitions
+        self._auth = {}
+        self._loops = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def configure(self, **kwargs):
+        """Change defaults (section snmp of astarmiko.yaml)"""
+        for key in ("community", "version", "port", "timeout", "retries",
+                    "concurrency", "max_varbinds", "max_repetitions"):
+            if kwargs.get(key) is not None:
+                setattr(self, key, kwargs[key])
+        self.close()
+
+    def _state(self):
+        """Engine, semaphore, targets and OIDs of the running event loop
+
+        pysnmp engine is bound to the loop it was first used in, so every
+        loop (asyncio.run in another thread or the next call) gets its own
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loops.get(loop)
+            if state is not None:
+                return state
+            from pysnmp.hlapi.v3arch.asyncio import SnmpEngine
+
+            state = self._loops[loop] = _LoopState(
+                SnmpEngine(), asyncio.Semaphore(self.concurrency)
+            )
+        state.keeper = loop.create_task(self._keep(loop, state))
+        return state
+
+    async def _keep(self, loop, state):
+        """Wait until the loop cancels leftover tasks at its end
+           (asyncio.run does), then close the engine of the loop while
+           the loop can still close its sockets
+        """
+        try:
+            await loop.create_future()
+        finally:
+            with self._lock:
+                if self._loops.get(loop) is state:
+                    del self._loops[loop]
+            state.close()
+
+    def _auth_data(self, community, version):
+        key = (community, version)
+        if key not in self._auth:
+            from pysnmp.hlapi.v3arch.asyncio import CommunityData
+
+            self._auth[key] = CommunityData(
+                community, mpModel=0 if version == 1 else 1
+            )
+        return self._auth[key]
+
+    async def _target(self, state, host, port):
+        key = (host, port)
+        task = state.targets.get(key)
+        if task is None:
+            from pysnmp.hlapi.v3arch.asyncio import UdpTransportTarget
+
+            # concurrent requests to the same host wait for one resolution
+            task = state.targets[key] = asyncio.ensure_future(
+                UdpTransportTarget.create(
+                    (host, port), timeout=self.timeout, retries=self.retries
+                )
+            )
+        try:
+            return await task
+        except Exception:
+            state.targets.pop(key, None)
+            raise
+
+    def _objects(self, state, oids):
+        from pysnmp.hlapi.v3arch.asyncio import ObjectIdentity, ObjectType
+
+        objects = []
+        for oid in oids:
+            # resolved identities are reused, MIB lookup is done once
+            if oid not in state.identities:
+                state.identities[oid] = ObjectIdentity(oid)
+            objects.append(ObjectType(state.identities[oid]))
+        return objects
+
+    async def _send(self, engine, auth, target, objects):
+        from pysnmp.hlapi.v3arch.asyncio import ContextData, get_cmd
+
+        return await get_cmd(engine, auth, target, ContextData(), *objects)
+
+    async def request(self, host, oids, community=None, version=None,
+                      port=None):
+        """Raw GET of oids (split into PDUs of max_varbinds)
+
+        Returns:
+            (tuple): errorIndication, errorStatus, errorIndex, varBinds -
+                     as pysnmp get_cmd, varBinds of all PDUs together;
+                     the first error stops the request
+        """
+        state = self._state()
+        auth = self._auth_data(community or self.community,
+                               version or self.version)
+        try:
+            target = await self._target(state, host, port or self.port)
+        except Exception as error:
+            # unresolvable name is reported like a timeout
+            return str(error), 0, 0, ()
+        var_binds = []
+        for i in range(0, len(oids), self.max_varbinds):
+            chunk = self._objects(state, oids[i:i + self.max_varbinds])
+            async with state.semaphore:
+                error_indication, error_status, error_index, answer = (
+                    await self._send(state.engine, auth, target, chunk)
+                )
+            if error_indication or error_status:
+                return error_indication, error_status, error_index, answer
+            var_binds.extend(answer)
+        return None, 0, 0, tuple(var_binds)
+
+    async def get(self, host, oids, community=None, version=None, port=None):
+        """GET values of oids from host
+
+        Returns:
+            (dict): {oid: value as string or None if agent has no such
+                     object}
+
+        Raises:
+            SnmpError: no answer or error status
+        """
+        oids = list(oids)
+        error_indication, error_status, error_index, var_binds = (
+            await self.request(host, oids, community, version, port)
+        )
+        if error_indication:
+            raise SnmpError(f"{host}: {error_indication}")
+        if error_status:
+            raise SnmpError("{}: {} at {}".format(
+                host, error_status.prettyPrint(),
+                error_index and var_binds[int(error_index) - 1][0] or "?",
+            ))
+        result = {}
+        for oid, (_, value) in zip(oids, var_binds):
+            missing = value.__class__.__name__ in (
+                "NoSuchObject", "NoSuchInstance", "EndOfMibView")
+            result[oid] = None if missing else value.prettyPrint()
+        return result
+
+    async def get_many(self, hosts, oids, community=None, version=None,
+                       port=None):
+        """GET the same oids from many hosts concurrently
+
+        Returns:
+            (dict): {host: {oid: value} or SnmpError}
+        """
+        hosts = list(hosts)
+
+        async def one(host):
+            try:
+                return await self.get(host, oids, community, version, port)
+            except SnmpError as error:
+                return error
+
+        answers = await asyncio.gather(*(one(host) for host in hosts))
+        return dict(zip(hosts, answers))
+
+    async def _send_bulk(self, engine, auth, target, oid, repetitions,
+                         version):
+        from pysnmp.hlapi.v3arch.asyncio import (
+            ContextData, bulk_cmd, next_cmd,
+        )
+        from pysnmp.proto.rfc1902 import Null
+
+        # answers are not resolved through MIB, rows come as
+        # (ObjectName, value)
+        if version == 1:
+            # no GETBULK in SNMPv1
+            return await next_cmd(engine, auth, target, ContextData(),
+                                  (oid, Null("")), lookupMib=False)
+        return await bulk_cmd(engine, auth, target, ContextData(), 0,
+                              repetitions, (oid, Null("")), lookupMib=False)
+
+    async def walk(self, host, oid, community=None, version=None, port=None,
+                   max_repetitions=None, raw=False):
+        """Walk subtree of oid with GETBULK (GETNEXT for SNMPv1)
+
+        Rows are yielded as they arrive, one PDU of max_repetitions rows at
+        a time, the walk stops at the end of the subtree.
+
+        Usage:
+            async for oid, value in client.walk(host, '1.3.6.1.2.1.2'):
+                ...
+
+        Args:
+            raw (bool, optional): yield pysnmp objects (ObjectName, value)
+                                  instead of strings
+
+        Yields:
+            (tuple): (oid, value as string)
+
+        Raises:
+            SnmpError: no answer, error status or agent returned OIDs out of
+                       order
+        """
+        from pysnmp.proto.rfc1902 import ObjectName
+
+        version = version or self.version
+        repetitions = max_repetitions or self.max_repetitions
+        state = self._state()
+        auth = self._auth_data(community or self.community, version)
+        try:
+            target = await self._target(state, host, port or self.port)
+        except Exception as error:
+            raise SnmpError(f"{host}: {error}")
+        root = last = ObjectName(oid)
+        while True:
+            async with state.semaphore:
+                error_indication, error_status, error_index, rows = (
+                    await self._send_bulk(state.engine, auth, target, last,
+                                          repetitions, version)
+                )
+            if error_indication:
+                raise SnmpError(f"{host}: {error_indication}")
+            if error_status:
+                if version == 1 and int(error_status) == 2:
+                    # noSuchName - SNMPv1 end of MIB view
+                    return
+                raise SnmpError("{}: {} walking {}".format(
+                    host, error_status.prettyPrint(), oid))
+            if not rows:
+                return
+            for name, value in rows:
+                if (value.__class__.__name__ == "EndOfMibView"
+                        or not root.isPrefixOf(name)):
+                    return
+                if name <= last:
+                    raise SnmpError(f"{host}: OID {name} is not increasing")
+                last = name
+                if raw:
+                    yield name, value
+                else:
+                    yield str(name), value.prettyPrint()
+
+    async def walk_many(self, hosts, oid, errors=None, community=None,
+                        version=None, port=None, max_repetitions=None,
+                        raw=False):
+        """Walk the same subtree on many hosts concurrently
+
+        Rows of all hosts are yielded as they arrive; a bounded queue
+        holds the walks when the consumer is slower.
+
+        Args:
+            errors (dict, optional): filled with {host: error} of
+                                     failed walks
+
+        Yields:
+            (tuple): (host, oid, value as string)
+        """
+        hosts = list(hosts)
+        queue = asyncio.Queue(maxsize=4 * (max_repetitions
+                                           or self.max_repetitions))
+        done = object()
+
+        async def one(host):
+            try:
+                async for name, value in self.walk(
+                    host, oid, community, version, port, max_repetitions, raw
+                ):
+                    await queue.put((host, name, value))
+            except Exception as error:
+                if errors is not None:
+                    errors[host] = error
+                logger.warning(f"SNMP walk of {oid}: {error}")
+            # not reached when the consumer has stopped and cancelled us
+            await queue.put(done)
+
+        tasks = [asyncio.ensure_future(one(host)) for host in hosts]
+        try:
+            running = len(tasks)
+            while running:
+                item = await queue.get()
+                if item is done:
+                    running -= 1
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        """Release engines of all event loops"""
+        with self._lock:
+            states = list(self._loops.items())
+            self._loops.clear()
+        for loop, state in states:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(state.keeper.cancel)
+            if not loop.is_running():
+                state.close()
+
+
+class _LoopState:
+    """What SnmpClient keeps for one event loop"""
+
+    def __init__(self, engine, semaphore):
+        self.engine = engine
+        self.semaphore = semaphore
+        self.targets = {}
+        self.identities = {}
+        self.keeper = None
+
+    def close(self):
+        engine, self.engine = self.engine, None
+        if engine is None:
+            return
+        try:
+            engine.close_dispatcher()
+        except Exception as error:
+            logger.debug(f"SNMP engine close: {error}")
+
+
+client = SnmpClient()
+
+
+# ARP and MAC tables by SNMP, rows have the same shape as rows of
+# arp_by and mac_addr_tbl_byport templates
+IF_NAME = "1.3.6.1.2.1.31.1.1.1.1"
+DOT1D_BASE_PORT_IFINDEX = "1.3.6.1.2.1.17.1.4.1.2"
+DOT1Q_TP_FDB_PORT = "1.3.6.1.2.1.17.7.1.2.2.1.2"
+IP_NET_TO_PHYSICAL_PHYS_ADDRESS = "1.3.6.1.2.1.4.35.1.4"
+IP_NET_TO_MEDIA_PHYS_ADDRESS = "1.3.6.1.2.1.4.22.1.2"
+
+
+def _suffix(name, root):
+    """Index part of OID name below column root"""
+    return tuple(name)[len(root.split(".")):]
+
+
+async def _column(snmp, host, oid, **kwargs):
+    """{index: value} of one table column"""
+    return {_suffix(name, oid): value
+            async for name, value in snmp.walk(host, oid, raw=True, **kwargs)}
+
+
+async def _if_names(snmp, host, **kwargs):
+    return {index[0]: str(value)
+            for index, value in (
+                await _column(snmp, host, IF_NAME, **kwargs)).items()}
+
+
+async def mac_table(host, snmp=None, **kwargs):
+    """MAC address table of switch from Q-BRIDGE-MIB dot1qTpFdbTable
+
+    Bridge ports are translated to interface names by
+    dot1dBasePortIfIndex and ifName. VLAN is the FDB id, which equals
+    VLAN id on switches with independent VLAN learning.
+
+    Args:
+        host (str): ip address of switch
+        snmp (SnmpClient, optional): default - the shared client
+        **kwargs: community, version, port, max_repetitions of walk
+
+    Returns:
+        (list): [[MAC 'aa:bb:cc:dd:ee:ff', VLAN, INTF]]
+    """
+    from astarmiko.locator import mac_str
+
+    snmp = snmp or client
+    fdb, ports, names = await asyncio.gather(
+        _column(snmp, host, DOT1Q_TP_FDB_PORT, **kwargs),
+        _column(snmp, host, DOT1D_BASE_PORT_IFINDEX, **kwargs),
+        _if_names(snmp, host, **kwargs),
+    )
+    rows = []
+    for index, port in fdb.items():
+        if len(index) != 7 or not int(port):
+            # port 0 - the switch itself or not learned on a port
+            continue
+        if_index = ports.get((int(port),))
+        name = names.get(int(if_index)) if if_index is not None else None
+        rows.append([mac_str(bytes(index[1:])), str(index[0]),
+                     name or str(int(port))])
+    return rows
+
+
+async def arp_table(host, snmp=None, **kwargs):
+    """ARP table of router from IP-MIB ipNetToPhysicalTable (IPv4 entries),
+       ipNetToMediaTable if the device doesn't support the first one
+
+    Args:
+        host (str): ip address of router
+        snmp (SnmpClient, optional): default - the shared client
+        **kwargs: community, version, port, max_repetitions of walk
+
+    Returns:
+        (list): [[ADDR, MAC 'aa:bb:cc:dd:ee:ff', INTF]]
+    """
+    from astarmiko.locator import mac_str
+
+    snmp = snmp or client
+    physical, names = await asyncio.gather(
+        _column(snmp, host, IP_NET_TO_PHYSICAL_PHYS_ADDRESS, **kwargs),
+        _if_names(snmp, host, **kwargs),
+    )
+    entries = []
+    # index is ifIndex, address type (1 - ipv4), length, address
+    for index, mac in physical.items():
+        if len(index) == 7 and index[1:3] == (1, 4):
+            entries.append((index[0], index[3:], mac))
+    if not physical:
+        media = await _column(snmp, host, IP_NET_TO_MEDIA_PHYS_ADDRESS,
+                              **kwargs)
+        # index is ifIndex, address
+        entries = [(index[0], index[1:], mac)
+                   for index, mac in media.items() if len(index) == 5]
+    rows = []
+    for if_index, address, mac in entries:
+        mac = bytes(mac)
+        if len(mac) != 6:
+            # incomplete entry
+            continue
+        rows.append([".".join(str(octet) for octet in address), mac_str(mac),
+                     names.get(if_index, str(if_index))])
+    return rows
+
+
+TABLES = {"arp_table": arp_table, "mac_addr_tbl": mac_table}
+
+
+def read_table(host, table, **kwargs):
+    """Synchronous arp_table / mac_table for code outside event loop
+
+    Args:
+        host (str): ip address of device
+        table (str): 'arp_table' or 'mac_addr_tbl' (names of commands.yaml)
+        **kwargs: community, version, port, max_repetitions of walk
+
+    Raises:
+        SnmpError: device is not answering
+    """
+    from astarmiko.sweep import run_sync
+
+    return run_sync(TABLES[table](host, **kwargs))
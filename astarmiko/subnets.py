@@ -0,0 +1,180 @@
+# subnets.py
+"""
+Longest-prefix-match index of subnets -> gateway device.
+
+Replaces the lookup of networks_byip.yaml by the third octet of address,
+which worked only for /24 networks inside one /16. Networks are kept in
+one hash table per prefix length, a lookup tries the present lengths from
+the longest one, so it costs at most 33 dictionary probes.
+
+The index is built from ip interfaces of R/L3 devices
+(Activka.list_of_all_ip_intf) or seeded from networks_byip.yaml, whose
+keys are CIDR networks ('10.1.5.0/24') or, in the old form, third octets
+completed with 'base' ('10.1' -> '10.1.<octet>.0/24').
+"""
+import ipaddress
+import json
+import logging
+import os
+from astarmiko.snapshot import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+class SubnetIndex:
+    """Map of IPv4 networks to device names with longest-prefix match"""
+
+    def __init__(self):
+        self._tables = {}
+        self._lengths = []
+        # old third-octet keys without base, used when nothing matched
+        self.octets = {}
+
+    def add(self, network, device, replace=False):
+        """Add network ('10.1.0.0/16' or IPv4Network) served by device
+
+        The first device added for a network is kept unless replace is True
+        """
+        net = ipaddress.IPv4Network(network, strict=False)
+        table = self._tables.get(net.prefixlen)
+        if table is None:
+            table = self._tables[net.prefixlen] = {}
+            self._lengths = sorted(self._tables, reverse=True)
+        key = int(net.network_address)
+        if replace or key not in table:
+            table[key] = device
+
+    def lookup(self, ip):
+        """Most specific network containing ip
+
+        Returns:
+            (tuple): (network as 'a.b.c.d/len', device) or None
+        """
+        try:
+            address = int(ipaddress.IPv4Address(ip))
+        except ValueError:
+            return None
+        for length in self._lengths:
+            mask = (0xFFFFFFFF << (32 - length)) & 0xFFFFFFFF
+            device = self._tables[length].get(address & mask)
+            if device is not None:
+                network = ipaddress.IPv4Network((address & mask, length))
+                return str(network), device
+        octet = str((address >> 8) & 0xFF)
+        if octet in self.octets:
+            return f"*.*.{octet}.0/24", self.octets[octet]
+        return None
+
+    def gateway(self, ip):
+        """Device serving the network of ip or None"""
+        found = self.lookup(ip)
+        return found[1] if found else None
+
+    def __len__(self):
+        return (sum(len(table) for table in self._tables.values())
+                + len(self.octets))
+
+    def items(self):
+        for length in self._lengths:
+            for key, device in self._tables[length].items():
+                yield str(ipaddress.IPv4Network((key, length))), device
+
+    def save(self, path):
+        """Write index to JSON file {network: device}"""
+        path = os.path.expanduser(path)
+        data = dict(self.items())
+        data.update(self.octets)
+        atomic_write(path, json.dumps(data, indent=1, sort_keys=True))
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.expanduser(path)) as f:
+            return cls.from_mapping(json.load(f))
+
+    @classmethod
+    def from_mapping(cls, mapping, base=None):
+        """Build index from {network: device}
+
+        Args:
+            mapping (dict): keys are CIDR networks or third octets (old
+                            networks_byip.yaml)
+            base (str, optional): first two octets for third-octet keys,
+                                  without it they are matched by the third
+                                  octet only, as before
+        """
+        index = cls()
+        skipped = 0
+        for key, device in mapping.items():
+            key = str(key)
+            if key.isdigit():
+                if not base:
+                    index.octets[key] = device
+                    continue
+                key = f"{base}.{key}.0/24"
+            try:
+                index.add(key, device)
+            except ValueError:
+                skipped += 1
+        if skipped:
+            logger.warning(f"Subnet index: {skipped} keys are not networks")
+        return index
+
+
+def interface_networks(rows):
+    """Networks of rows of list_of_all_ip_intf
+
+    Rows are [interface, ip, mask, ...] for every device type (values
+    of the *_ip_int_br templates in this order), mask is prefix length
+
+    Returns:
+        list of IPv4Network
+    """
+    networks = []
+    for row in rows or []:
+        if len(row) < 3:
+            continue
+        ip, mask = row[1], row[2]
+        try:
+            net = ipaddress.IPv4Network(f"{ip}/{mask}", strict=False)
+        except ValueError:
+            continue
+        # loopbacks are not networks with hosts
+        if net.prefixlen < 32:
+            networks.append(net)
+    return networks
+
+
+def build(myactivka, devices=None, workers=16, seed=None):
+    """Build index from ip interfaces of devices (Activka.ip_interfaces)
+
+    Args:
+        myactivka (Activka): inventory
+        devices (iterable, optional): default - all R and L3 devices
+        workers (int): devices polled at the same time
+        seed (SubnetIndex, optional): networks to start with, interfaces
+                                      of devices override them
+
+    Returns:
+        (tuple): SubnetIndex, errors {device: message}
+    """
+    if devices is None:
+        devices = myactivka.select(levels=["R", "L3"])
+    # routers are added first, they win over L3 switches with the same
+    # network (VRRP/HSRP pairs keep the first name)
+    devices = sorted(devices,
+                     key=lambda d: (myactivka.levels.get(d) != "R", d))
+    index = SubnetIndex()
+    results = myactivka.ip_interfaces(devices, workers=workers)
+    errors = results["failed"]
+    for device in devices:
+        if device in errors:
+            logger.warning(f"Subnet index: {device} skipped: "
+                           f"{errors[device]}")
+            continue
+        for net in interface_networks(results["success"].get(device)):
+            index.add(net, device)
+    if seed is not None:
+        for network, device in seed.items():
+            index.add(network, device)
+        index.octets.update(seed.octets)
+    return index, errors
@@ -0,0 +1,272 @@
+# sweep.py
+"""
+Asynchronous reachability sweeper.
+
+Probes thousands of addresses at once instead of one 'ping -c 3'
+subprocess per device. Uses unprivileged ICMP datagram sockets
+(socket(AF_INET, SOCK_DGRAM, IPPROTO_ICMP), on Linux allowed by
+net.ipv4.ping_group_range) when available and asyncio TCP connects to
+port 22 otherwise. Results are fed to the reachability cache, so the
+executors don't probe these devices again.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import socket
+import struct
+
+from astarmiko.reachability import cache as reachability
+
+logger = logging.getLogger(__name__)
+
+_ICMP_ECHO_REQUEST = 8
+_ICMP_ECHO_REPLY = 0
+
+
+def _icmp_socket():
+    """Unprivileged ICMP datagram socket"""
+    return socket.socket(socket.AF_INET, socket.SOCK_DGRAM,
+                         socket.IPPROTO_ICMP)
+
+
+def icmp_available():
+    """True if unprivileged ICMP datagram socket can be opened"""
+    if os.name == "nt":
+        return False
+    try:
+        sock = _icmp_socket()
+    except OSError:
+        return False
+    sock.close()
+    return True
+
+
+def _checksum(data):
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _echo_request(seq, payload=b"astarmiko"):
+    header = struct.pack("!BBHHH", _ICMP_ECHO_REQUEST, 0, 0, 0, seq)
+    checksum = _checksum(header + payload)
+    header = struct.pack("!BBHHH", _ICMP_ECHO_REQUEST, 0, checksum, 0, seq)
+    return header + payload
+
+
+class _Pacer:
+    """Spreads packets evenly to keep rate (packets per second)"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next = 0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        # short delays are accumulated and slept off in one go
+        if slot - now >= 0.005:
+            await asyncio.sleep(slot - now)
+
+
+class Sweeper:
+    """Probe many ip addresses concurrently
+
+    Usage:
+        alive = await Sweeper(timeout=1).sweep(list_of_ips)
+        # {'10.1.1.1': True, '10.1.1.2': False, ...}
+    """
+
+    def __init__(self, timeout=1.0, retries=2, rate=2000, method="auto",
+                 tcp_port=22, tcp_concurrency=512, feed_cache=True):
+        """
+        Args:
+            timeout (float): seconds to wait for replies of one round
+            retries (int): rounds of probes for silent addresses
+            rate (int): packets (or TCP connects) per second, 0 - no limit
+            method (str): 'auto' (ICMP if available else TCP), 'icmp', 'tcp'
+            tcp_port (int): port for TCP probes
+            tcp_concurrency (int): TCP connects open at the same time
+            feed_cache (bool): store results in the reachability cache
+        """
+        self.timeout = timeout
+        self.retries = max(1, retries)
+        self.rate = rate
+        self.method = method
+        self.tcp_port = tcp_port
+        self.tcp_concurrency = tcp_concurrency
+        self.feed_cache = feed_cache
+
+    @classmethod
+    def from_config(cls, conf, **kwargs):
+        """Create sweeper from section 'sweep' of astarmiko.yaml"""
+        params = {k: conf[k] for k in ("timeout", "retries", "rate", "method",
+                                       "tcp_port", "tcp_concurrency")
+                  if conf.get(k) is not None}
+        params.update(kwargs)
+        return cls(**params)
+
+    def _use_icmp(self):
+        if self.method == "tcp":
+            return False
+        if self.method == "icmp":
+            return True
+        return icmp_available()
+
+    async def sweep(self, ips):
+        """Probe all addresses
+
+        Args:
+            ips (iterable): ip addresses
+
+        Returns:
+            (dict): {ip: True if address answered}
+        """
+        ips = list(dict.fromkeys(ips))
+        if not ips:
+            return {}
+        if self._use_icmp():
+            alive = await self._icmp_sweep(ips)
+        else:
+            alive = await self._tcp_sweep(ips)
+        result = {ip: ip in alive for ip in ips}
+        if self.feed_cache:
+            for ip, up in result.items():
+                reachability.mark(ip, up)
+        logger.info(f"Sweep of {len(ips)} addresses: {len(alive)} alive")
+        return result
+
+    async def _icmp_sweep(self, ips):
+        loop = asyncio.get_running_loop()
+        sock = _icmp_socket()
+        sock.setblocking(False)
+        pending = set()
+        alive = set()
+        waiting = set()
+        done = asyncio.Event()
+
+        def on_readable():
+            while True:
+                try:
+                    data, addr = sock.recvfrom(2048)
+                except (BlockingIOError, InterruptedError):
+                    return
+                except OSError:
+                    return
+                # on some systems reply comes with IP header
+                if data and data[0] >> 4 == 4:
+                    data = data[(data[0] & 0x0F) * 4:]
+                if len(data) < 8 or data[0] != _ICMP_ECHO_REPLY:
+                    continue
+                seq = struct.unpack("!H", data[6:8])[0]
+                if (seq, addr[0]) in pending:
+                    alive.add(addr[0])
+                    waiting.discard(addr[0])
+                    if not waiting:
+                        done.set()
+
+        sequence = itertools.count(1)
+        pacer = _Pacer(self.rate)
+        loop.add_reader(sock.fileno(), on_readable)
+        try:
+            for _ in range(self.retries):
+                todo = [ip for ip in ips if ip not in alive]
+                if not todo:
+                    break
+                waiting.clear()
+                waiting.update(todo)
+                done.clear()
+                for ip in todo:
+                    seq = next(sequence) & 0xFFFF
+                    pending.add((seq, ip))
+                    await pacer.wait()
+                    try:
+                        sock.sendto(_echo_request(seq), (ip, 0))
+                    except BlockingIOError:
+                        await asyncio.sleep(0.01)
+                        try:
+                            sock.sendto(_echo_request(seq), (ip, 0))
+                        except OSError:
+                            pass
+                    except OSError as error:
+                        logger.debug(f"ICMP to {ip} failed: {error}")
+                        waiting.discard(ip)
+                if waiting:
+                    try:
+                        await asyncio.wait_for(done.wait(), self.timeout)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            loop.remove_reader(sock.fileno())
+            sock.close()
+        return alive
+
+    async def _tcp_probe(self, ip, semaphore, pacer):
+        async with semaphore:
+            for _ in range(self.retries):
+                await pacer.wait()
+                try:
+                    _, writer = await asyncio.wait_for(
+                        asyncio.open_connection(ip, self.tcp_port),
+                        self.timeout,
+                    )
+                    writer.close()
+                    return True
+                except ConnectionRefusedError:
+                    # RST came back - the host is alive
+                    return True
+                except (OSError, asyncio.TimeoutError):
+                    continue
+            return False
+
+    async def _tcp_sweep(self, ips):
+        semaphore = asyncio.Semaphore(self.tcp_concurrency)
+        pacer = _Pacer(self.rate)
+        answers = await asyncio.gather(
+            *(self._tcp_probe(ip, semaphore, pacer) for ip in ips)
+        )
+        return {ip for ip, up in zip(ips, answers) if up}
+
+
+def run_sync(coro):
+    """asyncio.run() which works also when the calling thread already
+       runs an event loop (then coroutine is run in a helper thread).
+       For blocking wrappers of coroutines (probe, sweep, snmp.read_table)
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+async def probe_async(ip, conf=None, **kwargs):
+    """Probe one address by Sweeper, return True if it answered
+
+    Args:
+        ip (str): ip address
+        conf (dict, optional): section 'sweep' of astarmiko.yaml
+        **kwargs: parameters of Sweeper overriding conf
+    """
+    result = await Sweeper.from_config(conf or {}, **kwargs).sweep([ip])
+    return result[ip]
+
+
+def probe(ip, conf=None, **kwargs):
+    """Blocking variant of probe_async for synchronous code"""
+    return run_sync(probe_async(ip, conf, **kwargs))
+
+
+def sweep(ips, conf=None, **kwargs):
+    """Blocking sweep of many addresses, see Sweeper.sweep"""
+    return run_sync(Sweeper.from_config(conf or {}, **kwargs).sweep(ips))
@@ -0,0 +1,114 @@
+# template_cache.py
+"""
+Registry of compiled TextFSM templates.
+
+Every template is compiled once and kept while its file is not changed
+(mtime). Compiled FSM objects keep parsing state, so the registry hands
+out one instance per concurrent user: an idle instance is reset and
+reused, a new one is compiled only when all are busy.
+"""
+import glob
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateRegistry:
+    """Cache of compiled TextFSM templates keyed by path"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {"compiled": 0, "reused": 0, "invalidated": 0}
+
+    @staticmethod
+    def _compile(path):
+        import textfsm
+
+        with open(path) as tmpl:
+            return textfsm.TextFSM(tmpl)
+
+    def _checkout(self, path):
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry["mtime"] != mtime:
+                # template was edited - forget all compiled instances
+                entry = None
+                self.stats["invalidated"] += 1
+            if entry is None:
+                entry = {"mtime": mtime, "idle": []}
+                self._entries[path] = entry
+            if entry["idle"]:
+                self.stats["reused"] += 1
+                return entry["idle"].pop(), mtime
+        fsm = self._compile(path)
+        with self._lock:
+            self.stats["compiled"] += 1
+        return fsm, mtime
+
+    def _checkin(self, path, fsm, mtime):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry["mtime"] == mtime:
+                entry["idle"].append(fsm)
+
+    @contextmanager
+    def fsm(self, path):
+        """Get compiled TextFSM object for exclusive use
+
+        Usage:
+            with registry.fsm(path) as fsm:
+                rows = fsm.ParseText(output)
+        """
+        path = os.path.expanduser(path)
+        fsm, mtime = self._checkout(path)
+        fsm.Reset()
+        try:
+            yield fsm
+        finally:
+            self._checkin(path, fsm, mtime)
+
+    def parse(self, path, text):
+        """Parse text with template from path
+
+        Returns:
+            list of lists obtained using the template
+        """
+        with self.fsm(path) as fsm:
+            return fsm.ParseText(text)
+
+    def invalidate(self, path=None):
+        """Forget compiled template (or all templates if path is None)"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.expanduser(path), None)
+
+    def preload(self, directory, pattern="*.template"):
+        """Compile all templates of directory (usually ac.templpath)
+
+        Used at startup both to warm up the cache and to validate
+        templates: a broken template is reported here, not in the middle
+        of a fleet sweep.
+
+        Returns:
+            errors (dict): {file name: error message} of broken templates
+        """
+        errors = {}
+        directory = os.path.expanduser(directory)
+        for path in sorted(glob.glob(os.path.join(directory, pattern))):
+            try:
+                with self.fsm(path):
+                    pass
+            except Exception as error:
+                errors[os.path.basename(path)] = str(error)
+                logger.error(f"Broken TextFSM template {path}: {error}")
+        return errors
+
+
+registry = TemplateRegistry()
@@ -0,0 +1,167 @@
+# tests/test_async_exec.py
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from astarmiko import async_exec
+from astarmiko.async_exec import ActivkaAsync, BlockingExecutor
+
+
+def make_activka():
+    act = ActivkaAsync.__new__(ActivkaAsync)
+    act.ac = MagicMock(commands={})
+    act.executor = BlockingExecutor(pool_size=2)
+    act.concurrency = {}
+    act.segment = {}
+    act.dev_type = {}
+    act.sweep_devices = AsyncMock(return_value={})
+    act.choose = lambda name, withoutname=True: {
+        "ip": name, "device_type": "cisco_ios"}
+    return act
+
+
+async def fake_send(device, commands, mode="exec"):
+    if device["ip"] == "slow":
+        await asyncio.sleep(0.2)
+    if device["ip"] == "broken":
+        raise ConnectionError("auth failed")
+    outputs = [f"{device['ip']}: {cmd}" for cmd in commands]
+    # as send_commands: the output of a single command as is
+    return outputs[0] if len(outputs) == 1 else outputs
+
+
+class TestIterExecute(unittest.TestCase):
+
+    def setUp(self):
+        self.act = make_activka()
+        self.addCleanup(self.act.executor.shutdown)
+        self.act._send = fake_send
+        patcher = patch.object(
+            async_exec, "is_device_available",
+            AsyncMock(side_effect=lambda ip: ip != "down"),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_results_are_yielded_as_devices_finish(self):
+        async def run():
+            return [item async for item in self.act.iter_execute(
+                ["slow", "fast", "down", "broken"], ["show clock"],
+                progress=False,
+            )]
+
+        items = asyncio.run(run())
+        self.assertEqual(items[-1], ("slow", "success", "slow: show clock"))
+        self.assertIn(("fast", "success", "fast: show clock"), items)
+        self.assertIn(("down", "unreachable", None), items)
+        self.assertIn(("broken", "failed", "auth failed"), items)
+
+    def test_consumer_may_stop_early(self):
+        async def run():
+            async for item in self.act.iter_execute(
+                ["slow", "fast"], ["show clock"], progress=False,
+            ):
+                return item
+
+        self.assertEqual(asyncio.run(run())[0], "fast")
+
+    def test_failure_around_worker_is_yielded(self):
+        flush = async_exec.DeviceLogCapture.flush
+
+        def broken_flush(log):
+            if log.device == "fast":
+                raise OSError("log is gone")
+            flush(log)
+
+        async def run():
+            return [item async for item in self.act.iter_execute(
+                ["fast", "slow"], ["show clock"], progress=False,
+            )]
+
+        with patch.object(async_exec.DeviceLogCapture, "flush",
+                          broken_flush):
+            items = asyncio.run(asyncio.wait_for(run(), timeout=5))
+        self.assertEqual(items, [("fast", "failed", "log is gone"),
+                                 ("slow", "success", "slow: show clock")])
+
+    def test_execute_on_devices_keeps_its_result(self):
+        with patch("tqdm.tqdm"):
+            result = asyncio.run(self.act.execute_on_devices(
+                ["fast", "down", "broken"], ["show clock", "show ver"]))
+        self.assertEqual(result, {
+            "success": {"fast": ["fast: show clock", "fast: show ver"]},
+            "failed": {"broken": "auth failed"},
+            "unreachable": ["down"],
+        })
+
+    def test_one_templated_entry_keeps_its_rows(self):
+        rows = [["10.0.0.5", "0011.2233.4455", "Vlan10"]]
+        entry = {"command": "show arp", "template": "arp_by"}
+
+        async def send(device, commands, mode="exec"):
+            # as send_commands: the output of a single entry as is
+            return rows if len(commands) == 1 else [rows, "clock"]
+
+        self.act._send = send
+        with patch("tqdm.tqdm"):
+            one = asyncio.run(self.act.execute_on_devices("fast", [entry]))
+            two = asyncio.run(self.act.execute_on_devices(
+                "fast", [entry, "show clock"]))
+        self.assertEqual(one["success"]["fast"], rows)
+        self.assertEqual(two["success"]["fast"], [rows, "clock"])
+
+class TestBlockingExecutor(unittest.TestCase):
+
+    def setUp(self):
+        import threading
+
+        self.executor = BlockingExecutor(pool_size=2, call_timeout=0.05)
+        self.release = threading.Event()
+        self.addCleanup(self.executor.shutdown)
+        self.addCleanup(self.release.set)
+
+    def test_timed_out_call_stays_in_flight(self):
+        async def run():
+            with self.assertRaises(asyncio.TimeoutError):
+                await self.executor.run(self.release.wait, 5)
+
+        asyncio.run(run())
+        # the thread is still busy with the call
+        self.assertEqual(self.executor.stats()["in_flight"], 1)
+        self.assertEqual(self.executor.timed_out, 1)
+        self.release.set()
+        self.executor.shutdown()
+        self.assertEqual(self.executor.in_flight, 0)
+
+    def test_config_call_is_not_timed_out(self):
+        act = make_activka()
+        act.executor = self.executor
+        act.drivers = {}
+
+        def send_commands(device, commands, mode="exec"):
+            self.release.wait(0.2)
+            return f"{mode}: {commands}"
+
+        with patch.object(async_exec, "send_commands", send_commands):
+            result = asyncio.run(act._send(
+                {"ip": "sw1", "device_type": "cisco_ios"}, ["vlan 10"],
+                mode="config"))
+        self.assertEqual(result, "config: ['vlan 10']")
+        self.assertEqual(self.executor.timed_out, 0)
+
+
+class TestDriver(unittest.TestCase):
+
+    def test_asyncssh_only_when_selected(self):
+        act = make_activka()
+        self.addCleanup(act.executor.shutdown)
+        act.drivers = {"cisco_ios": "asyncssh", "eltex": "thread",
+                       "linux": "asyncssh"}
+        self.assertEqual(act.driver("cisco_ios"), "asyncssh")
+        self.assertEqual(act.driver("eltex"), "thread")
+        # no native driver for it
+        self.assertEqual(act.driver("linux"), "thread")
+        self.assertEqual(act.driver("huawei"), "thread")
+
+
+if __name__ == "__main__":
+    unittest.main()
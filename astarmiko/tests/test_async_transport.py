@@ -0,0 +1,179 @@
+# tests/test_async_transport.py
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+import asyncssh
+from astarmiko import async_transport
+from astarmiko.async_transport import AsyncCLISession, async_send_commands
+from astarmiko.credentials import CredentialAffinity
+
+
+class FakeCLI:
+    """Emulates interactive channel of a device: answers every line
+       with output of command and prompt
+    """
+
+    def __init__(self, prompt, outputs, after=None):
+        self.prompt = prompt
+        self.outputs = outputs
+        # line -> prompt shown after it (password, config mode, confirm)
+        self.after = after or {}
+        self.sent = []
+        self.queue = asyncio.Queue()
+        self.stdin = self
+        self.stdout = self
+
+    def write(self, data):
+        line = data.rstrip("\n")
+        self.sent.append(line)
+        self.prompt = self.after.get(line, self.prompt)
+        answer = self.outputs.get(line, "")
+        text = f"{line}\r\n" if line else "\r\n"
+        if answer:
+            text += answer.replace("\n", "\r\n") + "\r\n"
+        self.queue.put_nowait(text + self.prompt)
+
+    async def read(self, n):
+        return await self.queue.get()
+
+
+def make_session(device_type, prompt, outputs):
+    device = {"device_type": device_type, "ip": "10.0.0.1",
+              "username": "u", "password": "p"}
+    cli = AsyncCLISession(device, read_timeout=2)
+    cli._process = FakeCLI(prompt, outputs)
+    return cli
+
+
+class TestAsyncCLISession(unittest.TestCase):
+
+    def test_cisco_prompt_and_command(self):
+        async def scenario():
+            cli = make_session("cisco_ios", "SW1#",
+                               {"show clock": "*10:00:00.000 UTC Mon"})
+            await cli._detect_prompt()
+            self.assertEqual(cli.base_prompt, "SW1")
+            out = await cli.send_command("show clock")
+            self.assertEqual(out, "*10:00:00.000 UTC Mon")
+        asyncio.run(scenario())
+
+    def test_huawei_config_mode_prompt(self):
+        async def scenario():
+            cli = make_session("huawei", "<HUA-s5731-1>", {})
+            await cli._detect_prompt()
+            self.assertEqual(cli.base_prompt, "HUA-s5731-1")
+            cli._process.prompt = "[HUA-s5731-1-vlan10]"
+            out = await cli.send_command("vlan 10")
+            self.assertEqual(out, "")
+        asyncio.run(scenario())
+
+    def test_send_commands_keeps_order(self):
+        async def scenario():
+            cli = make_session("eltex", "mes#",
+                               {"a": "first", "b": "second"})
+            await cli._detect_prompt()
+            self.assertEqual(await cli.send_commands(["a", "b"]),
+                             ["first", "second"])
+        asyncio.run(scenario())
+
+
+def fake_connection(cli):
+    conn = MagicMock()
+    conn.create_process = AsyncMock(return_value=cli)
+    conn.wait_closed = AsyncMock()
+    return conn
+
+
+class RecordingExecutor:
+    """BlockingExecutor which runs calls in place and records them"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def run(self, func, *args, **kwargs):
+        self.calls.append(func.__name__)
+        return func(*args, **kwargs)
+
+
+class TestAsyncCLISessionDialogs(unittest.TestCase):
+
+    def test_connect_enables_and_disables_paging(self):
+        cli = FakeCLI("SW1>", {}, after={"enable": "Password:",
+                                        "en_pw": "SW1#"})
+        device = {"device_type": "cisco_ios", "ip": "10.0.0.1",
+                  "username": "u", "password": "p", "secret": "en_pw"}
+
+        async def scenario():
+            session = AsyncCLISession(device, read_timeout=2,
+                                      known_hosts="/tmp/known_hosts")
+            await session.connect()
+            return session
+
+        with patch("asyncssh.connect",
+                   AsyncMock(return_value=fake_connection(cli))) as connect:
+            session = asyncio.run(scenario())
+        self.assertEqual(connect.call_args.kwargs["known_hosts"],
+                         "/tmp/known_hosts")
+        self.assertEqual(cli.sent, ["", "enable", "en_pw",
+                                    "terminal length 0",
+                                    "terminal width 511"])
+        self.assertEqual(session._last_prompt, "SW1#")
+
+    def test_config_set_saves_with_confirmation(self):
+        async def scenario():
+            session = make_session("cisco_ios", "SW1#", {"y": "[OK]"})
+            session._process.after = {
+                "configure terminal": "SW1(config)#",
+                "vlan 10": "SW1(config-vlan)#",
+                "end": "SW1#",
+                "write memory": "Overwrite the previous NVRAM "
+                                "configuration?[confirm]",
+                "y": "SW1#",
+            }
+            await session._detect_prompt()
+            output = await session.send_config_set(["vlan 10"])
+            return session._process.sent, output
+
+        sent, output = asyncio.run(scenario())
+        self.assertEqual(sent, ["", "configure terminal", "vlan 10", "end",
+                                "write memory", "y"])
+        self.assertIn("[OK]", output)
+
+
+class TestAsyncSendCommands(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.object(async_transport, "credential_affinity",
+                               CredentialAffinity())
+        self.affinity = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.device = {"device_type": "eltex", "ip": "10.0.0.1",
+                       "username": "tacacs", "password": "pw"}
+
+    def test_fallback_account_is_remembered_off_loop(self):
+        def connect(host, username, **kwargs):
+            if username == "tacacs":
+                raise asyncssh.PermissionDenied("denied")
+            return fake_connection(FakeCLI("mes#", {"show clock": "10:00"}))
+
+        executor = RecordingExecutor()
+        with patch("asyncssh.connect", AsyncMock(side_effect=connect)):
+            result = asyncio.run(async_send_commands(
+                self.device, "show clock",
+                accounts=[{"user": "local", "password": "local_pw"}],
+                executor=executor,
+            ))
+        self.assertEqual(result, "10:00")
+        self.assertEqual(self.affinity.preferred("10.0.0.1"), "local")
+        self.assertEqual(executor.calls, ["forget", "remember"])
+
+    def test_connection_errors_return_false(self):
+        for error in (OSError("no route to host"), asyncio.TimeoutError(),
+                      asyncssh.ConnectionLost("reset")):
+            with patch("asyncssh.connect", AsyncMock(side_effect=error)):
+                self.assertIs(asyncio.run(async_send_commands(
+                    self.device, "show clock")), False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -35,5 +35,279 @@ class TestBaseModule(unittest.TestCase):
         result = base.port_name_normalize(port)
         self.assertEqual(result, "GigabitEthernet0/1")
 
+    def test_port_name_normalize_passes_other_names(self):
+        for port, long in [("GE0/0/1", "GigabitEthernet0/0/1"),
+                           ("XGE0/0/1", "XGigabitEthernet0/0/1"),
+                           ("10GE1/0/1", "10GE1/0/1"),
+                           ("Fa0/1", "FastEthernet0/1")]:
+            self.assertEqual(base.port_name_normalize(port), long)
+        for port in ["GigabitEthernet0/1", "TenGigabitEthernet1/1",
+                     "Port-channel1", "Po1", "Eth-Trunk1", "Vlan10"]:
+            self.assertEqual(base.port_name_normalize(port), port)
+
+
+class TestSendCommandsExec(unittest.TestCase):
+
+    def setUp(self):
+        base.ac = MagicMock()
+        self.ssh = MagicMock()
+        self.ssh.send_command.side_effect = lambda cmd, **kw: f"out of {cmd}"
+        patchers = [
+            patch.object(base, "is_device_available", return_value=True),
+            patch.object(base.session_pool, "run",
+                         side_effect=lambda dev, func, *a, retry=False,
+                         **kw: func(self.ssh, *a, **kw)),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+        self.device = {"device_type": "cisco_ios", "ip": "10.0.0.1",
+                       "username": "u", "password": "p"}
+
+    def test_single_command_returns_string(self):
+        self.assertEqual(base.send_commands(self.device, "show clock"),
+                         "out of show clock")
+
+    def test_all_commands_over_one_session(self):
+        result = base.send_commands(self.device,
+                                    ["show clock", "show ver", "show inv"])
+        self.assertEqual(result, ["out of show clock", "out of show ver",
+                                  "out of show inv"])
+        self.assertEqual(base.session_pool.run.call_count, 1)
+        self.assertTrue(base.session_pool.run.call_args.kwargs["retry"])
+
+    def test_config_is_not_retried(self):
+        base.send_commands(self.device, ["vlan 10"], mode="config")
+        self.assertFalse(base.session_pool.run.call_args.kwargs["retry"])
+
+    def test_entry_with_timeout_and_template(self):
+        with patch.object(base, "templatizator",
+                          return_value=[["parsed"]]) as tmpl:
+            result = base.send_commands(self.device, [
+                "show clock",
+                {"command": "show arp", "timeout": 90, "template": "arp_by"},
+            ])
+        self.ssh.send_command.assert_called_with("show arp", read_timeout=90)
+        tmpl.assert_called_once_with("out of show arp", "arp_by", "cisco_ios")
+        self.assertEqual(result[1], [["parsed"]])
+
+    def test_execute_on_devices_one_templated_entry(self):
+        act = base.Activka.__new__(base.Activka)
+        act.choose = lambda name, withoutname=True: self.device
+        act._is_device_available = lambda device: True
+        entry = {"command": "show arp", "template": "arp_by"}
+        rows = [["10.0.0.5", "0011.2233.4455", "Vlan10"]]
+        with patch.object(base, "templatizator", return_value=rows):
+            one = act.execute_on_devices("sw1", [entry])
+            two = act.execute_on_devices("sw1", [entry, "show clock"])
+        self.assertEqual(one["success"]["sw1"], rows)
+        self.assertEqual(two["success"]["sw1"], [rows, "out of show clock"])
+
+class TestReachabilityCache(unittest.TestCase):
+
+    def setUp(self):
+        base.reachability.forget()
+        self.addCleanup(base.reachability.forget)
+
+    def test_ping_only_once_while_fresh(self):
+        with patch.object(base, "sweep_probe", return_value=True) as ping:
+            self.assertTrue(base.is_device_available("10.0.0.1"))
+            self.assertTrue(base.is_device_available("10.0.0.1"))
+        ping.assert_called_once()
+
+    def test_down_state_expires(self):
+        base.reachability.mark("10.0.0.2", False)
+        with patch.object(base, "sweep_probe", return_value=True) as ping:
+            self.assertFalse(base.is_device_available("10.0.0.2"))
+            with patch.object(base.reachability, "down_ttl", -1):
+                self.assertTrue(base.is_device_available("10.0.0.2"))
+        ping.assert_called_once()
+
+class TestCredentialAffinity(unittest.TestCase):
+
+    def setUp(self):
+        from netmiko import NetmikoAuthenticationException
+
+        base.ac = MagicMock()
+        base.ac.add_account = [{"user": "local", "password": "local_pw"}]
+        base.credential_affinity.forget("10.0.0.1")
+        self.addCleanup(base.credential_affinity.forget, "10.0.0.1")
+        self.tried = []
+
+        def run(device, func, *args, **kwargs):
+            self.tried.append(device["username"])
+            if device["username"] != "local":
+                raise NetmikoAuthenticationException("denied")
+            return "ok"
+
+        patchers = [
+            patch.object(base, "is_device_available", return_value=True),
+            patch.object(base.session_pool, "run", side_effect=run),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+        self.device = {"device_type": "cisco_ios", "ip": "10.0.0.1",
+                       "username": "tacacs", "password": "pw"}
+
+    def test_working_account_is_tried_first_next_time(self):
+        self.assertEqual(base.send_commands(self.device, "show clock"), "ok")
+        self.assertEqual(base.send_commands(self.device, "show clock"), "ok")
+        self.assertEqual(self.tried, ["tacacs", "local", "local"])
+
+    def test_concurrent_saves_leave_whole_file(self):
+        import json
+        import os
+        import tempfile
+        import threading
+        from astarmiko.credentials import CredentialAffinity
+
+        with tempfile.TemporaryDirectory() as tmp:
+            affinity = CredentialAffinity(os.path.join(tmp, "cred.json"))
+            threads = [
+                threading.Thread(target=affinity.remember,
+                                 args=(f"10.0.0.{i}", "local"))
+                for i in range(20)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            with open(affinity.path) as f:
+                self.assertEqual(len(json.load(f)), 20)
+            self.assertEqual(os.listdir(tmp), ["cred.json"])
+
+
+class TestSharedTables(unittest.TestCase):
+
+    def test_lookups_share_whole_tables(self):
+        base.ac = MagicMock(templpath="astarmiko/TEMPLATES/")
+        base.ac.commands = {"mac_addr_tbl": {"huawei": "display mac-address"},
+                            "arp_table": {"huawei": "display arp"}}
+        act = base.Activka.__new__(base.Activka)
+        act.choose = MagicMock(return_value={"device_type": "huawei"})
+        act.share_tables()
+        table = ("0011-2233-4455 10/-/-   GE0/0/3   dynamic\n"
+                 "0011-2233-6666 10/-/-   GE0/0/24  dynamic\n"
+                 "0011-2233-7777 10/-/-   GE0/0/24  dynamic\n"
+                 "0011-2233-8888 10/-/-   GE0/0/24  dynamic\n"
+                 "0011-2233-9999 10/-/-   GE0/0/24  dynamic\n")
+        with patch.object(base, "send_commands", return_value=table) as send:
+            self.assertEqual(
+                act._getinfo("sw1", "mac_addr_tbl_by", "0011.2233.4455"),
+                ["GigabitEthernet0/0/3", True])
+            self.assertEqual(
+                act._getinfo("sw1", "mac_addr_tbl_by", "0011-2233-6666"),
+                ["GigabitEthernet0/0/24", False])
+            self.assertFalse(
+                act._getinfo("sw1", "mac_addr_tbl_by", "0011-2233-aaaa"))
+        send.assert_called_once()
+
+
+class TestSnmpTables(unittest.TestCase):
+
+    def setUp(self):
+        base.ac = MagicMock(templpath="astarmiko/TEMPLATES/")
+        base.ac.commands = {
+            "mac_addr_tbl": {"huawei": "display mac-address"},
+            "mac_addr_tbl_byport": {"huawei": "display mac-address {}"},
+            "mac_delimeters": {"huawei": ["-", 4]},
+            "snmp_tables": {"huawei": ["mac_addr_tbl"]},
+        }
+        self.act = base.Activka.__new__(base.Activka)
+        self.act.table_cache = None
+        self.act.choose = MagicMock(return_value={"device_type": "huawei",
+                                                  "ip": "10.0.0.2"})
+
+    def test_mac_lookups_by_snmp(self):
+        rows = [["00:11:22:33:44:55", "10", "GigabitEthernet0/0/3"],
+                ["00:11:22:33:66:66", "10", "GigabitEthernet0/0/24"]]
+        with patch.object(base, "snmp_read_table",
+                          side_effect=lambda *a: [list(r) for r in rows]), \
+                patch.object(base, "send_commands") as send:
+            self.assertEqual(
+                self.act._getinfo("sw1", "mac_addr_tbl_by", "0011.2233.4455"),
+                ["GigabitEthernet0/0/3", True])
+            self.assertEqual(
+                self.act._getinfo("sw1", "mac_addr_tbl_byport", "GE0/0/24"),
+                [["0011-2233-6666", "10", "GigabitEthernet0/0/24"]])
+        send.assert_not_called()
+
+    def test_other_ifnames_are_kept(self):
+        rows = [["00:11:22:33:44:55", "10", "TenGigabitEthernet1/1"],
+                ["00:11:22:33:66:66", "10", "GigabitEthernet1/1"],
+                ["00:11:22:33:77:77", "10", "Port-channel1"]]
+        with patch.object(base, "snmp_read_table",
+                          side_effect=lambda *a: [list(r) for r in rows]):
+            self.assertEqual(
+                self.act._getinfo("sw1", "mac_addr_tbl_by", "0011.2233.4455"),
+                ["TenGigabitEthernet1/1", True])
+            self.assertEqual(
+                self.act._getinfo("sw1", "mac_addr_tbl_by", "0011.2233.7777"),
+                ["Port-channel1", True])
+
+    def test_cli_when_snmp_fails(self):
+        table = "0011-2233-4455 10/-/-   GE0/0/3   dynamic\n"
+        with patch.object(base, "snmp_read_table",
+                          side_effect=base.SnmpError("timeout")), \
+                patch.object(base, "send_commands", return_value=table):
+            self.assertEqual(self.act.read_table("sw1", "mac_addr_tbl"),
+                             [["0011-2233-4455", "10", "GE0/0/3"]])
+
+
+class TestListOfAllIpIntf(unittest.TestCase):
+
+    def test_cisco_prefixes_in_one_session(self):
+        base.ac = MagicMock(templpath="astarmiko/TEMPLATES/")
+        base.ac.commands = {
+            "ip_int_br": {"cisco_ios": "sh ip int br | ex unassigned"},
+            "ip_int_prefix": {"cisco_ios": "show ip interface | include x"},
+        }
+        act = base.Activka.__new__(base.Activka)
+        act.choose = MagicMock(return_value={"device_type": "cisco_ios"})
+        brief = (
+            "Interface              IP-Address      OK? Method Status"
+            "                Protocol\n"
+            "Vlan10                 10.1.10.1       YES NVRAM  up"
+            "                    up\n"
+            "GigabitEthernet0/1     10.2.0.1        YES NVRAM  up"
+            "                    up\n"
+        )
+        prefixes = (
+            "Vlan10 is up, line protocol is up\n"
+            "  Internet address is 10.1.10.1/24\n"
+            "Vlan20 is administratively down, line protocol is down\n"
+            "GigabitEthernet0/1 is up, line protocol is up\n"
+            "  Internet address is 10.2.0.1/21\n"
+        )
+        with patch.object(base, "send_commands",
+                          return_value=[brief, prefixes]) as send:
+            todo = act.list_of_all_ip_intf("R1")
+        send.assert_called_once()
+        self.assertEqual(todo, [
+            ["Vlan10", "10.1.10.1", "24", "up", "up"],
+            ["GigabitEthernet0/1", "10.2.0.1", "21", "up", "up"],
+        ])
+
+    def test_nvi0_is_kept_without_mask(self):
+        base.ac = MagicMock()
+        base.ac.commands = {
+            "ip_int_br": {"cisco_ios": "sh ip int br | ex unassigned"},
+            "ip_int_prefix": {"cisco_ios": "show ip interface | include x"},
+        }
+        act = base.Activka.__new__(base.Activka)
+        act.choose = MagicMock(return_value={"device_type": "cisco_ios"})
+        parsed = [
+            [["Gi0/1", "10.2.0.1", "up", "up"],
+             ["NVI0", "10.2.0.1", "up", "up"]],
+            [["Gi0/1", "10.2.0.1", "21"]],
+        ]
+        with patch.object(base, "send_commands", return_value=["", ""]), \
+                patch.object(base, "templatizator", side_effect=parsed):
+            todo = act.list_of_all_ip_intf("R1")
+        self.assertEqual(todo, [["Gi0/1", "10.2.0.1", "21", "up", "up"],
+                                ["NVI0", "10.2.0.1", None, "up", "up"]])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,250 @@
+# tests/test_fh_batch.py
+import collections
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+import yaml
+from astarmiko.scripts import fh
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.object(fh, "message", {9: "not in segment {}"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.activka = MagicMock()
+
+    def test_read_addresses(self):
+        source = io.StringIO("# audit\n10.0.0.1\n\n0011.2233.4455 SEG A\n")
+        self.assertEqual(fh.read_addresses(source),
+                         [("10.0.0.1", None), ("0011.2233.4455", "SEG A")])
+
+    def run_batch(self, fmt):
+        def locate(myactivka, address, ac, **kwargs):
+            if address == "10.0.0.2":
+                raise fh.FindHostError("host 10.0.0.2 won't answer")
+            if address == "10.0.0.3":
+                raise RuntimeError("boom")
+            return ["ip address: {}".format(address), "sw1"]
+
+        out = io.StringIO()
+        items = [("10.0.0.1", None), ("10.0.0.2", None), ("10.0.0.3", None)]
+        with patch.object(fh, "locate", side_effect=locate), \
+                patch.object(fh, "sweep_ips",
+                             return_value={"10.0.0.1": True}) as sweep:
+            counts = fh.batch_routine(self.activka, MagicMock(), items, out,
+                                      workers=2, fmt=fmt)
+        sweep.assert_called_once()
+        self.activka.share_tables.assert_called_once()
+        self.assertEqual(counts, {"ok": 1, "not_found": 1, "error": 1})
+        return out.getvalue()
+
+    def test_ndjson_records_per_address(self):
+        records = [json.loads(line) for line in
+                   self.run_batch("ndjson").splitlines()]
+        self.assertEqual([r["status"] for r in records],
+                         ["ok", "not_found", "error"])
+        self.assertEqual(records[0]["result"], ["ip address: 10.0.0.1", "sw1"])
+        self.assertIn("won't answer", records[1]["error"])
+
+    def test_csv(self):
+        lines = self.run_batch("csv").splitlines()
+        self.assertEqual(lines[0], "address,status,result,error")
+        self.assertEqual(lines[1], "10.0.0.1,ok,ip address: 10.0.0.1 | sw1,")
+
+    def test_mac_not_found_in_segment(self):
+        self.activka.index.order = {"r1": 0, "sw1": 1}
+        self.activka.select.side_effect = lambda segment=None, levels=None: (
+            {"r1", "sw1"} if segment else
+            {"r1"} if "R" in levels else {"sw1"})
+        self.activka.choose.return_value = {"device_type": "cisco_ios"}
+        self.activka.getinfo.return_value = []
+        out = io.StringIO()
+        with patch.object(fh, "message",
+                          collections.defaultdict(str, {
+                              9: "not in {}", 19: "{} not found"})), \
+                patch.object(fh, "conf_section", return_value={}), \
+                patch.object(fh, "check_firewall", return_value=False), \
+                patch("astarmiko.base.ac", MagicMock(commands={
+                    "mac_delimeters": {"cisco_ios": [".", 4]}})):
+            counts = fh.batch_routine(self.activka, MagicMock(),
+                                      [("0011.2233.4455", "SEG A")], out,
+                                      fmt="ndjson")
+        self.assertEqual(counts, {"ok": 0, "not_found": 1, "error": 0})
+        self.assertEqual(json.loads(out.getvalue())["error"], "not in SEG A")
+
+
+class TestFirstHit(unittest.TestCase):
+
+    def test_first_hit_cancels_the_rest(self):
+        import threading
+
+        started, finished = [], []
+        lock = threading.Lock()
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def probe(device):
+            with lock:
+                started.append(device)
+            if device == "sw2":
+                return ["Gi0/1", True]
+            release.wait(5)
+            with lock:
+                finished.append(device)
+            return False
+
+        hit = fh.first_hit(["sw1", "sw2", "sw3", "sw4", "sw5"], probe, fanout=2)
+        self.assertEqual(hit, ("sw2", ["Gi0/1", True]))
+        # the answer doesn't wait for slow probes
+        with lock:
+            self.assertEqual(finished, [])
+        release.set()
+        # both threads were busy with sw1 and sw3, the queued probes
+        # are cancelled
+        with lock:
+            self.assertNotIn("sw4", started)
+            self.assertNotIn("sw5", started)
+
+    def test_all_miss_and_errors(self):
+        def probe(device):
+            if device == "r1":
+                raise OSError("timeout")
+            return []
+
+        self.assertIsNone(fh.first_hit(["r1", "r2"], probe))
+        self.assertIsNone(fh.first_hit([], probe))
+
+
+class TestFindByMac(unittest.TestCase):
+
+    def test_host_behind_firewall(self):
+        activka = MagicMock()
+        activka.select.return_value = {"r1", "r2"}
+        activka.getinfo.return_value = []
+
+        def check_firewall(myactivka, ip, routerstart):
+            return ["00:11:22:33:44:55", "10.9.9.9"] if routerstart == "r2" \
+                else False
+
+        with patch.object(fh, "message", collections.defaultdict(str)), \
+                patch.object(fh, "conf_section", return_value={}), \
+                patch.object(fh, "check_firewall",
+                             side_effect=check_firewall), \
+                patch.object(fh, "nslookup", return_value="host"), \
+                patch.object(fh, "findchain",
+                             return_value=(["behind fw"], True)) as chain:
+            result = fh.findbymac(activka, "0011.2233.4455", ["r1", "r2"],
+                                  MagicMock())
+        self.assertEqual(result, ["behind fw"])
+        self.assertEqual(chain.call_args.args[1],
+                         ["0011.2233.4455", "00:11:22:33:44:55", "FIREWALL",
+                          "r2", "10.9.9.9"])
+
+    def test_next_router_when_chain_leads_nowhere(self):
+        import threading
+
+        activka = MagicMock()
+        activka.select.return_value = {"r1", "r2"}
+        chained = threading.Event()
+
+        def getinfo(rt, func, mac):
+            if rt == "r2":
+                # r2 answers after the chain from r1 was followed
+                chained.wait(5)
+            return [["10.1.1.5", "0011.2233.4455", "Gi0/1"]]
+
+        def findchain(myactivka, m, hostname):
+            chained.set()
+            return ["from r1", ""] if m[3] == "r1" else ["from r2", "sw2"]
+
+        activka.getinfo.side_effect = getinfo
+        with patch.object(fh, "message", collections.defaultdict(str)), \
+                patch.object(fh, "conf_section", return_value={}), \
+                patch.object(fh, "nslookup", return_value="host"), \
+                patch.object(fh, "findchain", side_effect=findchain):
+            result = fh.findbymac(activka, "0011.2233.4455", ["r1", "r2"],
+                                  MagicMock())
+        self.assertEqual(result, "from r2")
+
+    def test_firewall_checked_once_after_all_routers_miss(self):
+        activka = MagicMock()
+        activka.select.side_effect = lambda levels: (
+            {"r1", "r2", "r3"} if "R" in levels else set())
+        activka.getinfo.return_value = []
+        messages = collections.defaultdict(str, {27: "behind fw {}",
+                                                 28: "fw silent"})
+        with patch.object(fh, "message", messages), \
+                patch.object(fh, "conf_section", return_value={}), \
+                patch.object(fh, "check_firewall",
+                             return_value=False) as fw, \
+                patch.object(fh, "say") as say:
+            self.assertFalse(fh.findbymac(activka, "0011.2233.4455",
+                                          ["r1", "r2", "r3"], MagicMock()))
+        said = [c.args[0] for c in say.call_args_list]
+        self.assertEqual(said.count("behind fw 0011.2233.4455"), 1)
+        self.assertEqual(said.count("fw silent"), 1)
+        self.assertEqual(fw.call_count, 3)
+        self.assertEqual({c.args[1] for c in activka.getinfo.call_args_list},
+                         {"arp_by"})
+
+class TestWakeUpDevice(unittest.TestCase):
+
+    def test_sends_all_echoes(self):
+        with patch.object(fh, "icmp_available", return_value=True), \
+                patch.object(fh, "sweep_probe",
+                             side_effect=[True, False, True]) as probe:
+            self.assertTrue(fh.wake_up_device("10.0.0.1", count=3))
+        self.assertEqual(probe.call_count, 3)
+
+
+class TestSubnetIndex(unittest.TestCase):
+
+    def test_newer_networks_byip_wins(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        ac = MagicMock(localpath=tmp.name + "/")
+        built = os.path.join(tmp.name, "subnets.json")
+        seed = os.path.join(tmp.name, "networks_byip.yaml")
+        fh.SubnetIndex.from_mapping({"10.1.1.0/24": "r_built"}).save(built)
+        with open(seed, "w") as f:
+            yaml.safe_dump({"10.1.1.0/24": "r_seed"}, f)
+        patchers = [patch.object(fh, "conf_section", return_value={}),
+                    patch.object(fh.snapshots, "enabled", False),
+                    patch.object(fh, "_subnets", None)]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+
+        os.utime(seed, (1000, 1000))
+        self.assertEqual(fh.subnet_index(ac).gateway("10.1.1.5"), "r_built")
+        fh._subnets = None
+        os.utime(built, (500, 500))
+        with self.assertLogs(fh.logger, "WARNING"):
+            index = fh.subnet_index(ac)
+        self.assertEqual(index.gateway("10.1.1.5"), "r_seed")
+
+
+class TestLoadMessages(unittest.TestCase):
+
+    def test_old_copy_is_completed_from_package(self):
+        packaged = os.path.join(os.path.dirname(fh.__file__), os.pardir,
+                                "YAML", "messages_en.yaml")
+        with open(packaged, encoding="utf8") as f:
+            default = yaml.safe_load(f)
+        with tempfile.TemporaryDirectory() as tmp:
+            old = os.path.join(tmp, "messages_en.yaml")
+            with open(old, "w", encoding="utf8") as f:
+                yaml.safe_dump(["my prompt"] + default[1:29], f)
+            with patch.object(fh.snapshots, "enabled", False):
+                message = fh.load_messages(old)
+        self.assertEqual(message[0], "my prompt")
+        self.assertEqual(message[29:], default[29:])
+
+
+if __name__ == '__main__':
+    unittest.main()
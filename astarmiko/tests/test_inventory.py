@@ -0,0 +1,39 @@
+# tests/test_inventory.py
+import unittest
+from astarmiko.inventory import InventoryIndex, InventoryView
+
+SEGMENT = {"r1": "SEG A", "r2": "SEG B", "sw1": "SEG A", "sw2": "SEG A"}
+LEVELS = {"r1": "R", "r2": "R", "sw1": "L3", "sw2": "L2"}
+DEV_TYPE = {"r1": "cisco_ios", "r2": "huawei", "sw1": "huawei",
+            "sw2": "cisco_ios"}
+
+
+class TestInventoryIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = InventoryIndex(SEGMENT, LEVELS, DEV_TYPE)
+
+    def test_select_intersects_criteria(self):
+        self.assertEqual(self.index.select(segment="SEG A", levels=["R", "L3"]),
+                         {"r1", "sw1"})
+        self.assertEqual(self.index.select(device_type="huawei",
+                                           segment="SEG A"), {"sw1"})
+
+    def test_select_without_criteria_returns_all(self):
+        self.assertEqual(self.index.select(), set(DEV_TYPE))
+
+    def test_unknown_value_gives_empty_set(self):
+        self.assertEqual(self.index.select(segment="SEG X", levels="R"), set())
+
+    def test_view_is_lazy_and_ordered(self):
+        source = {name: {"ip": i} for i, name in enumerate(DEV_TYPE)}
+        view = InventoryView(source, {"sw2", "r1"}, self.index.order)
+        self.assertEqual(list(view), ["r1", "sw2"])
+        self.assertIs(view["r1"], source["r1"])
+        self.assertNotIn("r2", view)
+        with self.assertRaises(KeyError):
+            view["r2"]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# tests/test_locator.py
+import os
+import tempfile
+import unittest
+from astarmiko.locator import LocationIndex, choose_edges, mac_key, write_index
+
+ARP = [
+    ("r1", "10.0.0.5", "0011.2233.4455", "Vlan10"),
+    ("r1", "10.0.0.9", "0011.2233.aaaa", "Vlan10"),
+    ("l3", "10.0.0.5", "0011-2233-ffff", "Vlanif10"),
+]
+MAC = [
+    # uplink of core sees both hosts, access switches see one each
+    ("l3", "0011-2233-4455", "10", "GigabitEthernet0/0/1"),
+    ("l3", "0011-2233-aaaa", "10", "GigabitEthernet0/0/1"),
+    ("sw1", "0011.2233.4455", "10", "Gi0/5"),
+    ("sw1", "805e.0000.0001", "20", "Gi0/5"),
+    ("sw2", "0011.2233.aaaa", "10", "Gi0/7"),
+]
+LEVELS = {"r1": "R", "l3": "L3", "sw1": "L2", "sw2": "L2"}
+
+
+class TestLocationIndex(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "locator.idx")
+        self.counts = write_index(self.path, ARP, MAC, LEVELS, ["805e"])
+        self.index = LocationIndex(self.path)
+        self.addCleanup(self.index.close)
+
+    def test_counts(self):
+        self.assertEqual(self.counts, (2, 3))
+
+    def test_ip_resolved_to_edge_port(self):
+        found = self.index.locate("10.0.0.5")
+        self.assertEqual(found["mac"], "00:11:22:33:44:55")
+        self.assertEqual(found["router"], "r1")
+        self.assertEqual((found["switch"], found["port"], found["vlan"]),
+                         ("sw1", "Gi0/5", 10))
+        # phone behind the same port is not counted
+        self.assertEqual(found["macs_on_port"], 1)
+
+    def test_mac_in_any_notation(self):
+        self.assertEqual(self.index.locate("00:11:22:33:aa:aa")["switch"],
+                         "sw2")
+        self.assertIsNone(self.index.locate("10.0.0.77"))
+        self.assertIsNone(self.index.locate("dead.beef.0000"))
+
+    def test_equal_count_prefers_l2(self):
+        edges = choose_edges([("l3", "0011.2233.4455", "1", "Gi1"),
+                              ("sw1", "0011.2233.4455", "1", "Gi2")], LEVELS)
+        self.assertEqual(edges[mac_key("001122334455")][1], "sw1")
+
+
+if __name__ == '__main__':
+    unittest.main()
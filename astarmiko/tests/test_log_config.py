@@ -0,0 +1,104 @@
+# tests/test_log_config.py
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from astarmiko import log_config, optional_loggers
+
+
+class TestQueueLogging(unittest.TestCase):
+
+    def setUp(self):
+        root = logging.getLogger()
+        self.addCleanup(root.setLevel, root.level)
+        self.addCleanup(log_config.shutdown_logging)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "astarmiko.log")
+
+    def test_records_are_written_by_listener_thread(self):
+        threads = []
+        format = log_config.JsonLogFormatter.format
+
+        def spy(formatter, record):
+            threads.append(threading.current_thread())
+            return format(formatter, record)
+
+        with patch.object(log_config.JsonLogFormatter, "format", spy):
+            log_config.setup_logging({"stdout": False, "file": self.path})
+            log = logging.getLogger("astarmiko.test")
+            log.info("device %s done", "sw1")
+            log.debug("not created")
+            log_config.shutdown_logging()
+        with open(self.path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([(l["level"], l["message"]) for l in lines],
+                         [("INFO", "device sw1 done")])
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_setup_again_replaces_pipeline(self):
+        log_config.setup_logging({"stdout": False, "file": self.path})
+        log_config.setup_logging({"stdout": False, "file": self.path,
+                                  "format": "text"})
+        logging.getLogger("astarmiko.test").warning("once")
+        log_config.shutdown_logging()
+        with open(self.path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].endswith("WARNING: once"))
+
+    def test_console_is_stderr_not_stdout(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with patch("sys.stdout", stdout), patch("sys.stderr", stderr):
+            log_config.setup_logging({"stdout": True})
+            logging.getLogger("astarmiko.test").info("device sw1 done")
+            log_config.shutdown_logging()
+        self.assertEqual(stdout.getvalue(), "")
+        self.assertEqual(json.loads(stderr.getvalue())["message"],
+                         "device sw1 done")
+
+    def test_shipper_handler_skips_forwarded_entries(self):
+        handler = log_config.ShipperHandler(loki=True)
+        record = logging.LogRecord("x", logging.INFO, "", 0, "msg", None,
+                                   None)
+        with patch.object(optional_loggers, "shipper") as shipper:
+            handler.handle(record)
+            record.forwarded = {"rsyslog", "loki"}
+            handler.handle(record)
+        shipper.submit.assert_called_once_with(
+            {"device": "x", "level": "INFO", "message": "msg"},
+            loki=True, elastic=False,
+        )
+
+    def test_pipeline_has_own_syslog_handler(self):
+        address = "127.0.0.1:5514"
+        shared = optional_loggers.syslog_handler(address)
+        log_config.setup_logging({"stdout": False, "rsyslog": True,
+                                  "rsyslog_addr": address})
+        syslog, = log_config._listener.handlers
+        self.assertIsNot(syslog, shared)
+        self.assertIsNone(shared.formatter)
+        record = logging.LogRecord("x", logging.INFO, "", 0, "msg", None,
+                                   None)
+        self.assertTrue(syslog.filter(record))
+        record.forwarded = {"loki"}
+        self.assertTrue(syslog.filter(record))
+        record.forwarded = {"rsyslog"}
+        self.assertFalse(syslog.filter(record))
+
+
+class TestSyslogHandler(unittest.TestCase):
+
+    def test_one_handler_per_address(self):
+        first = optional_loggers.syslog_handler("127.0.0.1:5514")
+        self.assertIs(optional_loggers.syslog_handler("127.0.0.1:5514"),
+                      first)
+        self.assertEqual(first.address, ("127.0.0.1", 5514))
+
+
+if __name__ == "__main__":
+    unittest.main()
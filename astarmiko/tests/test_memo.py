@@ -0,0 +1,137 @@
+# tests/test_memo.py
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from astarmiko import base
+from astarmiko.memo import ResultCache
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResultCache(enabled=True, volatile_ttl=60, stable_ttl=60)
+
+    def test_disabled_always_fetches(self):
+        cache = ResultCache()
+        fetch = MagicMock(return_value=[["x"]])
+        cache.call("sw1", "neighbor", (), fetch)
+        cache.call("sw1", "neighbor", (), fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_hit_returns_private_copy(self):
+        fetch = MagicMock(return_value=[["10.0.0.1", "mac"]])
+        first = self.cache.call("r1", "arp_by", ("10.0.0.1",), fetch)
+        first[0].append("r1")
+        second = self.cache.call("r1", "arp_by", ("10.0.0.1",), fetch)
+        self.assertEqual(second, [["10.0.0.1", "mac"]])
+        fetch.assert_called_once()
+        self.assertEqual(self.cache.stats, {"hits": 1, "misses": 1})
+
+    def test_failures_and_invalidated_are_fetched_again(self):
+        fetch = MagicMock(side_effect=[False, ["a"], ["b"]])
+        self.assertFalse(self.cache.call("sw1", "neighbor", (), fetch))
+        self.assertEqual(self.cache.call("sw1", "neighbor", (), fetch), ["a"])
+        self.cache.invalidate("sw1")
+        self.assertEqual(self.cache.call("sw1", "neighbor", (), fetch), ["b"])
+
+    def test_volatile_class_expires(self):
+        self.cache.configure(volatile_ttl=-1)
+        fetch = MagicMock(return_value=["x"])
+        self.cache.call("sw1", "mac_addr_tbl_by", (), fetch)
+        self.cache.call("sw1", "mac_addr_tbl_by", (), fetch)
+        self.cache.call("sw1", "neighbor", (), fetch)
+        self.cache.call("sw1", "neighbor", (), fetch)
+        self.assertEqual(fetch.call_count, 3)
+
+    def test_concurrent_calls_query_once(self):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.05)
+            return ["x"]
+
+        threads = [threading.Thread(target=self.cache.call,
+                                    args=("sw1", "neighbor", (), fetch))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+
+    def test_getinfo_is_memoized(self):
+        with patch.object(base, "getinfo_cache", self.cache):
+            act = base.Activka.__new__(base.Activka)
+            act._getinfo = MagicMock(return_value=[["sw2", "Gi0/1", "Gi0/2"]])
+            act.getinfo("SW1", "neighbor", "pusto")
+            act.getinfo("sw1", "neighbor", "pusto")
+        act._getinfo.assert_called_once_with("sw1", "neighbor", "pusto",
+                                             othercmd=False, txtFSMtmpl=False)
+
+
+
+class TestConfigInvalidates(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResultCache(enabled=True, volatile_ttl=60, stable_ttl=60)
+        self.fetch = MagicMock(return_value=[["sw2", "Gi0/1", "Gi0/2"]])
+        for device in ("sw1", "sw2"):
+            self.cache.call(device, "neighbor", (), self.fetch)
+
+    def cached(self, device):
+        calls = self.fetch.call_count
+        self.cache.call(device, "neighbor", (), self.fetch)
+        return self.fetch.call_count == calls
+
+    def test_setconfig_on_devices(self):
+        act = base.Activka.__new__(base.Activka)
+        act.choose = lambda name, withoutname=True: {"ip": name}
+        act._is_device_available = lambda device: True
+
+        def send_commands(device, commands, mode="exec"):
+            if device["ip"] == "sw2":
+                raise OSError("Socket is closed")
+            return "ok"
+
+        with patch.object(base, "getinfo_cache", self.cache), \
+                patch.object(base, "send_commands", send_commands):
+            result = act.setconfig_on_devices(["SW1", "sw2"], ["vlan 10"])
+        self.assertEqual(result["failed"], {"sw2": "Socket is closed"})
+        self.assertFalse(self.cached("sw1"))
+        self.assertFalse(self.cached("sw2"))
+
+    def test_async_setconfig_on_devices(self):
+        import asyncio
+        from unittest.mock import AsyncMock
+        from astarmiko import async_exec
+
+        act = async_exec.ActivkaAsync.__new__(async_exec.ActivkaAsync)
+        act.concurrency, act.segment, act.dev_type = {}, {}, {}
+        act.executor = async_exec.BlockingExecutor(pool_size=1)
+        self.addCleanup(act.executor.shutdown)
+        act.sweep_devices = AsyncMock(return_value={})
+        act.choose = lambda name, withoutname=True: {
+            "ip": name, "device_type": "cisco_ios"}
+
+        async def send(device, commands, mode="exec"):
+            if device["ip"] == "sw2":
+                raise OSError("Socket is closed")
+            return "ok"
+
+        act._send = send
+        with patch.object(async_exec, "getinfo_cache", self.cache), \
+                patch.object(async_exec, "is_device_available",
+                             AsyncMock(return_value=True)), \
+                patch("tqdm.asyncio.tqdm_asyncio.gather",
+                      lambda *aws, desc=None: asyncio.gather(*aws)):
+            result = asyncio.run(act.setconfig_on_devices(["SW1", "sw2"],
+                                                          ["vlan 10"]))
+        self.assertEqual(result["failed"], {"sw2": "Socket is closed"})
+        self.assertFalse(self.cached("sw1"))
+        self.assertFalse(self.cached("sw2"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# tests/test_optional_loggers.py
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+from astarmiko.optional_loggers import LogShipper, forward_log_entry
+
+
+def entry(device, level="INFO", message="done"):
+    return {"device": device, "level": level, "message": message}
+
+
+class TestLogShipper(unittest.TestCase):
+
+    def setUp(self):
+        self.shipper = LogShipper(loki_url="http://loki/push",
+                                  elastic_url="http://es:9200/",
+                                  elastic_index="net", flush_interval=0.2)
+        self.session = MagicMock()
+        self.shipper._session = self.session
+        self.addCleanup(self.shipper.close)
+
+    def test_batch_is_one_request_per_backend(self):
+        for device in ("sw1", "sw2", "sw1"):
+            self.shipper.submit(entry(device), loki=True, elastic=True)
+        self.shipper.submit(entry("sw1", "ERROR", "fail"), loki=True)
+        self.shipper.flush()
+
+        urls = [c.args[0] for c in self.session.post.call_args_list]
+        self.assertEqual(sorted(urls), ["http://es:9200/_bulk",
+                                        "http://loki/push"])
+        loki = next(c.kwargs["json"] for c in self.session.post.call_args_list
+                    if c.args[0] == "http://loki/push")
+        streams = {(s["stream"]["device"], s["stream"]["level"]):
+                   len(s["values"]) for s in loki["streams"]}
+        self.assertEqual(streams, {("sw1", "INFO"): 2, ("sw2", "INFO"): 1,
+                                   ("sw1", "ERROR"): 1})
+        bulk = next(c.kwargs["data"] for c in self.session.post.call_args_list
+                    if c.args[0].endswith("_bulk")).decode().splitlines()
+        self.assertEqual(len(bulk), 6)
+        self.assertEqual(json.loads(bulk[0]), {"index": {"_index": "net"}})
+        self.assertEqual(json.loads(bulk[1])["device"], "sw1")
+        # ISO 8601 string, so that Elasticsearch maps it as date
+        self.assertRegex(json.loads(bulk[1])["@timestamp"],
+                         r"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}\+00:00$")
+        self.assertEqual(self.shipper.stats["sent"], 7)
+        self.assertEqual(self.shipper.stats["requests"], 2)
+
+    def test_full_queue_drops_instead_of_waiting(self):
+        shipper = LogShipper(queue_size=2)
+        with patch.object(shipper, "_start"):
+            results = [shipper.submit(entry("sw1"), loki=True)
+                       for _ in range(4)]
+        self.assertEqual(results, [True, True, False, False])
+        self.assertEqual(shipper.stats["dropped"], 2)
+
+    def test_failed_requests_are_counted(self):
+        self.session.post.side_effect = OSError("connection refused")
+        self.shipper.submit(entry("sw1"), loki=True)
+        self.shipper.flush()
+        self.assertEqual(self.shipper.stats["failed"], 1)
+        self.assertEqual(self.shipper.stats["sent"], 0)
+
+    def test_close_sends_what_is_queued(self):
+        self.shipper.configure(flush_interval=10)
+        self.shipper.submit(entry("sw1"), elastic=True)
+        self.shipper.close()
+        self.session.post.assert_called_once()
+
+    def test_no_restart_after_close(self):
+        self.shipper.submit(entry("sw1"), loki=True)
+        thread = self.shipper._thread
+        self.shipper.close()
+        with patch("atexit.register") as register:
+            self.assertFalse(self.shipper.submit(entry("sw1"), loki=True))
+        register.assert_not_called()
+        self.assertIs(self.shipper._thread, thread)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(self.shipper.stats["dropped"], 1)
+
+
+class TestForwardLogEntry(unittest.TestCase):
+
+    def test_remote_backends_are_not_called_by_caller(self):
+        with patch("astarmiko.optional_loggers.shipper") as shipper:
+            forward_log_entry(entry("sw1"), loki=True, elastic=True)
+        shipper.submit.assert_called_once_with(entry("sw1"), loki=True,
+                                               elastic=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+# tests/test_scheduler.py
+import asyncio
+import unittest
+from astarmiko.scheduler import ConcurrencyLimiter
+
+
+async def run_devices(limiter, devices):
+    """Run fake device workers, return peak number of workers
+       per segment, per device_type and in total
+    """
+    current = {}
+    peak = {}
+
+    async def worker(segment, device_type):
+        async with limiter.slot(segment, device_type):
+            for key in ("all", segment, device_type):
+                current[key] = current.get(key, 0) + 1
+                peak[key] = max(peak.get(key, 0), current[key])
+            await asyncio.sleep(0.01)
+            for key in ("all", segment, device_type):
+                current[key] -= 1
+
+    await asyncio.gather(*(worker(s, t) for s, t in devices))
+    return peak
+
+
+class TestConcurrencyLimiter(unittest.TestCase):
+
+    def test_all_limits_are_respected(self):
+        devices = ([("SEG A", "cisco_ios")] * 10 + [("SEG B", "huawei")] * 10
+                   + [("SEG C", "cisco_ios")] * 10)
+
+        async def scenario():
+            limiter = ConcurrencyLimiter.from_config({
+                "global": 5, "per_segment": 3, "device_type": {"huawei": 1},
+            })
+            return await run_devices(limiter, devices)
+
+        peak = asyncio.run(scenario())
+        self.assertLessEqual(peak["all"], 5)
+        self.assertLessEqual(peak["SEG A"], 3)
+        self.assertEqual(peak["huawei"], 1)
+
+    def test_segment_override(self):
+        async def scenario():
+            limiter = ConcurrencyLimiter(segment={"seg a": 2})
+            return await run_devices(limiter, [("SEG A", "eltex")] * 6)
+
+        self.assertEqual(asyncio.run(scenario())["SEG A"], 2)
+
+    def test_unlimited_by_default(self):
+        async def scenario():
+            return await run_devices(ConcurrencyLimiter(),
+                                     [("SEG A", "eltex")] * 6)
+
+        self.assertEqual(asyncio.run(scenario())["all"], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# tests/test_session_pool.py
+import unittest
+from unittest.mock import patch, MagicMock
+from astarmiko.session_pool import SessionPool
+
+DEVICE = {
+    "device_type": "cisco_ios",
+    "ip": "10.0.0.1",
+    "username": "user",
+    "password": "secret",
+}
+
+
+class TestSessionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = SessionPool(idle_timeout=60, max_age=600)
+        self.opened = []
+
+        def fake_open(device):
+            conn = MagicMock()
+            conn.is_alive.return_value = True
+            self.opened.append(conn)
+            return conn
+
+        patcher = patch.object(self.pool, "_open", side_effect=fake_open)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_second_command_reuses_session(self):
+        self.pool.run(DEVICE, lambda ssh: ssh.send_command("show clock"))
+        self.pool.run(DEVICE, lambda ssh: ssh.send_command("show ver"))
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(self.pool.stats["reused"], 1)
+
+    def test_other_credential_is_other_session(self):
+        self.pool.run(DEVICE, lambda ssh: None)
+        other = dict(DEVICE, username="local")
+        self.pool.run(other, lambda ssh: None)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_dead_session_is_replaced(self):
+        self.pool.run(DEVICE, lambda ssh: None)
+        self.opened[0].is_alive.return_value = False
+        self.pool.run(DEVICE, lambda ssh: None)
+        self.assertEqual(len(self.opened), 2)
+        self.opened[0].disconnect.assert_called_once()
+
+    def test_broken_reused_session_reconnects(self):
+        self.pool.run(DEVICE, lambda ssh: None)
+
+        def command(ssh):
+            if ssh is self.opened[0]:
+                raise OSError("Socket is closed")
+            return "ok"
+
+        self.assertEqual(self.pool.run(DEVICE, command, retry=True), "ok")
+        self.assertEqual(len(self.opened), 2)
+
+    def test_broken_session_is_not_retried_without_retry(self):
+        self.pool.run(DEVICE, lambda ssh: None)
+        calls = []
+
+        def config(ssh):
+            calls.append(ssh)
+            raise OSError("Socket is closed")
+
+        with self.assertRaises(OSError):
+            self.pool.run(DEVICE, config)
+        self.assertEqual(calls, [self.opened[0]])
+        self.assertEqual(len(self.opened), 1)
+
+    def test_expired_session_is_not_reused(self):
+        self.pool.run(DEVICE, lambda ssh: None)
+        self.pool.idle_timeout = -1
+        self.pool.run(DEVICE, lambda ssh: None)
+        self.assertEqual(len(self.opened), 2)
+
+    def test_disabled_pool_closes_session(self):
+        self.pool.configure(enabled=False)
+        self.pool.run(DEVICE, lambda ssh: None)
+        self.assertEqual(self.pool.idle_count(), 0)
+        self.opened[0].disconnect.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# tests/test_snapshot.py
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from astarmiko import base
+from astarmiko.snapshot import SnapshotStore, atomic_write
+
+INVENTORY = """LEVEL:
+  Router1: R
+  Switch1: L2
+SEGMENT:
+  Router1: SEG A
+  Switch1: SEG A
+Router1:
+  device_type: cisco_ios
+  ip: 10.0.0.1
+Switch1:
+  device_type: huawei
+  ip: 10.0.0.2
+"""
+
+
+class TestSnapshotStore(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.store = SnapshotStore(directory=os.path.join(self.dir, "cache"))
+        self.source = os.path.join(self.dir, "data.yaml")
+        with open(self.source, "w") as f:
+            f.write("a: 1\n")
+        self.calls = 0
+
+    def build(self, path):
+        self.calls += 1
+        with open(path) as f:
+            return f.read()
+
+    def test_reused_while_unchanged(self):
+        self.assertEqual(self.store.load(self.source, self.build), "a: 1\n")
+        self.assertEqual(self.store.load(self.source, self.build), "a: 1\n")
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.store.stats, {"hits": 1, "rebuilt": 1})
+
+    def test_touch_keeps_snapshot_by_hash(self):
+        self.store.load(self.source, self.build)
+        stat = os.stat(self.source)
+        os.utime(self.source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.store.load(self.source, self.build)
+        self.assertEqual(self.calls, 1)
+
+    def test_rebuilt_on_change(self):
+        self.store.load(self.source, self.build)
+        with open(self.source, "w") as f:
+            f.write("a: 22\n")
+        self.assertEqual(self.store.load(self.source, self.build), "a: 22\n")
+        self.assertEqual(self.calls, 2)
+
+    def test_activka_from_snapshot_has_no_credentials_stored(self):
+        os.makedirs(os.path.join(self.dir, "YAML"))
+        with open(os.path.join(self.dir, "YAML", "byname.yaml"), "w") as f:
+            f.write(INVENTORY)
+        base.ac = MagicMock(localpath=self.dir + "/", user="u", password="p")
+        saved = base.snapshots
+        base.snapshots = self.store
+        self.addCleanup(setattr, base, "snapshots", saved)
+        first = base.Activka("byname.yaml")
+        second = base.Activka("byname.yaml")
+        self.assertEqual(self.store.stats["hits"], 1)
+        self.assertEqual(second.by_ip, {"10.0.0.1": "router1",
+                                        "10.0.0.2": "switch1"})
+        self.assertEqual(second.choose("router1", withoutname=True)["password"], "p")
+        self.assertEqual(first.index.select(levels="L2"), {"switch1"})
+        cached = self.store.load(os.path.join(self.dir, "YAML", "byname.yaml"),
+                                 None, kind="inventory")
+        self.assertNotIn("password", cached["wholedict"]["router1"])
+
+
+
+class TestAtomicWrite(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.path = os.path.join(self.dir, "subnets.json")
+
+    def test_concurrent_writers_leave_whole_file(self):
+        import threading
+
+        payloads = [str(i) * 200000 for i in range(8)]
+        threads = [threading.Thread(target=atomic_write,
+                                    args=(self.path, data))
+                   for data in payloads]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with open(self.path) as f:
+            self.assertIn(f.read(), payloads)
+        self.assertEqual(os.listdir(self.dir), ["subnets.json"])
+
+    def test_failed_write_keeps_old_file(self):
+        atomic_write(self.path, b"old")
+        with self.assertRaises(TypeError):
+            atomic_write(self.path, None)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"old")
+        self.assertEqual(os.listdir(self.dir), ["subnets.json"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,254 @@
+# tests/test_snmp.py
+import asyncio
+import unittest
+from unittest.mock import patch
+from astarmiko import base, snmp
+from astarmiko.snmp import SnmpClient, SnmpError
+
+
+class FakeValue:
+
+    def __init__(self, text):
+        self.text = text
+
+    def prettyPrint(self):
+        return self.text
+
+
+class NoSuchInstance(FakeValue):
+    pass
+
+
+class FakeVarBind(tuple):
+
+    def prettyPrint(self):
+        return f"{self[0]} = {self[1].prettyPrint()}"
+
+
+def answer(objects, values=None):
+    """varBinds of get_cmd, objects are plain OIDs (see plain_objects)"""
+    binds = []
+    for oid in objects:
+        value = (values or {}).get(oid, FakeValue(f"v{oid}"))
+        binds.append(FakeVarBind((oid, value)))
+    return None, 0, 0, tuple(binds)
+
+
+def plain_objects(client):
+    """Pass OIDs to the faked _send as they are"""
+    return patch.object(client, "_objects",
+                        side_effect=lambda state, oids: list(oids))
+
+
+class TestSnmpClient(unittest.TestCase):
+
+    def setUp(self):
+        self.client = SnmpClient(max_varbinds=2, concurrency=2)
+        self.sent = []
+
+        async def send(engine, auth, target, objects):
+            self.sent.append((engine, target, len(objects)))
+            await asyncio.sleep(0)
+            return answer(objects, {"1.3.6.1.9": NoSuchInstance("none")})
+
+        patcher = patch.object(self.client, "_send", side_effect=send)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = plain_objects(self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.client.close)
+
+    def test_get_splits_oids_into_pdus(self):
+        oids = ["1.3.6.1.1", "1.3.6.1.2", "1.3.6.1.3", "1.3.6.1.9"]
+        result = asyncio.run(self.client.get("127.0.0.1", oids))
+        self.assertEqual(result, {"1.3.6.1.1": "v1.3.6.1.1",
+                                  "1.3.6.1.2": "v1.3.6.1.2",
+                                  "1.3.6.1.3": "v1.3.6.1.3",
+                                  "1.3.6.1.9": None})
+        self.assertEqual([n for _, _, n in self.sent], [2, 2])
+
+    def test_engine_and_target_are_reused_in_one_loop(self):
+        async def run():
+            return await self.client.get_many(
+                ["127.0.0.1", "127.0.0.2", "127.0.0.1"], ["1.3.6.1.1"]
+            )
+
+        result = asyncio.run(run())
+        self.assertEqual(set(result), {"127.0.0.1", "127.0.0.2"})
+        self.assertEqual(len({id(e) for e, _, _ in self.sent}), 1)
+        self.assertEqual(len({id(t) for _, t, _ in self.sent}), 2)
+
+    def test_errors_of_one_host_dont_stop_others(self):
+        async def send(engine, auth, target, objects):
+            if target.transport_address[0] == "127.0.0.2":
+                return "No SNMP response received before timeout", 0, 0, ()
+            return answer(objects)
+
+        with patch.object(self.client, "_send", side_effect=send):
+            result = asyncio.run(self.client.get_many(
+                ["127.0.0.1", "127.0.0.2"], ["1.3.6.1.1"]))
+        self.assertEqual(result["127.0.0.1"], {"1.3.6.1.1": "v1.3.6.1.1"})
+        self.assertIsInstance(result["127.0.0.2"], SnmpError)
+
+    def test_engine_is_closed_with_its_loop(self):
+        async def run():
+            await self.client.get("127.0.0.1", ["1.3.6.1.1"])
+            return self.client._state()
+
+        states = [asyncio.run(run()) for _ in range(3)]
+        self.assertEqual(len(set(map(id, states))), 3)
+        self.assertTrue(all(state.engine is None for state in states))
+        self.assertEqual(len(self.client._loops), 0)
+
+
+class FakeAgent:
+    """GETBULK over a sorted table {oid: value}"""
+
+    def __init__(self, rows):
+        from pysnmp.proto.rfc1902 import Integer, ObjectName, OctetString
+
+        self.rows = sorted(
+            (ObjectName(k),
+             Integer(v) if isinstance(v, int) else OctetString(v))
+            for k, v in rows.items()
+        )
+        self.pdus = 0
+
+    async def send_bulk(self, engine, auth, target, oid, repetitions,
+                        version):
+        self.pdus += 1
+        await asyncio.sleep(0)
+        after = [row for row in self.rows if row[0] > oid]
+        return None, 0, 0, tuple(after[:repetitions])
+
+
+class TestSnmpWalk(unittest.TestCase):
+
+    def setUp(self):
+        table = {f"1.3.6.1.2.1.31.1.1.1.1.{i}": i for i in range(1, 101)}
+        table["1.3.6.1.2.1.31.1.1.1.2.1"] = 0
+        self.agent = FakeAgent(table)
+        self.client = SnmpClient(max_repetitions=30)
+        patcher = patch.object(self.client, "_send_bulk",
+                               side_effect=self.agent.send_bulk)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.client.close)
+
+    def collect(self, agen):
+        async def run():
+            return [row async for row in agen]
+
+        return asyncio.run(run())
+
+    def test_walk_stops_at_subtree_end(self):
+        rows = self.collect(self.client.walk("127.0.0.1",
+                                             "1.3.6.1.2.1.31.1.1.1.1"))
+        self.assertEqual(len(rows), 100)
+        self.assertEqual(rows[0], ("1.3.6.1.2.1.31.1.1.1.1.1", "1"))
+        self.assertEqual(rows[-1], ("1.3.6.1.2.1.31.1.1.1.1.100", "100"))
+        # 100 rows by 30 + the page that leaves the subtree
+        self.assertEqual(self.agent.pdus, 4)
+
+    def test_walk_many_merges_hosts_and_reports_errors(self):
+        async def send_bulk(engine, auth, target, oid, repetitions, version):
+            if target.transport_address[0] == "127.0.0.2":
+                return "No SNMP response received before timeout", 0, 0, ()
+            return await self.agent.send_bulk(engine, auth, target, oid,
+                                              repetitions, version)
+
+        errors = {}
+        with patch.object(self.client, "_send_bulk", side_effect=send_bulk):
+            rows = self.collect(self.client.walk_many(
+                ["127.0.0.1", "127.0.0.2", "127.0.0.3"],
+                "1.3.6.1.2.1.31.1.1.1.1", errors=errors,
+            ))
+        self.assertEqual(len(rows), 200)
+        self.assertEqual({host for host, _, _ in rows},
+                         {"127.0.0.1", "127.0.0.3"})
+        self.assertEqual(list(errors), ["127.0.0.2"])
+
+    def test_consumer_may_stop_early(self):
+        async def run():
+            rows = []
+            async for row in self.client.walk_many(
+                ["127.0.0.1", "127.0.0.3"], "1.3.6.1.2.1.31.1.1.1.1"
+            ):
+                rows.append(row)
+                if len(rows) == 5:
+                    break
+            return rows
+
+        self.assertEqual(len(asyncio.run(run())), 5)
+
+
+class TestSnmpTables(unittest.TestCase):
+
+    def run_table(self, table, rows):
+        agent = FakeAgent(rows)
+        client = SnmpClient()
+        self.addCleanup(client.close)
+        with patch.object(client, "_send_bulk", side_effect=agent.send_bulk):
+            return asyncio.run(table("127.0.0.1", snmp=client))
+
+    def test_mac_table_from_q_bridge(self):
+        rows = self.run_table(snmp.mac_table, {
+            # fdb id 10, mac 00:11:22:33:44:55 -> bridge port 3
+            "1.3.6.1.2.1.17.7.1.2.2.1.2.10.0.17.34.51.68.85": 3,
+            # learned by the switch itself
+            "1.3.6.1.2.1.17.7.1.2.2.1.2.10.0.17.34.51.68.86": 0,
+            "1.3.6.1.2.1.17.7.1.2.2.1.2.20.0.17.34.51.68.87": 24,
+            "1.3.6.1.2.1.17.1.4.1.2.3": 10003,
+            "1.3.6.1.2.1.17.1.4.1.2.24": 10024,
+            "1.3.6.1.2.1.31.1.1.1.1.10003": "Gi1/0/3",
+        })
+        self.assertEqual(rows, [["00:11:22:33:44:55", "10", "Gi1/0/3"],
+                                ["00:11:22:33:44:57", "20", "24"]])
+
+    def test_arp_table_from_ip_net_to_physical(self):
+        rows = self.run_table(snmp.arp_table, {
+            "1.3.6.1.2.1.4.35.1.4.5.1.4.10.1.1.7":
+                bytes.fromhex("001122334455"),
+            # incomplete
+            "1.3.6.1.2.1.4.35.1.4.5.1.4.10.1.1.8": b"",
+            "1.3.6.1.2.1.31.1.1.1.1.5": "Vlan10",
+        })
+        self.assertEqual(rows, [["10.1.1.7", "00:11:22:33:44:55", "Vlan10"]])
+
+    def test_arp_table_from_ip_net_to_media(self):
+        rows = self.run_table(snmp.arp_table, {
+            "1.3.6.1.2.1.4.22.1.2.5.10.1.1.7": bytes.fromhex("414243444546"),
+            "1.3.6.1.2.1.31.1.1.1.1.5": "Vlan10",
+        })
+        self.assertEqual(rows, [["10.1.1.7", "41:42:43:44:45:46", "Vlan10"]])
+
+
+class TestSnmpGetOid(unittest.TestCase):
+
+    def setUp(self):
+        patcher = plain_objects(base.snmp_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_keeps_old_result_format(self):
+        async def send(engine, auth, target, objects):
+            return answer(objects)
+
+        with patch.object(base.snmp_client, "_send", side_effect=send):
+            result = asyncio.run(base.snmp_get_oid("127.0.0.1", "public",
+                                                   "1.3.6.1.2.1.1.5.0"))
+        self.assertEqual(result, ["1.3.6.1.2.1.1.5.0 = v1.3.6.1.2.1.1.5.0"])
+
+    def test_error_indication_is_returned(self):
+        async def send(engine, auth, target, objects):
+            return "No SNMP response received before timeout", 0, 0, ()
+
+        with patch.object(base.snmp_client, "_send", side_effect=send):
+            result = asyncio.run(base.snmp_get_oid("127.0.0.1", "public",
+                                                   "1.3.6.1.2.1.1.5.0"))
+        self.assertEqual(result, ["No SNMP response received before timeout"])
+
+
+if __name__ == "__main__":
+    unittest.main()
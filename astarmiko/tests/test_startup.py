@@ -0,0 +1,57 @@
+# tests/test_startup.py
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# Heavy dependencies which must be loaded on first use only
+HEAVY = ("netmiko", "paramiko", "pysnmp", "asyncssh", "textfsm", "tqdm")
+
+# Seconds allowed for importing an entry point in a fresh interpreter,
+# may be raised for slow CI machines
+BUDGET = float(os.environ.get("ASTARMIKO_IMPORT_BUDGET", "1.0"))
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def _import(module):
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+class TestStartup(unittest.TestCase):
+
+    def check_entry_point(self, module):
+        result = _import(module)
+        loaded = [m for m in HEAVY if m in result["modules"]]
+        self.assertEqual(loaded, [], f"{module} loads {loaded} at import")
+        self.assertLess(result["elapsed"], BUDGET,
+                        f"import of {module} took {result['elapsed']:.3f}s")
+
+    def test_fh(self):
+        self.check_entry_point("astarmiko.scripts.fh")
+
+    def test_acm(self):
+        self.check_entry_point("astarmiko.scripts.acm")
+
+    def test_package_exports_are_lazy(self):
+        result = _import("astarmiko")
+        self.assertNotIn("astarmiko.base", result["modules"])
+        import astarmiko
+        from astarmiko import base
+        self.assertIs(astarmiko.Activka, base.Activka)
+        self.assertIs(astarmiko.ac, base.ac)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+# tests/test_subnets.py
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from astarmiko.subnets import SubnetIndex, build, interface_networks
+
+
+class TestSubnetIndex(unittest.TestCase):
+
+    def test_longest_prefix_wins(self):
+        index = SubnetIndex()
+        index.add("10.0.0.0/8", "core")
+        index.add("10.1.0.0/16", "r1")
+        index.add("10.1.5.128/25", "r2")
+        self.assertEqual(index.lookup("10.1.5.200"), ("10.1.5.128/25", "r2"))
+        self.assertEqual(index.gateway("10.1.5.1"), "r1")
+        self.assertEqual(index.gateway("10.200.0.1"), "core")
+        self.assertIsNone(index.gateway("192.168.0.1"))
+        self.assertIsNone(index.gateway("not an ip"))
+
+    def test_old_networks_byip_keys(self):
+        mapping = {"5": "r1", "10.2.0.0/23": "r2"}
+        index = SubnetIndex.from_mapping(mapping)
+        self.assertEqual(index.gateway("172.16.5.10"), "r1")
+        self.assertEqual(index.gateway("10.2.1.1"), "r2")
+        based = SubnetIndex.from_mapping(mapping, base="10.1")
+        self.assertEqual(based.gateway("10.1.5.10"), "r1")
+        self.assertIsNone(based.gateway("172.16.5.10"))
+
+    def test_save_and_load(self):
+        index = SubnetIndex.from_mapping({"7": "r3", "10.9.0.0/22": "r1"})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "subnets.json")
+            index.save(path)
+            loaded = SubnetIndex.load(path)
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(loaded.gateway("10.9.3.3"), "r1")
+        self.assertEqual(loaded.gateway("10.0.7.1"), "r3")
+
+    def test_build_from_interfaces(self):
+        rows = {
+            "r1": [["Vlan10", "10.1.10.1", "24", "up", "up"],
+                   ["Loopback0", "10.255.0.1", "32", "up", "up"]],
+            # eltex_ip_int_br.template: INTF, ADDR, MASK, STATUS, PROTO
+            "sw1": [["vlan 10", "10.1.10.2", "24", "UP", "UP"],
+                    ["vlan 20", "10.1.20.1", "26", "UP", "UP"]],
+        }
+        act = MagicMock(levels={"r1": "R", "sw1": "L3"})
+        act.select.return_value = {"r1", "sw1"}
+        act.ip_interfaces.return_value = {"success": rows, "failed": {}}
+        index, errors = build(act)
+        self.assertEqual(errors, {})
+        self.assertEqual(index.gateway("10.1.10.77"), "r1")
+        self.assertEqual(index.gateway("10.1.20.5"), "sw1")
+        self.assertIsNone(index.gateway("10.255.0.1"))
+        self.assertEqual(len(interface_networks(rows["sw1"])), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+# tests/test_sweep.py
+import asyncio
+import socket
+import unittest
+from unittest.mock import patch
+from astarmiko import sweep
+
+
+class TestSweeper(unittest.TestCase):
+
+    def test_echo_request_checksum(self):
+        packet = sweep._echo_request(7)
+        self.assertEqual(packet[0], 8)
+        self.assertEqual(sweep._checksum(packet), 0)
+
+    def test_tcp_sweep_feeds_cache(self):
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        self.addCleanup(server.close)
+        port = server.getsockname()[1]
+        sweep.reachability.forget()
+        self.addCleanup(sweep.reachability.forget)
+
+        sweeper = sweep.Sweeper(method="tcp", tcp_port=port, timeout=1)
+        result = asyncio.run(sweeper.sweep(["127.0.0.1", "127.0.0.1"]))
+        self.assertEqual(result, {"127.0.0.1": True})
+        self.assertEqual(sweep.reachability.get("127.0.0.1"), "up")
+
+    def test_probe_inside_running_loop(self):
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        self.addCleanup(server.close)
+        port = server.getsockname()[1]
+
+        async def scenario():
+            return sweep.probe("127.0.0.1", method="tcp", tcp_port=port,
+                               feed_cache=False)
+
+        self.assertIs(asyncio.run(scenario()), True)
+
+    def test_tcp_refused_is_alive_silent_is_not(self):
+        closed = socket.socket()
+        closed.bind(("127.0.0.1", 0))
+        port = closed.getsockname()[1]
+        closed.close()
+        # RST of a closed port means the host is up
+        self.assertIs(sweep.probe("127.0.0.1", method="tcp", tcp_port=port,
+                                  feed_cache=False), True)
+
+        async def silent(*args):
+            await asyncio.sleep(1)
+
+        with patch("asyncio.open_connection", side_effect=silent):
+            self.assertIs(sweep.probe("127.0.0.1", method="tcp",
+                                      timeout=0.05, retries=2,
+                                      feed_cache=False), False)
+
+
+class FakeIcmpSocket:
+    """ICMP datagram socket answering echo requests of addresses in up,
+       replies of 'raw' addresses come with IP header
+    """
+
+    def __init__(self, up=(), raw=()):
+        self.up = set(up) | set(raw)
+        self.raw = set(raw)
+        self.sent = []
+        self.reader, self.writer = socket.socketpair(socket.AF_UNIX,
+                                                     socket.SOCK_DGRAM)
+        self.reader.setblocking(False)
+
+    def setblocking(self, flag):
+        pass
+
+    def fileno(self):
+        return self.reader.fileno()
+
+    def sendto(self, packet, address):
+        ip = address[0]
+        self.sent.append(ip)
+        if ip in self.up:
+            reply = bytes([sweep._ICMP_ECHO_REPLY]) + packet[1:]
+            if ip in self.raw:
+                reply = bytes([0x45]) + bytes(19) + reply
+            self.writer.send(ip.encode() + b"|" + reply)
+
+    def recvfrom(self, size):
+        ip, _, data = self.reader.recv(size).partition(b"|")
+        return data, (ip.decode(), 0)
+
+    def close(self):
+        self.reader.close()
+        self.writer.close()
+
+
+class TestIcmpSweep(unittest.TestCase):
+
+    def test_replies_and_retries(self):
+        fake = FakeIcmpSocket(up=["10.0.0.1"], raw=["10.0.0.2"])
+        sweeper = sweep.Sweeper(method="icmp", timeout=0.05, retries=3,
+                                rate=0, feed_cache=False)
+        with patch.object(sweep, "_icmp_socket", return_value=fake):
+            result = asyncio.run(sweeper.sweep(["10.0.0.1", "10.0.0.2",
+                                                "10.0.0.3"]))
+        self.assertEqual(result, {"10.0.0.1": True, "10.0.0.2": True,
+                                  "10.0.0.3": False})
+        # silent address is probed in every round, answered ones once
+        self.assertEqual(sorted(fake.sent), ["10.0.0.1", "10.0.0.2",
+                                             "10.0.0.3", "10.0.0.3",
+                                             "10.0.0.3"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# tests/test_template_cache.py
+import os
+import tempfile
+import unittest
+from astarmiko.template_cache import TemplateRegistry
+
+TEMPLATE = """Value MAC (\\S+)
+Value VLAN (\\d+)
+Value INTF (\\S+)
+
+
+Start
+  ^\\s+${VLAN}\\s+${MAC}\\s+\\S+\\s+${INTF} -> Record
+"""
+
+OUTPUT = """ 10    aabb.ccdd.eeff    DYNAMIC     Gi0/1
+ 20    aabb.ccdd.0001    DYNAMIC     Gi0/2
+"""
+
+
+class TestTemplateRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name,
+                                 "cisco_ios_mac_addr_tbl_by.template")
+        with open(self.path, "w") as f:
+            f.write(TEMPLATE)
+        self.registry = TemplateRegistry()
+
+    def test_template_compiled_once(self):
+        for _ in range(5):
+            rows = self.registry.parse(self.path, OUTPUT)
+        self.assertEqual(rows, [["aabb.ccdd.eeff", "10", "Gi0/1"],
+                                ["aabb.ccdd.0001", "20", "Gi0/2"]])
+        self.assertEqual(self.registry.stats["compiled"], 1)
+
+    def test_results_are_independent(self):
+        first = self.registry.parse(self.path, OUTPUT)
+        second = self.registry.parse(self.path, OUTPUT.splitlines()[0])
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+
+    def test_changed_template_is_recompiled(self):
+        self.registry.parse(self.path, OUTPUT)
+        with open(self.path, "w") as f:
+            f.write(TEMPLATE.replace("Value VLAN", "Value Required VLAN"))
+        st = os.stat(self.path)
+        os.utime(self.path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.registry.parse(self.path, OUTPUT)
+        self.assertEqual(self.registry.stats["compiled"], 2)
+
+    def test_preload_reports_broken_templates(self):
+        with open(os.path.join(self.dir.name, "broken.template"), "w") as f:
+            f.write("Value MAC\n\nStart\n")
+        errors = self.registry.preload(self.dir.name)
+        self.assertEqual(list(errors), ["broken.template"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# tests/test_topology.py
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from astarmiko import base
+from astarmiko.topology import TopologyCache
+
+NEIGHBORS = [["sw2", "GigabitEthernet0/1", "Gi0/24"],
+             ["sw3", "GigabitEthernet0/2.100", "Gi0/1"]]
+
+
+class TestTopologyCache(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "topology.json")
+        self.cache = TopologyCache(path=self.path)
+
+    def test_lookup_ignores_subinterface_and_persists(self):
+        self.cache.update("sw1", NEIGHBORS)
+        self.assertEqual(self.cache.neighbor("sw1", "GigabitEthernet0/2"),
+                         "sw3")
+        self.assertEqual(self.cache.neighbor("sw1", "GigabitEthernet0/1.5"),
+                         "sw2")
+        self.assertIsNone(self.cache.neighbor("sw1", "GigabitEthernet0/9"))
+        reloaded = TopologyCache(path=self.path)
+        self.assertTrue(reloaded.fresh("sw1"))
+        self.assertEqual(reloaded.neighbor("sw1", "GigabitEthernet0/1"), "sw2")
+
+    def test_expired_by_ttl(self):
+        self.cache.update("sw1", NEIGHBORS)
+        self.cache.set_members("sw1", "1", ["GigabitEthernet0/1"])
+        self.cache.ttl = -1
+        self.assertFalse(self.cache.fresh("sw1"))
+        self.assertIsNone(self.cache.members("sw1", "1"))
+
+    def test_concurrent_updates_leave_whole_file(self):
+        import threading
+
+        threads = [threading.Thread(target=self.cache.update,
+                                    args=(f"sw{i}", NEIGHBORS))
+                   for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        reloaded = TopologyCache(path=self.path)
+        self.assertTrue(all(reloaded.fresh(f"sw{i}") for i in range(16)))
+        self.assertEqual(os.listdir(os.path.dirname(self.path)),
+                         ["topology.json"])
+
+    def test_crawl_skips_fresh_devices(self):
+        self.cache.update("sw1", NEIGHBORS)
+        fetch = MagicMock(return_value=NEIGHBORS)
+        errors = self.cache.crawl(["sw1", "sw2"], fetch)
+        fetch.assert_called_once_with("sw2")
+        self.assertEqual(errors, {})
+
+
+class TestNeighborByPort(unittest.TestCase):
+
+    def test_hop_resolved_from_cache(self):
+        cache = TopologyCache()
+        patcher = patch.object(base, "topology", cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        act = base.Activka.__new__(base.Activka)
+        answers = {"ethchannel_member": [[["Gi0/1", "Gi0/2"]]],
+                   "neighbor": NEIGHBORS}
+        act.getinfo = MagicMock(side_effect=lambda dev, func, *a: answers[func])
+        for _ in range(3):
+            self.assertEqual(
+                act._get_neighbor_by_port("SW1", "neighbor_by_port", "Po1"),
+                "sw2")
+        # one neighbor table and one channel query for three hops
+        self.assertEqual(act.getinfo.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+# topology.py
+"""
+Cache of CDP/LLDP neighbor topology.
+
+Resolving the next hop of FindHost used to cost two SSH sessions: the
+whole neighbor table of the device and, for Eth-Trunk/Port-channel
+ports, the list of channel members. Adjacencies change rarely, so they
+are kept here keyed by (device, local port) together with resolved
+port-channel membership, refreshed by TTL and optionally persisted to a
+JSON file between runs. The cache is filled on demand or by a crawl
+(Activka.crawl_topology).
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from astarmiko.snapshot import atomic_write
+
+logger = logging.getLogger(__name__)
+
+_SUBINTF = re.compile(r"\.\d+")
+
+
+def _base_port(port):
+    """Port name without subinterface number"""
+    p = _SUBINTF.search(port)
+    return port[0:p.start(0)] if p else port
+
+
+class TopologyCache:
+    """Adjacencies {device: {local port: neighbor}} and port-channel
+       members {device: {channel: [ports]}} with times of refresh
+    """
+
+    def __init__(self, enabled=True, ttl=3600, path=None, workers=16):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.workers = workers
+        self.path = None
+        self._devices = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.stats = {"hits": 0, "refreshed": 0}
+        if path:
+            self.configure(path=path)
+
+    def configure(self, enabled=None, ttl=None, path=None, workers=None):
+        """Change settings (section topology of astarmiko.yaml) and load
+           persisted records
+        """
+        if enabled is not None:
+            self.enabled = enabled
+        if ttl is not None:
+            self.ttl = ttl
+        if workers is not None:
+            self.workers = workers
+        if path:
+            self.path = os.path.expanduser(path)
+            self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as error:
+            logger.warning(f"Can't read {self.path}: {error}")
+            return
+        with self._lock:
+            self._devices.update(data)
+
+    def save(self):
+        if not self.path or not self.enabled:
+            return
+        # fh --batch workers save concurrently: one writer at a time, so
+        # the last adjacencies are written last
+        with self._save_lock:
+            with self._lock:
+                data = json.dumps(self._devices, indent=1, sort_keys=True)
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                atomic_write(self.path, data)
+            except OSError as error:
+                logger.warning(f"Can't write {self.path}: {error}")
+
+    def _entry(self, device):
+        return self._devices.setdefault(
+            device, {"checked": 0, "ports": {}, "channels": {}}
+        )
+
+    def fresh(self, device):
+        """True if adjacencies of device are known and not older than ttl"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            entry = self._devices.get(device)
+            checked = entry["checked"] if entry else 0
+        return time.time() - checked <= self.ttl
+
+    def update(self, device, neighbors, save=True):
+        """Replace adjacencies of device
+
+        Args:
+            device (str): device name
+            neighbors (list): [[neighbor name, local port, neighbor port]]
+                              as parsed by 'neighbor' templates
+            save (bool): write the file right away
+        """
+        ports = {}
+        for row in neighbors or []:
+            ports[_base_port(row[1])] = {
+                "name": row[0],
+                "port": row[2] if len(row) > 2 else None,
+            }
+        with self._lock:
+            entry = self._entry(device)
+            entry["ports"] = ports
+            entry["checked"] = time.time()
+            self.stats["refreshed"] += 1
+        if save:
+            self.save()
+
+    def neighbor(self, device, port):
+        """Name of the neighbor behind local port or None"""
+        with self._lock:
+            entry = self._devices.get(device)
+            if not entry:
+                return None
+            self.stats["hits"] += 1
+            found = entry["ports"].get(_base_port(port))
+        return found["name"] if found else None
+
+    def members(self, device, channel):
+        """Cached member ports of port-channel or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._devices.get(device)
+            found = entry["channels"].get(str(channel)) if entry else None
+        if not found or time.time() - found["checked"] > self.ttl:
+            return None
+        return found["members"]
+
+    def set_members(self, device, channel, members):
+        with self._lock:
+            entry = self._entry(device)
+            entry["channels"][str(channel)] = {"members": list(members),
+                                               "checked": time.time()}
+        self.save()
+
+    def forget(self, device=None):
+        with self._lock:
+            if device is None:
+                self._devices.clear()
+            else:
+                self._devices.pop(device, None)
+        self.save()
+
+    def crawl(self, devices, fetch, workers=None):
+        """Refresh adjacencies of all stale devices in parallel
+
+        Args:
+            devices (iterable): device names
+            fetch (callable): fetch(device) -> neighbor rows
+            workers (int, optional): devices polled at the same time
+
+        Returns:
+            errors (dict): {device: message}
+        """
+        stale = [d for d in devices if not self.fresh(d)]
+        errors = {}
+
+        def work(device):
+            try:
+                self.update(device, fetch(device), save=False)
+            except Exception as error:
+                errors[device] = str(error)
+                logger.warning(f"Topology of {device} not refreshed: {error}")
+
+        with ThreadPoolExecutor(max_workers=workers or self.workers) as pool:
+            list(pool.map(work, stale))
+        self.save()
+        logger.info(f"Topology crawl: {len(stale)} devices, "
+                    f"{len(errors)} failed")
+        return errors
+
+
+topology = TopologyCache()
@@ -9,6 +9,7 @@ setup(
     url='https://github.com/astaraiki/astarmiko',
     packages=find_packages(),
     include_package_data=True,
+    package_data={'astarmiko': ['YAML/*.yaml']},
     install_requires=[
         'netmiko',
         'aiofiles',